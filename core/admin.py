@@ -1,7 +1,20 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import User, UserRole, MaterialType, RVM, RewardWallet, RewardTransaction, RecyclingActivity
+from . import search
+from .models import User, UserRole, UserStats, MaterialType, RVM, RewardWallet, RewardTransaction, RecyclingActivity, ImportCheckpoint, WalletSnapshot, IdempotencyKey, LeaderboardEntry
+
+
+class IndexedSearchMixin:
+    """Admin search through core.search - the indexed fields skip the LIKE '%term%' scans"""
+    
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term:
+            return queryset, False
+        # exact-only lookups ('=field', '^field', '@field') are not supported here
+        return search.filter_queryset(queryset, search_term, search_fields), False
 
 
 @admin.register(UserRole)
@@ -11,7 +24,7 @@ class UserRoleAdmin(admin.ModelAdmin):
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(IndexedSearchMixin, UserAdmin):
     list_display = ['email', 'first_name', 'last_name', 'phone', 'role', 'created_at', 'is_active']
     list_filter = ['role', 'is_active', 'created_at']
     search_fields = ['email', 'first_name', 'last_name', 'phone']
@@ -34,6 +47,15 @@ class CustomUserAdmin(UserAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(UserStats)
+class UserStatsAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['user', 'deposits_count', 'total_weight', 'total_points', 'last_deposit_at']
+    search_fields = ['user__email']
+    list_select_related = ['user']
+    # maintained by the deposit path and manage.py rebuild_stats
+    readonly_fields = ['user', 'total_weight', 'total_points', 'deposits_count', 'first_deposit_at', 'last_deposit_at']
+
+
 @admin.register(MaterialType)
 class MaterialTypeAdmin(admin.ModelAdmin):
     list_display = ['name', 'points_per_kg', 'is_active']
@@ -43,36 +65,45 @@ class MaterialTypeAdmin(admin.ModelAdmin):
 
 
 @admin.register(RVM)
-class RVMAdmin(admin.ModelAdmin):
+class RVMAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['id', 'name', 'location', 'status', 'last_usage', 'activity_count']
     list_filter = ['status', 'last_usage']
     search_fields = ['name', 'location']
     ordering = ['-last_usage']
     list_editable = ['status']  # Allow editing status directly in list
     list_display_links = ['id', 'name']  # Make both ID and name clickable
+    readonly_fields = ['activity_count', 'geohash']  # counter kept by the deposit path, geohash by save()
+    actions = ['mark_collected']
     
     fieldsets = (
         ('Basic Info', {
             'fields': ('name', 'location', 'status')
         }),
+        ('Coordinates', {
+            'fields': ('latitude', 'longitude', 'geohash')
+        }),
+        ('Collection', {
+            'fields': ('capacity_kg', 'last_collected_at')
+        }),
         ('Usage Info', {
-            'fields': ('last_usage',),
+            'fields': ('last_usage', 'activity_count'),
             'classes': ('collapse',)
         }),
     )
-    
-    def activity_count(self, obj):
-        """Show how many recycling activities this RVM has"""
-        count = obj.recyclingactivity_set.count()
-        return count
-    activity_count.short_description = 'Activities'
+
+
+    @admin.action(description='Mark selected RVMs as collected (emptied now)')
+    def mark_collected(self, request, queryset):
+        updated = queryset.update(last_collected_at=timezone.now())
+        self.message_user(request, f'{updated} RVMs marked as collected.')
 
 
 @admin.register(RewardWallet)
-class RewardWalletAdmin(admin.ModelAdmin):
+class RewardWalletAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['user', 'points', 'credit', 'total_value']
     search_fields = ['user__email', 'user__first_name', 'user__last_name']
     ordering = ['-points']
+    list_select_related = ['user']
     
     def total_value(self, obj):
         """Show total value in a nice format"""
@@ -87,6 +118,11 @@ class RewardTransactionAdmin(admin.ModelAdmin):
     search_fields = ['wallet__user__email', 'reason']
     ordering = ['-timestamp']
     readonly_fields = ['timestamp']
+    # the ledger is the biggest table: no per-row wallet/user queries, no COUNT(*) of
+    # the whole table on every page, no <select> listing every wallet on the edit form
+    list_select_related = ['wallet__user']
+    show_full_result_count = False
+    raw_id_fields = ['wallet']
     
     def formatted_amount(self, obj):
         """Color code positive/negative amounts"""
@@ -98,7 +134,7 @@ class RewardTransactionAdmin(admin.ModelAdmin):
 
 
 @admin.register(RecyclingActivity)
-class RecyclingActivityAdmin(admin.ModelAdmin):
+class RecyclingActivityAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['user', 'rvm', 'material', 'weight', 'points_earned', 'timestamp']
     list_filter = ['material', 'rvm', 'timestamp']
     search_fields = ['user__email', 'rvm__location', 'material__name']
@@ -110,3 +146,51 @@ class RecyclingActivityAdmin(admin.ModelAdmin):
         if obj:  # editing existing object
             return ['timestamp', 'points_earned', 'user', 'rvm', 'material', 'weight']
         return ['timestamp', 'points_earned']
+    
+    # a saved deposit is counted in the wallet, stats, rollups and leaderboards - add and view only
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['source', 'position', 'imported', 'skipped', 'completed', 'updated_at']
+    list_filter = ['completed']
+    search_fields = ['source']
+    # written by manage.py import_activities, delete a row to import that file again
+    readonly_fields = ['source', 'position', 'imported', 'skipped', 'first_timestamp', 'last_timestamp', 'completed', 'updated_at']
+
+
+@admin.register(WalletSnapshot)
+class WalletSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['wallet', 'as_of', 'balance', 'last_transaction_id', 'created_at']
+    search_fields = ['wallet__user__email']
+    list_select_related = ['wallet__user']
+    show_full_result_count = False
+    # written by manage.py snapshot_wallets
+    readonly_fields = ['wallet', 'as_of', 'balance', 'last_transaction_id', 'created_at']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'scope', 'user', 'status_code', 'created_at']
+    list_filter = ['scope']
+    search_fields = ['key', 'user__email']
+    list_select_related = ['user']
+    show_full_result_count = False
+    # stored responses of requests sent with an Idempotency-Key
+    readonly_fields = ['user', 'scope', 'key', 'fingerprint', 'status_code', 'response', 'created_at']
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['board', 'user', 'score', 'deposits']
+    search_fields = ['board', 'user__email']
+    ordering = ['board', '-score']
+    list_select_related = ['user']
+    show_full_result_count = False
+    # maintained by the deposit path and manage.py rebuild_leaderboards
+    readonly_fields = ['board', 'user', 'score', 'deposits']
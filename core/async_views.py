@@ -0,0 +1,173 @@
+"""
+Native async variants of the hot endpoints, for deployments on the ASGI entry point.
+
+DRF views are sync-only, so under ASGI every request to them is handed to a worker
+thread. These views run on the event loop and use the async ORM, so a worker can
+hold many slow (cellular) RVM connections open at once. They are mounted under
+/api/async/, or in place of the regular views when ASYNC_API_VIEWS is on. Like the
+DRF views they accept a token or a logged-in session (CSRF-checked on writes).
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import conditional, geo, idempotency, services
+from .authentication import CachedTokenAuthentication
+from .caching import materials_cache, rvm_status_cache
+from .models import RVM, RewardWallet, RewardTransaction
+from .serializers import DepositBatchItemSerializer, NearbyRVMSerializer, RewardWalletSerializer, RVMSerializer
+
+
+def _json(data, status=200, **kwargs):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False, **kwargs)
+
+
+def auth_required(view):
+    """
+    Authenticate like the DRF views and put the user on request.user: a token
+    (CachedTokenAuthentication), else the session - with SessionAuthentication's CSRF check.
+    """
+    authenticator = CachedTokenAuthentication()
+    session = SessionAuthentication()
+    
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authenticator.aauthenticate(request)
+        except exceptions.AuthenticationFailed as exc:
+            return _json({'detail': str(exc.detail)}, status=401, headers={'WWW-Authenticate': 'Token'})
+        if result is None:
+            user = await request.auser()
+            if not user.is_active:
+                return _json(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status=401, headers={'WWW-Authenticate': 'Token'},
+                )
+            try:
+                session.enforce_csrf(request)
+            except exceptions.PermissionDenied as exc:
+                return _json({'detail': str(exc.detail)}, status=403)
+            result = (user, None)
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+    
+    return wrapper
+
+
+@csrf_exempt
+@require_POST
+@auth_required
+async def deposit(request):
+    """Async deposit endpoint - same payload and validation as /api/deposit/"""
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return _json({'detail': 'Invalid JSON body.'}, status=400)
+    if not isinstance(payload, dict):
+        return _json({'detail': 'Expected a JSON object.'}, status=400)
+    
+    serializer = DepositBatchItemSerializer(data=payload)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status=400)
+    data = serializer.validated_data
+    
+    statuses = await rvm_status_cache.aget()
+    materials = await materials_cache.aget()
+    errors = {}
+    if data['rvm_id'] not in statuses:
+        errors['rvm_id'] = ['RVM not found']
+    elif statuses[data['rvm_id']] != 'active':
+        errors['rvm_id'] = ['RVM is not active']
+    if data['material_id'] not in materials:
+        errors['material_id'] = ['Material not found or inactive']
+    if errors:
+        return _json(errors, status=400)
+    
+    try:
+        key = idempotency.key_from_request(request, data.get('idempotency_key'))
+    except exceptions.ValidationError as exc:
+        return _json(exc.detail, status=400)
+    
+    def record():
+        activity = services.record_deposit(
+            user=request.user,
+            rvm_id=data['rvm_id'],
+            material=materials[data['material_id']],
+            weight=data['weight'],
+        )
+        return 201, services.deposit_response(activity)
+    
+    # the async ORM has no transactions yet, so the (single transaction) write path runs in a thread
+    try:
+        status_code, response, replayed = await sync_to_async(idempotency.run_once)(
+            request.user, services.DEPOSIT_SCOPE, key, services.deposit_payload(data), record,
+        )
+    except idempotency.KeyReused:
+        return _json({'detail': 'This Idempotency-Key was already used for a different request.'}, status=422)
+    return _json(response, status=status_code, headers={'Idempotent-Replayed': 'true'} if replayed else None)
+
+
+@require_GET
+@auth_required
+async def wallet(request):
+    """Async wallet endpoint - same payload as /api/wallet/"""
+    wallet, created = await RewardWallet.objects.aget_or_create(user=request.user)
+    wallet.user = request.user
+    wallet.recent_transactions_list = [
+        transaction async for transaction in
+        RewardTransaction.objects.filter(wallet_id=wallet.pk)
+        .order_by('-timestamp', '-id')[:RewardWalletSerializer.RECENT_TRANSACTIONS]
+    ]
+    return _json(RewardWalletSerializer(wallet).data)
+
+
+@require_GET
+@auth_required
+async def summary(request):
+    """Async summary endpoint - same payload as /api/summary/"""
+    summary = await request.user.asummary()
+    wallet, created = await RewardWallet.objects.aget_or_create(user=request.user)
+    summary['current_points'] = float(wallet.points)
+    summary['current_credit'] = float(wallet.credit)
+    return _json(summary)
+
+
+@require_GET
+@auth_required
+async def rvm_list(request):
+    """Async RVM discovery list - same filters (near= included) and payload as /api/rvms/"""
+    from .views import RVMFilter, parse_near  # views imports half the app, keep it out of module import time
+    
+    etag, last_modified = await conditional.avalidators(('rvms',), request.path, request.GET, 'application/json')
+    if conditional.not_modified(request.headers, etag, last_modified):
+        return conditional.set_validators(HttpResponseNotModified(), etag, last_modified)
+    try:
+        near = parse_near(request.GET)
+    except exceptions.ValidationError as exc:
+        return _json(exc.detail, status=400)
+    filterset = RVMFilter(request.GET, queryset=RVM.objects.all().order_by('-last_usage'))
+    if not filterset.is_valid():
+        return _json(filterset.errors, status=400)
+    
+    async def build():
+        # the text filters may look up the search tables with a sync query - not on the loop
+        queryset = await sync_to_async(lambda: filterset.qs)()
+        if near is None:
+            rvms = [rvm async for rvm in queryset]
+            data = RVMSerializer(rvms, many=True).data
+        else:
+            latitude, longitude, radius, limit = near
+            rvms = await geo.anearest(queryset, latitude, longitude, radius, limit, status='active')
+            data = NearbyRVMSerializer(rvms, many=True).data
+        response = _json(data)
+        return response.content, response['Content-Type']
+    
+    content, content_type = await conditional.acached_body(etag, build)
+    return conditional.set_validators(HttpResponse(content, content_type=content_type), etag, last_modified)
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+# revocation stamps live in their own cache (see CACHES), shared by the workers
+TOKEN_CACHE_ALIAS = 'tokens'
+REVOKED_KEY = 'auth-token:{}'
+
+
+def _token_version(key):
+    """Time of the token's last revocation, None when it wasn't revoked lately"""
+    return caches[TOKEN_CACHE_ALIAS].get(REVOKED_KEY.format(key))
+
+
+async def _atoken_version(key):
+    return await caches[TOKEN_CACHE_ALIAS].aget(REVOKED_KEY.format(key))
+
+
+def revoke_cached_token(key):
+    """Make every worker drop its cached copy of a token (after the current transaction commits)"""
+    # outlives every cache entry made before it - after that the stamp is no longer needed
+    timeout = 2 * getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300)
+    stamp = REVOKED_KEY.format(key)
+    transaction.on_commit(lambda: caches[TOKEN_CACHE_ALIAS].set(stamp, time.time_ns(), timeout))
+
+
+def revoke_cached_tokens_for_user(user_id):
+    """Same as revoke_cached_token for all of a user's tokens - password change, deactivation, ..."""
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        revoke_cached_token(key)
+
+
+class TokenCache:
+    """Bounded LRU of token key -> (user, token, version, expiry), safe to share between threads"""
+    
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key, entry):
+        max_size = getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+    
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers token -> user in a per-process LRU/TTL cache.
+
+    A cache hit costs no database query. Every entry carries the token's revocation
+    stamp from the 'tokens' cache; logout, password changes and deactivation set a new
+    one (see core.signals), so every worker re-reads the token on its next request.
+    Only revocations write stamps - looking one up (even for a made-up token) doesn't.
+    AUTH_TOKEN_CACHE_TTL bounds staleness if a stamp never reaches a worker.
+    """
+    
+    def authenticate_credentials(self, key):
+        # read the stamp before the database so a revocation racing the load is never cached as valid
+        version = _token_version(key)
+        cached = self._cached(key, version)
+        if cached is not None:
+            return cached
+        
+        user, token = super().authenticate_credentials(key)
+        self._remember(key, user, token, version)
+        return (user, token)
+    
+    async def aauthenticate(self, request):
+        """authenticate() for the native async views - same cache, async ORM on a miss"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+        
+        version = await _atoken_version(key)
+        cached = self._cached(key, version)
+        if cached is not None:
+            return cached
+        
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        
+        self._remember(key, token.user, token, version)
+        return (token.user, token)
+    
+    def _cached(self, key, version):
+        entry = token_cache.get(key)
+        if entry is None:
+            return None
+        user, token, cached_version, expires_at = entry
+        if cached_version == version and time.monotonic() < expires_at:
+            return (user, token)
+        token_cache.discard(key)
+        return None
+    
+    def _remember(self, key, user, token, version):
+        ttl = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300)
+        token_cache.set(key, (user, token, version, time.monotonic() + ttl))
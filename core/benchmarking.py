@@ -0,0 +1,202 @@
+"""Helpers shared by the benchmark commands - a throwaway database, seeding, load loops and percentiles"""
+import asyncio
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import loadgen, services
+from .caching import materials_cache, rvm_status_cache
+from .models import MaterialType, RVM, User
+
+
+@contextlib.contextmanager
+def test_database(keepdb=False):
+    """Run inside a freshly created test database so benchmarks never touch real data"""
+    old_name = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+        # in-memory SQLite fails concurrent writers straight away, a file waits for the lock
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'rvm_benchmark.sqlite3')
+    # lets the test clients' "testserver" host through ALLOWED_HOSTS, and runs with
+    # DEBUG off like production (no per-query logging)
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+    # reference data cached from the real database must not leak into the run
+    materials_cache.clear()
+    rvm_status_cache.clear()
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def seed_small_dataset(users=20, rvms=10, deposits_per_user=20):
+    """A few users with tokens, RVMs, materials and deposits - returns (token keys, rvm ids, material ids)"""
+    materials = [
+        MaterialType.objects.get_or_create(name=name, defaults={'points_per_kg': Decimal(points)})[0]
+        for name, points in [('Plastic', '1.00'), ('Metal', '3.00'), ('Glass', '2.00')]
+    ]
+    machines = RVM.objects.bulk_create([RVM(name=f'Bench RVM {i}', location=f'Bench street {i}') for i in range(rvms)])
+    rvm_status_cache.clear()  # bulk_create sends no signals
+    
+    keys = []
+    for i in range(users):
+        user = User.objects.create_user(
+            email=f'bench{i}@example.com', password=None, first_name='Bench', last_name=str(i)
+        )
+        keys.append(Token.objects.create(user=user).key)
+        services.record_deposit_batch(user, [
+            {
+                'rvm_id': machines[(i + n) % len(machines)].pk,
+                'material_id': materials[n % len(materials)].pk,
+                'weight': Decimal('1.250'),
+            }
+            for n in range(deposits_per_user)
+        ])
+    return keys, [machine.pk for machine in machines], [material.pk for material in materials]
+
+
+def seed_dataset(users=1000, rvms=50, activities=50000, days=30, seed=42, token_users=50):
+    """
+    A production-shaped dataset from core.loadgen, with stats and rollups rebuilt.
+    Returns a dict with token keys for `token_users` random users, an admin token,
+    and the RVM / material ids to deposit against.
+    """
+    rng = random.Random(seed)
+    materials = loadgen.ensure_materials()
+    user_ids = loadgen.create_users(users)
+    rvm_ids = loadgen.create_rvms(rvms, rng)
+    rvm_status_cache.clear()  # bulk_create sends no signals
+    materials_cache.clear()
+    
+    end = timezone.now().replace(microsecond=0)
+    loadgen.generate_activities(activities, user_ids, rvm_ids, materials, days, end, seed)
+    quiet = io.StringIO()
+    call_command('rebuild_stats', stdout=quiet)
+    call_command('backfill_rollups', start=f'{end - timedelta(days=days):%Y-%m-%d}', end=f'{end:%Y-%m-%d}', stdout=quiet)
+    call_command('rebuild_leaderboards', stdout=quiet)
+    
+    sample = rng.sample(user_ids, min(token_users, len(user_ids)))
+    keys = [token.key for token in Token.objects.bulk_create([Token(user_id=user_id, key=Token.generate_key()) for user_id in sample])]
+    admin = User.objects.create_superuser(email='bench-admin@example.com', password=None, first_name='Bench', last_name='Admin')
+    return {
+        'keys': keys,
+        'admin_key': Token.objects.create(user=admin).key,
+        'rvm_ids': rvm_ids,
+        'material_ids': [material.pk for material in materials],
+    }
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def live_server():
+    """A threaded WSGI server (what runserver uses) on a free local port - yields (host, port)"""
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address[:2]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (ms) for one run"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run_threaded(make_worker, total, concurrency):
+    """
+    Fire `total` requests from `concurrency` threads. `make_worker()` is called once per
+    thread and returns a callable doing one request and returning True on success.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = iter(range(total))
+    
+    def loop():
+        nonlocal errors
+        do_request = make_worker()
+        local, failed = [], 0
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            started = time.perf_counter()
+            ok = do_request()
+            local.append(time.perf_counter() - started)
+            failed += not ok
+        with lock:
+            latencies.extend(local)
+            errors += failed
+        connection.close()
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(loop) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def run_async(do_request, total, concurrency):
+    """Same as run_threaded on one event loop: `do_request` is a coroutine function returning True on success"""
+    async def main():
+        latencies = []
+        errors = 0
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                ok = await do_request()
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return summarize(latencies, time.perf_counter() - started, errors)
+    
+    return asyncio.run(main())
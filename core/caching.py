@@ -0,0 +1,123 @@
+"""
+Caching helpers for reference data that is read on every request but rarely written.
+
+Each kind of data has a version in the 'versions' cache, bumped (after commit) whenever
+its rows change. Per-process caches and ETags (core.conditional) compare against it.
+That cache is shared by the workers (files per host by default, see CACHES), so a write
+in one worker invalidates every worker, and workers agree on the versions - including
+the first one, seeded by whichever worker gets there first. With a process-local
+'versions' cache each worker has versions of its own and the TTL bounds how stale
+the others can be.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import MaterialType, RVM
+
+VERSIONS_CACHE_ALIAS = 'versions'
+VERSION_KEY = 'core:version:{}'
+
+
+def versions_cache():
+    return caches[VERSIONS_CACHE_ALIAS]
+
+
+def get_version(namespace):
+    """Current version of a namespace - the time it was last bumped, in nanoseconds"""
+    cache = versions_cache()
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        # never bumped (a new cache) - the first worker's seed is everybody's version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(namespace):
+    """get_version() for async views - the cache I/O doesn't block the loop"""
+    cache = versions_cache()
+    key = VERSION_KEY.format(namespace)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(namespace):
+    """Mark a namespace as changed once the current transaction commits"""
+    key = VERSION_KEY.format(namespace)
+    transaction.on_commit(lambda: versions_cache().set(key, time.time_ns(), None))
+
+
+class ReferenceCache:
+    """Per-process read-through cache of a small table, reloaded on version change or TTL expiry"""
+    
+    def __init__(self, namespace, loader, aloader=None):
+        self.namespace = namespace
+        self.loader = loader
+        self.aloader = aloader  # async twin of loader, for the ASGI views
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._expires_at = 0
+    
+    def get(self):
+        version = get_version(self.namespace)
+        if self._is_stale(version):
+            with self._lock:
+                if self._is_stale(version):  # another thread may have reloaded meanwhile
+                    data = self.loader()
+                    ttl = getattr(settings, 'REFERENCE_CACHE_TTL', 60)
+                    self._data, self._version, self._expires_at = data, version, time.monotonic() + ttl
+        return self._data
+    
+    async def aget(self):
+        """get() for async views - the version check and a reload don't block the loop"""
+        version = await aget_version(self.namespace)
+        if self._is_stale(version):
+            data = await self.aloader()
+            ttl = getattr(settings, 'REFERENCE_CACHE_TTL', 60)
+            self._data, self._version, self._expires_at = data, version, time.monotonic() + ttl
+        return self._data
+    
+    def clear(self):
+        self._data = None
+    
+    def _is_stale(self, version):
+        return self._data is None or self._version != version or time.monotonic() >= self._expires_at
+
+
+def _load_active_materials():
+    return {material.pk: material for material in MaterialType.objects.filter(is_active=True)}
+
+
+def _load_rvm_statuses():
+    return dict(RVM.objects.values_list('id', 'status'))
+
+
+async def _aload_active_materials():
+    return {material.pk: material async for material in MaterialType.objects.filter(is_active=True)}
+
+
+async def _aload_rvm_statuses():
+    return {rvm_id: status async for rvm_id, status in RVM.objects.values_list('id', 'status')}
+
+
+materials_cache = ReferenceCache('materials', _load_active_materials, _aload_active_materials)
+rvm_status_cache = ReferenceCache('rvm-status', _load_rvm_statuses, _aload_rvm_statuses)
+
+
+def active_materials():
+    """{id: MaterialType} of active materials - shared instances, treat them as read-only"""
+    return materials_cache.get()
+
+
+def rvm_statuses():
+    """{id: status} of every RVM"""
+    return rvm_status_cache.get()
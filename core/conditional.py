@@ -0,0 +1,182 @@
+"""
+Conditional GET for reference data (materials, RVMs) that clients poll all the time.
+
+A response's ETag is a hash of the cache versions of the tables behind it (see
+core.caching - bumped after every committed write) plus everything else the body
+depends on: path, query string and format. Computing it costs a cache lookup or two,
+so a poll whose If-None-Match still matches gets its 304 before any query runs.
+Last-Modified is the time of the newest version bump.
+
+The same hash keys a shared response cache: most polls come from different users but
+ask for the same body, so a 200 is rendered once per version and query string and then
+served from the 'responses' cache - an alias of its own, so tokens and other entries
+can't evict the bodies (nor the versions, kept apart in 'versions'). On a miss only one
+caller builds the body (a cache.add() lock); the others wait for it instead of all
+running the query at once.
+
+The versions come from a cache the workers share, so every worker hands out the same
+ETag for the same data. Configured with a process-local 'versions' cache instead, each
+worker has ETags of its own (a client switching workers gets a 200 instead of a 304) and
+misses the others' writes, so there the ETag also rolls over every REFERENCE_CACHE_TTL
+seconds - stale for at most as long as the reference caches.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .caching import aget_version, get_version, versions_cache
+
+
+def validators(namespaces, path, query, representation):
+    """(strong ETag, Last-Modified timestamp) of a response built from the given version namespaces"""
+    versions = [get_version(namespace) for namespace in namespaces]
+    return _validators(versions, path, query, representation)
+
+
+async def avalidators(namespaces, path, query, representation):
+    """validators() for async views"""
+    versions = [await aget_version(namespace) for namespace in namespaces]
+    return _validators(versions, path, query, representation)
+
+
+def _validators(versions, path, query, representation):
+    last_modified = max(versions) // 10 ** 9
+    if isinstance(versions_cache(), LocMemCache):
+        ttl = getattr(settings, 'REFERENCE_CACHE_TTL', 60)
+        window = int(time.time() // ttl)
+        versions.append(window)
+        last_modified = max(last_modified, window * ttl)
+    query_key = '&'.join(f'{key}={value}' for key, values in sorted(query.lists()) for value in values)
+    digest = hashlib.sha256(f'{versions}|{path}|{query_key}|{representation}'.encode()).hexdigest()[:32]
+    return quote_etag(digest), last_modified
+
+
+RESPONSES_CACHE_ALIAS = 'responses'
+RESPONSE_KEY = 'core:response:{}'
+LOCK_TIMEOUT = 10  # seconds a builder may hold the lock - and how long the others wait for it
+LOCK_POLL = 0.02
+
+
+def cached_body(etag, build):
+    """
+    (content, content_type) of the response behind etag, build() on a miss.
+    build() returns the same tuple, or None for a response that mustn't be cached.
+    """
+    cache = caches[RESPONSES_CACHE_ALIAS]
+    key = RESPONSE_KEY.format(etag.strip('"'))
+    lock = f'{key}:lock'
+    body = cache.get(key)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while body is None and not cache.add(lock, True, LOCK_TIMEOUT):
+        # someone else is building it
+        if time.monotonic() >= deadline:
+            return build()  # the builder is stuck or gone - don't queue behind it forever
+        time.sleep(LOCK_POLL)
+        body = cache.get(key)
+    if body is not None:
+        return body
+    try:
+        body = cache.get(key)  # finished while we were getting the lock
+        if body is None:
+            body = build()
+            if body is not None:
+                cache.set(key, body, getattr(settings, 'RESPONSE_CACHE_TTL', 300))
+    finally:
+        cache.delete(lock)
+    return body
+
+
+async def acached_body(etag, build):
+    """cached_body() for async views - build is a coroutine function, waiting doesn't block the loop"""
+    cache = caches[RESPONSES_CACHE_ALIAS]
+    key = RESPONSE_KEY.format(etag.strip('"'))
+    lock = f'{key}:lock'
+    body = await cache.aget(key)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while body is None and not await cache.aadd(lock, True, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return await build()
+        await asyncio.sleep(LOCK_POLL)
+        body = await cache.aget(key)
+    if body is not None:
+        return body
+    try:
+        body = await cache.aget(key)
+        if body is None:
+            body = await build()
+            if body is not None:
+                await cache.aset(key, body, getattr(settings, 'RESPONSE_CACHE_TTL', 300))
+    finally:
+        await cache.adelete(lock)
+    return body
+
+
+def not_modified(headers, etag, last_modified):
+    """Does the client's copy (If-None-Match, else If-Modified-Since) still match?"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(headers.get('If-Modified-Since') or '')
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # clients may keep it but must check back (cheaply, see above) before using it
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified and the shared response cache for read-only viewsets, from the
+    versions in version_namespaces. Only JSON responses take part - the browsable API
+    page differs per user. The body must not depend on who is asking.
+    """
+    version_namespaces = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+    def conditional(self, request, handler, *args, **kwargs):
+        # runs after authentication, permissions and content negotiation, before the queryset
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validators(
+            self.version_namespaces, request.path, request.query_params, request.accepted_media_type,
+        )
+        if not_modified(request.headers, etag, last_modified):
+            return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        
+        uncached = None
+        
+        def build():
+            nonlocal uncached
+            uncached = handler(request, *args, **kwargs)
+            if uncached.status_code != status.HTTP_200_OK:
+                return None
+            # render it here (dispatch would do it later) to cache the bytes
+            uncached.accepted_renderer = request.accepted_renderer
+            uncached.accepted_media_type = request.accepted_media_type
+            uncached.renderer_context = self.get_renderer_context()
+            uncached.render()
+            return uncached.content, uncached['Content-Type']
+        
+        body = cached_body(etag, build)
+        if body is None:
+            return uncached  # an error, passed on without validators
+        response = HttpResponse(body[0], content_type=body[1]) if uncached is None else uncached
+        return set_validators(response, etag, last_modified)
@@ -0,0 +1,158 @@
+"""
+Fill-level forecasts for RVM bins, to plan collection rounds.
+
+The whole fleet is scored in one pass over NumPy arrays built from the rollup tables,
+never from raw activities:
+
+* a machines x hours matrix of kg deposited over the last WINDOW_WEEKS weeks (hourly rollups),
+* fill: kg deposited since the hour of the last collection - collections older than the
+  window add their earlier days from the daily rollups,
+* rate: kg per hour of the week, averaged over the window's weeks with recent weeks
+  weighted more,
+* time to full: the first future hour where the summed rates cover the free capacity.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .models import RVM, RVMActivityRollup
+from .rollups import bucket_start
+
+WINDOW_WEEKS = 4
+HORIZON_DAYS = 14  # machines that won't fill up within this get hours_to_full None
+HOURS_PER_WEEK = 7 * 24
+HOUR = 3600
+
+
+def forecast_fleet(rvms=None, now=None):
+    """
+    Fill forecast of every machine in `rvms` (default: all), soonest full first.
+    A list of dicts: id, name, location, status, capacity_kg, fill_kg, fill_percent,
+    rate_kg_per_day, hours_to_full and full_at (None when not within HORIZON_DAYS).
+    """
+    now = now or timezone.now()
+    rvms = RVM.objects.all() if rvms is None else rvms
+    machines = list(rvms.order_by('pk').values('id', 'name', 'location', 'status', 'capacity_kg', 'last_collected_at'))
+    if not machines:
+        return []
+
+    # the window starts at a UTC midnight, so the daily rollups pick up right where it begins
+    window_start = bucket_start(now, 'day') - timedelta(weeks=WINDOW_WEEKS)
+    current = int((bucket_start(now, 'hour') - window_start).total_seconds()) // HOUR
+    deposits = hourly_matrix(machines, rvms, window_start, current + 1)
+
+    capacity = np.array([float(machine['capacity_kg']) for machine in machines])
+    collected = np.array([
+        _hour_index(machine['last_collected_at'], window_start) if machine['last_collected_at'] else -1
+        for machine in machines
+    ])
+    fill = (deposits * (np.arange(current + 1) >= collected[:, None])).sum(axis=1)
+    fill += _before_window(machines, rvms, window_start, collected)
+
+    profile = weekly_profile(deposits[:, :WINDOW_WEEKS * HOURS_PER_WEEK])
+    hours = hours_to_full(capacity - fill, profile, current)
+    # the rest of the current hour passes before the first forecast hour starts
+    hours = np.where(hours > 0, hours + (1 - (now - bucket_start(now, 'hour')).total_seconds() / HOUR), hours)
+
+    results = []
+    for position, machine in enumerate(machines):
+        remaining = None if np.isnan(hours[position]) else float(hours[position])
+        results.append({
+            'id': machine['id'],
+            'name': machine['name'],
+            'location': machine['location'],
+            'status': machine['status'],
+            'capacity_kg': round(float(capacity[position]), 2),
+            'fill_kg': round(float(fill[position]), 3),
+            'fill_percent': round(float(fill[position] / capacity[position] * 100), 1),
+            'rate_kg_per_day': round(float(profile[position].sum() / 7), 3),
+            'hours_to_full': None if remaining is None else round(remaining, 1),
+            'full_at': None if remaining is None else now + timedelta(hours=remaining),
+        })
+    results.sort(key=lambda result: (result['hours_to_full'] is None, result['hours_to_full'] or 0, result['id']))
+    return results
+
+
+def hourly_matrix(machines, rvms, start, hours):
+    """kg deposited per machine (rows, in `machines` order) and hour since start (columns)"""
+    row_of = {machine['id']: row for row, machine in enumerate(machines)}
+    buckets = (
+        RVMActivityRollup.objects
+        .filter(period='hour', bucket__gte=start, bucket__lt=start + timedelta(hours=hours), rvm__in=rvms.values('pk'))
+        .values('rvm_id', 'bucket')
+        .annotate(total=Sum('weight'))  # summed over materials
+        .order_by()
+        .values_list('rvm_id', 'bucket', 'total')
+    )
+    rows, columns, weights = [], [], []
+    for rvm_id, bucket, total in buckets:
+        rows.append(row_of[rvm_id])
+        columns.append(_hour_index(bucket, start))
+        weights.append(float(total))
+    matrix = np.zeros((len(machines), hours))
+    matrix[np.array(rows, dtype=int), np.array(columns, dtype=int)] = weights
+    return matrix
+
+
+def weekly_profile(deposits):
+    """
+    Expected kg per hour of the week, per machine: (machines, WINDOW_WEEKS * 168) -> (machines, 168).
+    Column i of the result is the hour of the week of column i of the input.
+    """
+    weeks = deposits.reshape(len(deposits), WINDOW_WEEKS, HOURS_PER_WEEK)
+    weights = np.arange(1, WINDOW_WEEKS + 1, dtype=float)  # the latest week counts most
+    return np.tensordot(weeks, weights / weights.sum(), axes=([1], [0]))
+
+
+def hours_to_full(free, profile, current):
+    """
+    Hours after the current one until each machine's free capacity is used up at its
+    profile's rates - 0 when already full, NaN beyond HORIZON_DAYS.
+    `current` is the column of the current hour, counted like the profile's columns.
+    """
+    horizon = HORIZON_DAYS * 24
+    rates = profile[:, (current + 1 + np.arange(horizon)) % HOURS_PER_WEEK]
+    cumulative = np.cumsum(rates, axis=1)
+    reached = cumulative >= free[:, None]
+    first = reached.argmax(axis=1)
+    before = np.where(first > 0, cumulative[np.arange(len(free)), first - 1], 0.0)
+    rate = rates[np.arange(len(free)), first]
+    # fraction of the hour it fills up in, assuming deposits spread evenly over it
+    fraction = np.divide(free - before, rate, out=np.ones_like(free), where=rate > 0)
+    hours = first + np.clip(fraction, 0, 1)
+    hours = np.where(reached.any(axis=1), hours, np.nan)
+    return np.where(free <= 0, 0.0, hours)
+
+
+def _before_window(machines, rvms, window_start, collected):
+    """kg deposited between the last collection and the window, for collections older than the window"""
+    extra = np.zeros(len(machines))
+    if not (collected < 0).any():
+        return extra
+    # daily buckets - the collection day is counted whole
+    totals = (
+        RVMActivityRollup.objects
+        .filter(period='day', bucket__lt=window_start, rvm__in=rvms.filter(
+            Q(last_collected_at__isnull=True) | Q(last_collected_at__lt=window_start)
+        ).values('pk'))
+        .filter(
+            Q(rvm__last_collected_at__isnull=True)
+            | Q(bucket__gte=TruncDay('rvm__last_collected_at', tzinfo=dt_timezone.utc))
+        )
+        .values('rvm_id')
+        .annotate(total=Sum('weight'))
+        .order_by()
+        .values_list('rvm_id', 'total')
+    )
+    row_of = {machine['id']: row for row, machine in enumerate(machines)}
+    for rvm_id, total in totals:
+        extra[row_of[rvm_id]] = float(total)
+    return extra
+
+
+def _hour_index(timestamp, start):
+    """Whole hours from start to the hour timestamp falls into, negative before start"""
+    return int((timestamp - start).total_seconds() // HOUR)
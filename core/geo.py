@@ -0,0 +1,164 @@
+"""
+Nearest-RVM lookups on plain SQLite/PostgreSQL - no PostGIS.
+
+Every RVM with coordinates carries its geohash. Geohash cells nest (a cell's hash is
+a prefix of every hash inside it) and sort in the same order as their characters, so
+"inside this cell" is a range scan on the geohash index. A search covers its bounding
+box with a handful of cells, the database returns the machines in those cells that
+are also inside the box, and only those few get exact haversine distances.
+"""
+import math
+
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'  # in ASCII order, so hashes sort like the cells
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_CELLS = 9  # prefixes per query, the box is covered by at most 3x3 cells
+SEARCH_STEPS = 4  # nearest() tries radius / 4**3, radius / 4**2, radius / 4, radius
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # bits alternate longitude, latitude, starting with longitude
+    while len(chars) < precision:
+        coordinate, interval = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value *= 2
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (south, north, [(west, east), ...]) around a circle. Two longitude ranges when the
+    box crosses the antimeridian, the whole circle of longitudes near a pole.
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - delta_lat, -90.0), min(latitude + delta_lat, 90.0)
+    if south <= -90.0 or north >= 90.0:
+        return south, north, [(-180.0, 180.0)]
+    # widest point of the circle in longitude (not at the center's latitude)
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return south, north, [(-180.0, 180.0)]
+    delta_lon = math.degrees(math.asin(ratio))
+    west, east = longitude - delta_lon, longitude + delta_lon
+    if west < -180.0:
+        return south, north, [(west + 360.0, 180.0), (-180.0, east)]
+    if east > 180.0:
+        return south, north, [(west, 180.0), (-180.0, east - 360.0)]
+    return south, north, [(west, east)]
+
+
+def covering_cells(south, north, west, east):
+    """The longest geohash prefixes whose cells cover the box, at most MAX_CELLS of them"""
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(north / height) - math.floor(south / height) + 1
+        columns = math.floor(east / width) - math.floor(west / width) + 1
+        if rows * columns <= MAX_CELLS:
+            break
+    else:
+        return ['']  # the box is most of the planet
+    # the grids of every precision line up with 0 degrees, so cell indexes come from floor()
+    first_row, first_column = math.floor(south / height), math.floor(west / width)
+    cells = set()
+    for row in range(first_row, first_row + rows):
+        for column in range(first_column, first_column + columns):
+            # the center of the cell, clear of any rounding at its edges
+            center_lat = min(max((row + 0.5) * height, -90.0), 90.0)
+            center_lon = min(max((column + 0.5) * width, -180.0), 180.0)
+            cells.add(encode(center_lat, center_lon, precision))
+    return sorted(cells)
+
+
+def within(latitude, longitude, radius_km, **filters):
+    """
+    Filter for machines possibly within radius_km: their cell is one of the covering
+    cells (index range scans) and their coordinates are inside the bounding box.
+    `filters` are repeated inside every cell's range, so an index on (those fields,
+    geohash) serves each range on its own.
+    """
+    south, north, longitude_ranges = bounding_box(latitude, longitude, radius_km)
+    cells = Q()
+    box = Q()
+    for west, east in longitude_ranges:
+        for cell in covering_cells(south, north, west, east):
+            # prefix match as a range - LIKE 'x%' can't use the index on every backend
+            if cell:
+                cells |= Q(geohash__gte=cell, geohash__lt=cell + '{', **filters)
+            else:
+                cells |= Q(geohash__isnull=False, **filters)
+        box |= Q(longitude__gte=west, longitude__lte=east)
+    return cells & box & Q(latitude__gte=south, latitude__lte=north)
+
+
+def rank(rvms, latitude, longitude, radius_km, limit):
+    """The `limit` machines closest to the point, within radius_km, each with .distance_km set"""
+    ranked = []
+    for rvm in rvms:
+        distance = haversine_km(latitude, longitude, rvm.latitude, rvm.longitude)
+        if distance <= radius_km:
+            rvm.distance_km = round(distance, 3)
+            ranked.append(rvm)
+    ranked.sort(key=lambda rvm: (rvm.distance_km, rvm.pk))
+    return ranked[:limit]
+
+
+def search_radii(radius_km):
+    """
+    Growing radii for a k-nearest search. Once one of them holds k machines those are
+    the k nearest, so dense areas stop after reading a small box instead of a big one.
+    """
+    return [radius_km / 4 ** step for step in range(SEARCH_STEPS - 1, -1, -1)]
+
+
+def nearest(queryset, latitude, longitude, radius_km, limit, **filters):
+    """The `limit` machines of queryset closest to the point within radius_km (see rank)"""
+    for search_radius in search_radii(radius_km):
+        candidates = queryset.filter(within(latitude, longitude, search_radius, **filters)).order_by()
+        rvms = rank(candidates, latitude, longitude, search_radius, limit)
+        if len(rvms) == limit:
+            break
+    return rvms
+
+
+async def anearest(queryset, latitude, longitude, radius_km, limit, **filters):
+    """nearest() on the async ORM"""
+    for search_radius in search_radii(radius_km):
+        candidates = queryset.filter(within(latitude, longitude, search_radius, **filters)).order_by()
+        rvms = rank([rvm async for rvm in candidates], latitude, longitude, search_radius, limit)
+        if len(rvms) == limit:
+            break
+    return rvms
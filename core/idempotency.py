@@ -0,0 +1,103 @@
+"""
+Idempotency keys - clients send an Idempotency-Key header with a write, and a retry
+of the same request is answered from the stored result instead of being applied again.
+
+The outcome is stored in the same transaction as the write itself, so either both
+happen or neither does. The unique (user, scope, key) constraint settles two copies
+of a request racing each other: the second insert fails and rolls its write back.
+"""
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request"""
+
+
+def key_from_request(request, fallback=None):
+    """The Idempotency-Key header, else `fallback` (a key sent in the body), None when neither"""
+    key = request.headers.get(HEADER, fallback)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({HEADER: [f'Must be between 1 and {MAX_KEY_LENGTH} characters.']})
+    return key
+
+
+def fingerprint(payload):
+    """Stable hash of a request payload, to tell a retry from a new request with an old key"""
+    encoded = json.dumps(payload, sort_keys=True, cls=JSONEncoder, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def lookup(user, scope, key, payload_fingerprint):
+    """Stored (status_code, response) for this key, or None. Raises KeyReused on a payload mismatch."""
+    stored = (
+        IdempotencyKey.objects.filter(user=user, scope=scope, key=key)
+        .values_list('fingerprint', 'status_code', 'response').first()
+    )
+    if stored is None:
+        return None
+    if stored[0] != payload_fingerprint:
+        raise KeyReused(key)
+    return stored[1], stored[2]
+
+
+def lookup_many(user, scope, keys):
+    """{key: (fingerprint, status_code, response)} for the keys already used - one query for a whole batch"""
+    return {
+        key: (payload_fingerprint, status_code, response)
+        for key, payload_fingerprint, status_code, response in
+        IdempotencyKey.objects.filter(user=user, scope=scope, key__in=keys)
+        .values_list('key', 'fingerprint', 'status_code', 'response')
+    }
+
+
+def serializable(response):
+    """The response as the API renders it, which is also how it comes back from the JSONField"""
+    return json.loads(json.dumps(response, cls=JSONEncoder))
+
+
+def run_once(user, scope, key, payload, operation):
+    """
+    Run `operation()` - which returns (status_code, response data) and may raise - at most
+    once per key. Returns (status_code, response, replayed). Without a key it just runs.
+
+    Only successful outcomes are stored: a request that failed (e.g. not enough points)
+    can be retried with the same key once the problem is fixed.
+    """
+    if key is None:
+        status_code, response = operation()
+        return status_code, response, False
+
+    payload_fingerprint = fingerprint(payload)
+    stored = lookup(user, scope, key, payload_fingerprint)
+    if stored is not None:
+        return (*stored, True)
+
+    try:
+        with transaction.atomic():
+            status_code, response = operation()
+            # round trip through JSON so the first answer looks exactly like a replay
+            response = serializable(response)
+            IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key, fingerprint=payload_fingerprint,
+                status_code=status_code, response=response,
+            )
+    except IntegrityError:
+        # a concurrent copy of this request committed first - ours was rolled back
+        stored = lookup(user, scope, key, payload_fingerprint)
+        if stored is None:
+            raise
+        return (*stored, True)
+    return status_code, response, False
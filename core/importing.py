@@ -0,0 +1,208 @@
+"""
+Bulk loading of historical deposits (see the import_activities command).
+
+Each source file is read record by record and written in batches: the activities and
+their ledger rows are bulk inserted, wallets and RVMs are updated set-wise, and the
+file's ImportCheckpoint moves forward, all in one transaction. A crash loses at most
+the batch in flight and a rerun resumes right after the last committed one.
+
+Stats and rollups are left alone here, the command rebuilds them once at the end.
+"""
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import RVM, MaterialType, User, ImportCheckpoint, RecyclingActivity
+from .services import POINTS_QUANTUM, apply_deposits_in_bulk
+
+WEIGHT_QUANTUM = Decimal('0.001')
+MAX_WEIGHT = Decimal('100000')  # weight is max_digits=8, decimal_places=3
+MAX_POINTS = Decimal('1000000')  # points_earned is max_digits=8, decimal_places=2
+ERROR_SAMPLES = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+class KeyMaps:
+    """In-memory lookups from file columns to primary keys, loaded once per worker"""
+    def __init__(self):
+        self.users_by_email = {email.lower(): pk for pk, email in User.objects.values_list('pk', 'email')}
+        self.user_ids = set(self.users_by_email.values())
+        self.rvm_ids = set(RVM.objects.values_list('pk', flat=True))
+        self.materials = {material.pk: material for material in MaterialType.objects.all()}
+        self.materials_by_name = {material.name.lower(): material for material in self.materials.values()}
+
+    def user(self, row):
+        email = (row.get('user_email') or '').strip().lower()
+        if email:
+            if email not in self.users_by_email:
+                raise RowError(f'unknown user {email}')
+            return self.users_by_email[email]
+        user_id = _int(row.get('user_id'), 'user_id')
+        if user_id not in self.user_ids:
+            raise RowError(f'unknown user id {user_id}')
+        return user_id
+
+    def rvm(self, row):
+        rvm_id = _int(row.get('rvm_id'), 'rvm_id')
+        if rvm_id not in self.rvm_ids:
+            raise RowError(f'unknown RVM {rvm_id}')
+        return rvm_id
+
+    def material(self, row):
+        name = (row.get('material') or '').strip().lower()
+        if name:
+            if name not in self.materials_by_name:
+                raise RowError(f'unknown material {name}')
+            return self.materials_by_name[name]
+        material_id = _int(row.get('material_id'), 'material_id')
+        if material_id not in self.materials:
+            raise RowError(f'unknown material id {material_id}')
+        return self.materials[material_id]
+
+
+def read_records(path):
+    """
+    Yield dicts from a .csv or .jsonl / .ndjson file. A line that isn't valid JSON
+    (or not an object) comes out as a RowError instead, skipped like any other bad record.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as handle:
+        if extension == '.csv':
+            yield from csv.DictReader(handle)
+        elif extension in ('.jsonl', '.ndjson'):
+            for line in handle:
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError as error:
+                        record = RowError(f'invalid JSON: {error}')
+                    if not isinstance(record, (dict, RowError)):
+                        record = RowError(f'not a JSON object: {line.strip()[:40]}')
+                    yield record
+        else:
+            raise ValueError(f'Unsupported file type: {path} (expected .csv, .jsonl or .ndjson)')
+
+
+def build_activity(row, maps):
+    """Turn one record into an unsaved RecyclingActivity, or raise RowError"""
+    material = maps.material(row)
+    weight = _decimal(row.get('weight'), 'weight', WEIGHT_QUANTUM)
+    if not WEIGHT_QUANTUM <= weight < MAX_WEIGHT:
+        raise RowError(f'weight out of range: {weight}')
+
+    points = row.get('points_earned')
+    if points in (None, ''):
+        points = weight * material.points_per_kg
+    points = _decimal(points, 'points_earned', POINTS_QUANTUM)
+    if not 0 <= points < MAX_POINTS:
+        raise RowError(f'points_earned out of range: {points}')
+
+    raw_timestamp = row.get('timestamp')
+    try:
+        timestamp = parse_datetime(str(raw_timestamp)) if raw_timestamp else None
+    except ValueError:  # well formed but impossible, e.g. February 30th
+        timestamp = None
+    if timestamp is None:
+        raise RowError(f'invalid timestamp: {raw_timestamp!r}')
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    return RecyclingActivity(
+        user_id=maps.user(row),
+        rvm_id=maps.rvm(row),
+        material=material,
+        weight=weight,
+        points_earned=points,
+        timestamp=timestamp,
+    )
+
+
+def import_file(path, batch_size=5000, restart=False):
+    """
+    Import one source file, resuming from its checkpoint. Returns a summary dict.
+    Safe to run in a worker process - every call loads its own key maps.
+    """
+    source = os.path.abspath(path)
+    if restart:
+        ImportCheckpoint.objects.filter(source=source).delete()
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+
+    summary = {
+        'source': source, 'imported': 0, 'skipped': 0, 'errors': [],
+        'resumed_at': checkpoint.position, 'already_completed': checkpoint.completed,
+    }
+    if checkpoint.completed:
+        return summary
+
+    maps = KeyMaps()
+    batch = []
+    skipped = 0
+    for position, row in enumerate(read_records(source), start=1):
+        if position <= checkpoint.position:
+            continue
+        try:
+            if isinstance(row, RowError):
+                raise row
+            batch.append(build_activity(row, maps))
+        except (RowError, TypeError, AttributeError) as error:
+            skipped += 1
+            if len(summary['errors']) < ERROR_SAMPLES:
+                summary['errors'].append(f'record {position}: {error}')
+
+        if len(batch) + skipped >= batch_size:
+            _write_batch(checkpoint, batch, position, skipped)
+            summary['imported'] += len(batch)
+            summary['skipped'] += skipped
+            batch, skipped = [], 0
+
+    position = checkpoint.position + len(batch) + skipped
+    _write_batch(checkpoint, batch, position, skipped, completed=True)
+    summary['imported'] += len(batch)
+    summary['skipped'] += skipped
+    return summary
+
+
+def _write_batch(checkpoint, activities, position, skipped, completed=False):
+    """Insert one batch and advance the checkpoint in the same transaction"""
+    timestamps = [activity.timestamp for activity in activities]
+    if checkpoint.first_timestamp:
+        timestamps.append(checkpoint.first_timestamp)
+    if checkpoint.last_timestamp:
+        timestamps.append(checkpoint.last_timestamp)
+
+    with transaction.atomic():
+        RecyclingActivity.objects.bulk_create(activities)
+        apply_deposits_in_bulk(activities)
+
+        checkpoint.position = position
+        checkpoint.imported += len(activities)
+        checkpoint.skipped += skipped
+        checkpoint.first_timestamp = min(timestamps, default=None)
+        checkpoint.last_timestamp = max(timestamps, default=None)
+        checkpoint.completed = completed
+        checkpoint.save()
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'invalid {name}: {value!r}')
+
+
+def _decimal(value, name, quantum):
+    try:
+        number = Decimal(str(value).strip()).quantize(quantum)
+    except (InvalidOperation, ValueError):
+        raise RowError(f'invalid {name}: {value!r}')
+    if not number.is_finite():
+        raise RowError(f'invalid {name}: {value!r}')
+    return number
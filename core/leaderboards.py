@@ -0,0 +1,127 @@
+"""
+Leaderboards of top recyclers - kept current by the deposit path, rebuilt by rebuild_leaderboards.
+
+Every board is a set of LeaderboardEntry rows (one per user) indexed on (board, -score):
+the top N is a scan of the first N index entries and a user's rank is one plus the
+number of entries scoring more, counted on the same index. Both are a single query,
+but the count walks every entry ahead of the user - O(rank), not O(log n). That's about
+25 ms on SQLite for the last of 100k users and keeps the deposit path at one upsert per
+board; a score histogram kept up by every deposit would make ranks O(buckets) at the
+cost of another contended write.
+Boards: 'global', 'rvm:<id>' for deposits at one machine and 'month:<YYYY-MM>' (UTC).
+"""
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import LeaderboardEntry, RecyclingActivity
+from . import services
+
+GLOBAL = 'global'
+KINDS = ['global', 'rvm', 'month']
+REBUILD_BATCH = 2000
+
+
+def rvm_board(rvm_id):
+    return f'rvm:{rvm_id}'
+
+
+def month_board(timestamp):
+    """Board of the UTC month a timestamp (or date) falls into"""
+    if hasattr(timestamp, 'astimezone'):
+        timestamp = timestamp.astimezone(dt_timezone.utc)
+    return f'month:{timestamp:%Y-%m}'
+
+
+def boards_for(activity):
+    return [GLOBAL, rvm_board(activity.rvm_id), month_board(activity.timestamp)]
+
+
+def update_leaderboards(activities):
+    """Add freshly inserted activities to every board they count on (caller owns the transaction)"""
+    totals = defaultdict(lambda: {'score': Decimal(0), 'deposits': 0})
+    for activity in activities:
+        for board in boards_for(activity):
+            entry = totals[(board, activity.user_id)]
+            entry['score'] += activity.points_earned
+            entry['deposits'] += 1
+
+    # sorted keys keep the row lock order stable between concurrent deposits
+    for (board, user_id), entry in sorted(totals.items()):
+        services.increment_or_create(
+            LeaderboardEntry, {'board': board, 'user_id': user_id},
+            updates={'score': F('score') + entry['score'], 'deposits': F('deposits') + entry['deposits']},
+            defaults=entry,
+        )
+
+
+def top(board, limit):
+    """The best `limit` entries of a board, users joined, each with .rank (ties share a rank)"""
+    entries = list(
+        LeaderboardEntry.objects.filter(board=board).select_related('user').order_by('-score', 'user_id')[:limit]
+    )
+    for position, entry in enumerate(entries):
+        previous = entries[position - 1] if position else None
+        entry.rank = previous.rank if previous and previous.score == entry.score else position + 1
+    return entries
+
+
+def rank_of(board, user):
+    """A user's entry on a board with .rank set, None before their first deposit there (O(rank), see above)"""
+    ahead = (
+        LeaderboardEntry.objects.filter(board=OuterRef('board'), score__gt=OuterRef('score'))
+        .order_by().values('board').annotate(count=Count('pk')).values('count')
+    )
+    entry = (
+        LeaderboardEntry.objects.filter(board=board, user=user)
+        .annotate(ahead=Coalesce(Subquery(ahead), Value(0)))
+        .first()
+    )
+    if entry is not None:
+        entry.rank = entry.ahead + 1
+        entry.user = user
+    return entry
+
+
+def rebuild_leaderboards(kind):
+    """Recompute every board of a kind ('global', 'rvm', 'month') from raw activities (caller owns the transaction)"""
+    if kind == GLOBAL:
+        LeaderboardEntry.objects.filter(board=GLOBAL).delete()
+        rows = _aggregate(RecyclingActivity.objects.all(), 'user_id')
+        entries = (_entry(GLOBAL, row) for row in rows)
+    elif kind == 'rvm':
+        LeaderboardEntry.objects.filter(board__startswith='rvm:').delete()
+        rows = _aggregate(RecyclingActivity.objects.all(), 'rvm_id', 'user_id')
+        entries = (_entry(rvm_board(row['rvm_id']), row) for row in rows)
+    else:
+        LeaderboardEntry.objects.filter(board__startswith='month:').delete()
+        activities = RecyclingActivity.objects.annotate(month=TruncMonth('timestamp', tzinfo=dt_timezone.utc))
+        rows = _aggregate(activities, 'month', 'user_id')
+        entries = (_entry(month_board(row['month']), row) for row in rows)
+
+    created = 0
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == REBUILD_BATCH:
+            created += len(LeaderboardEntry.objects.bulk_create(batch))
+            batch = []
+    created += len(LeaderboardEntry.objects.bulk_create(batch))
+    return created
+
+
+def _aggregate(activities, *keys):
+    return (
+        activities
+        .values(*keys)
+        .annotate(score=Sum('points_earned'), deposits=Count('id'))
+        .order_by()
+        .iterator(chunk_size=REBUILD_BATCH)
+    )
+
+
+def _entry(board, row):
+    return LeaderboardEntry(board=board, user_id=row['user_id'], score=row['score'], deposits=row['deposits'])
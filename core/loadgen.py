@@ -0,0 +1,185 @@
+"""
+Synthetic production-shaped data for load and capacity testing (see generate_load_data).
+
+Distributions are deliberately lopsided like the real thing: a few heavy recyclers and
+busy machines account for most deposits (Zipf-like ranks), deposits follow a daily and
+weekly rhythm, and weights are log-normal per material.
+"""
+import math
+import random
+from bisect import bisect
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import geo
+from .models import RVM, MaterialType, RecyclingActivity, RewardWallet, User, UserRole
+from .services import POINTS_QUANTUM, apply_deposits_in_bulk
+
+LOAD_EMAIL_DOMAIN = 'load.example.com'
+LOAD_PASSWORD = 'loadtest123'
+
+# relative deposits per hour of day - quiet nights, a lunch bump and an after-work peak
+HOURLY_PROFILE = [
+    0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.5, 1.0, 1.5, 1.6, 1.7, 2.0,
+    2.4, 2.2, 1.8, 1.7, 1.9, 2.4, 2.8, 2.6, 2.0, 1.4, 0.8, 0.4,
+]
+# Monday .. Sunday, weekends are busier
+WEEKDAY_PROFILE = [1.0, 0.95, 0.95, 1.0, 1.1, 1.4, 1.3]
+# machines were last emptied somewhere within this many hours (for the fill forecasts)
+COLLECTION_INTERVAL_HOURS = 72
+
+# share of deposits and median weight (kg) per material, anything unknown gets the default
+MATERIAL_PROFILE = {
+    'plastic': (5, 0.4),
+    'metal': (2, 0.3),
+    'glass': (2, 1.2),
+    'paper': (1.5, 0.8),
+    'cardboard': (1.5, 1.5),
+}
+DEFAULT_MATERIAL_PROFILE = (1, 0.5)
+
+DEFAULT_MATERIALS = [
+    ('Plastic', Decimal('1.00')),
+    ('Metal', Decimal('3.00')),
+    ('Glass', Decimal('2.00')),
+    ('Paper', Decimal('0.50')),
+    ('Cardboard', Decimal('0.75')),
+]
+
+# area -> approximate center (latitude, longitude)
+LOCATIONS = {
+    'Maadi, Cairo': (29.9602, 31.2569), 'Zamalek, Cairo': (30.0609, 31.2197), 'Heliopolis, Cairo': (30.0911, 31.3225),
+    'Nasr City, Cairo': (30.0561, 31.3301), 'Downtown Cairo': (30.0444, 31.2357), 'Garden City, Cairo': (30.0366, 31.2303),
+    'Mohandessin, Giza': (30.0566, 31.2003), '6th of October City, Giza': (29.9285, 30.9188), 'New Cairo': (30.0074, 31.4913),
+    'Sheikh Zayed, Giza': (30.0444, 30.9763), 'Alexandria': (31.2001, 29.9187), 'Mansoura': (31.0409, 31.3785),
+    'Tanta': (30.7865, 31.0004), 'Port Said': (31.2653, 32.3019), 'Ismailia': (30.5965, 32.2715),
+}
+AREA_SPREAD_DEGREES = 0.05  # machines scatter a few km around their area's center
+
+
+def zipf_cumulative(count, exponent):
+    """Cumulative weights for ranks 1..count with weight 1 / rank**exponent"""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def create_users(count, batch_size=10000):
+    """Bulk insert load-test users (and their empty wallets), returns their ids"""
+    role = UserRole.objects.filter(name='regular_user').first()
+    password = make_password(LOAD_PASSWORD)  # hashed once, the hasher is deliberately slow
+    start = User.objects.filter(email__endswith=f'@{LOAD_EMAIL_DOMAIN}').count()
+    user_ids = []
+    for offset in range(0, count, batch_size):
+        numbers = range(start + offset, start + min(offset + batch_size, count))
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    email=f'user{number}@{LOAD_EMAIL_DOMAIN}',
+                    first_name='Load',
+                    last_name=f'User {number}',
+                    password=password,
+                    role=role,
+                )
+                for number in numbers
+            ])
+            RewardWallet.objects.bulk_create([RewardWallet(user_id=user.pk) for user in users])
+        user_ids.extend(user.pk for user in users)
+    return user_ids
+
+
+def create_rvms(count, rng):
+    start = RVM.objects.count()
+    areas = sorted(LOCATIONS)
+    rvms = []
+    for number in range(count):
+        area = rng.choice(areas)
+        latitude = LOCATIONS[area][0] + rng.gauss(0, AREA_SPREAD_DEGREES)
+        longitude = LOCATIONS[area][1] + rng.gauss(0, AREA_SPREAD_DEGREES)
+        rvms.append(RVM(
+            name=f'Load RVM {start + number}', location=area,
+            # bulk_create skips RVM.save(), which would set the geohash
+            latitude=latitude, longitude=longitude, geohash=geo.encode(latitude, longitude),
+            last_collected_at=timezone.now() - timedelta(hours=rng.uniform(0, COLLECTION_INTERVAL_HOURS)),
+        ))
+    return [rvm.pk for rvm in RVM.objects.bulk_create(rvms)]
+
+
+def ensure_materials():
+    """Active materials, creating the default set when there are none yet"""
+    materials = list(MaterialType.objects.filter(is_active=True).order_by('pk'))
+    if not materials:
+        for name, points_per_kg in DEFAULT_MATERIALS:
+            MaterialType.objects.get_or_create(name=name, defaults={'points_per_kg': points_per_kg})
+        materials = list(MaterialType.objects.filter(is_active=True).order_by('pk'))
+    return materials
+
+
+class DepositSampler:
+    """Draws (user, rvm, material, weight, timestamp) tuples with production-like skew"""
+    def __init__(self, user_ids, rvm_ids, materials, days, end, seed):
+        self.rng = random.Random(seed)
+        # shuffled so the heavy recyclers and busy machines aren't simply the lowest ids
+        self.user_ids = list(user_ids)
+        self.rvm_ids = list(rvm_ids)
+        shuffler = random.Random(f'ranks-{seed}')
+        shuffler.shuffle(self.user_ids)
+        shuffler.shuffle(self.rvm_ids)
+        self.user_weights = zipf_cumulative(len(self.user_ids), 1.1)
+        self.rvm_weights = zipf_cumulative(len(self.rvm_ids), 0.8)
+
+        self.materials = materials
+        profiles = [MATERIAL_PROFILE.get(material.name.lower(), DEFAULT_MATERIAL_PROFILE) for material in materials]
+        self.material_weights = list(accumulate(share for share, _ in profiles))
+        self.weight_mu = [math.log(median) for _, median in profiles]
+
+        # whole days back from `end` (today included), weighted by weekday
+        first_day = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.days = [first_day + timedelta(days=offset) for offset in range(days + 1)]
+        self.day_weights = list(accumulate(WEEKDAY_PROFILE[day.weekday()] for day in self.days))
+        self.hour_weights = list(accumulate(HOURLY_PROFILE))
+        self.end = end
+
+    def pick(self, population, cumulative):
+        return population[bisect(cumulative, self.rng.random() * cumulative[-1])]
+
+    def timestamp(self):
+        while True:
+            day = self.pick(self.days, self.day_weights)
+            hour = bisect(self.hour_weights, self.rng.random() * self.hour_weights[-1])
+            timestamp = day + timedelta(hours=hour, seconds=self.rng.randrange(3600))
+            if timestamp <= self.end:  # later today hasn't happened yet
+                return timestamp
+
+    def activities(self, count):
+        rng = self.rng
+        activities = []
+        for _ in range(count):
+            index = bisect(self.material_weights, rng.random() * self.material_weights[-1])
+            material = self.materials[index]
+            weight = Decimal(min(max(rng.lognormvariate(self.weight_mu[index], 0.6), 0.01), 25)).quantize(Decimal('0.001'))
+            activities.append(RecyclingActivity(
+                user_id=self.pick(self.user_ids, self.user_weights),
+                rvm_id=self.pick(self.rvm_ids, self.rvm_weights),
+                material=material,
+                weight=weight,
+                points_earned=(weight * material.points_per_kg).quantize(POINTS_QUANTUM),
+                timestamp=self.timestamp(),
+            ))
+        return activities
+
+
+def generate_activities(count, user_ids, rvm_ids, materials, days, end, seed, batch_size=10000):
+    """Insert `count` deposits batch by batch with their ledger rows, wallet and RVM updates"""
+    sampler = DepositSampler(user_ids, rvm_ids, materials, days, end, seed)
+    written = 0
+    while written < count:
+        activities = sampler.activities(min(batch_size, count - written))
+        with transaction.atomic():
+            RecyclingActivity.objects.bulk_create(activities)
+            apply_deposits_in_bulk(activities)
+        written += len(activities)
+    return written
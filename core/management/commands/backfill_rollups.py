@@ -0,0 +1,56 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+from core.models import RecyclingActivity
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly/daily activity rollups from RecyclingActivity, one chunk of days at a time'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD, default: first activity)')
+        parser.add_argument('--end', help='Last day to rebuild, inclusive (YYYY-MM-DD, default: last activity)')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days per transaction (default 7)')
+    
+    def handle(self, *args, **options):
+        bounds = RecyclingActivity.objects.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        if bounds['first'] is None:
+            self.stdout.write('No activities, nothing to backfill.')
+            return
+        
+        start = self._day(options['start'], bounds['first'])
+        end = self._day(options['end'], bounds['last']) + timedelta(days=1)
+        if start >= end:
+            raise CommandError('--start must not be after --end')
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1')
+        
+        # chunks are whole UTC days so every daily bucket is rebuilt in one go
+        step = timedelta(days=options['chunk_days'])
+        chunk_start = start
+        total = 0
+        while chunk_start < end:
+            chunk_end = min(chunk_start + step, end)
+            with transaction.atomic():
+                created = rebuild_rollups(chunk_start, chunk_end)
+            total += created
+            self.stdout.write(f'{chunk_start:%Y-%m-%d} .. {chunk_end:%Y-%m-%d}: {created} rollup rows')
+            chunk_start = chunk_end
+        
+        self.stdout.write(self.style.SUCCESS(f'Backfill completed: {total} rollup rows written.'))
+    
+    def _day(self, value, fallback):
+        if value is None:
+            day = fallback.astimezone(dt_timezone.utc).date()
+        else:
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                raise CommandError(f'Invalid date: {value}')
+        return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
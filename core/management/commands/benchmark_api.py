@@ -0,0 +1,216 @@
+import contextlib
+import http.client
+import itertools
+import json
+import platform
+import subprocess
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from core.benchmarking import live_server, percentile, run_threaded, seed_dataset, summarize, test_database
+
+# endpoint -> (path, method, needs the admin token)
+ENDPOINTS = {
+    'deposit': ('/api/deposit/', 'post', False),
+    'summary': ('/api/summary/', 'get', False),
+    'wallet': ('/api/wallet/', 'get', False),
+    'wallet-transactions': ('/api/wallet/transactions/', 'get', False),
+    'rvms': ('/api/rvms/', 'get', False),
+    'activities': ('/api/activities/', 'get', False),
+    'admin-users': ('/api/admin/users/', 'get', True),
+    'admin-rvms': ('/api/admin/rvms/', 'get', True),
+    'admin-activities': ('/api/admin/activities/', 'get', True),
+    'admin-wallets': ('/api/admin/wallets/', 'get', True),
+}
+MODES = ('client', 'http')
+COMPARED = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_avg')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a sized, production-shaped dataset in a throwaway database and benchmark the API: '
+        'throughput, p50/p95/p99 latency and SQL queries per request for every endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Seeded users (default 1000)')
+        parser.add_argument('--rvms', type=int, default=50, help='Seeded RVMs (default 50)')
+        parser.add_argument('--activities', type=int, default=50000, help='Seeded deposits (default 50000)')
+        parser.add_argument('--days', type=int, default=30, help='Days the seeded deposits span (default 30)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the dataset (default 42)')
+        parser.add_argument('--token-users', type=int, default=50, help='Users the requests rotate through (default 50)')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f"Comma separated, from: {', '.join(ENDPOINTS)}")
+        parser.add_argument('--modes', default=','.join(MODES), help='client (test client, sequential, counts queries) and/or http (threaded HTTP against a live server)')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint and mode (default 200)')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint and mode first (default 10)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Threads in http mode (default 10)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON instead of a table')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+        parser.add_argument('--baseline', help='A previous JSON report to compare against')
+
+    def handle(self, *args, **options):
+        endpoints = self._pick(options['endpoints'], ENDPOINTS, 'endpoint')
+        modes = self._pick(options['modes'], MODES, 'mode')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Could not read baseline: {error}')
+
+        dataset = {name: options[name] for name in ('users', 'rvms', 'activities', 'days', 'seed', 'token_users')}
+        results = []
+        with test_database():
+            started = time.perf_counter()
+            data = seed_dataset(**dataset)
+            self.stderr.write(f'Seeded {options["activities"]} deposits in {time.perf_counter() - started:.1f}s')
+
+            for mode in modes:
+                context = live_server() if mode == 'http' else contextlib.nullcontext()
+                with context as address:
+                    for name in endpoints:
+                        path, method, admin = ENDPOINTS[name]
+                        request = _Request(path, method, data, admin)
+                        if mode == 'client':
+                            stats = self.run_client(request, options['requests'], options['warmup'])
+                        else:
+                            stats = self.run_http(request, address, options['requests'], options['warmup'], options['concurrency'])
+                        results.append({'endpoint': name, 'mode': mode, 'path': path, **stats})
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'dataset': dataset,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(results, baseline)
+
+    def run_client(self, request, total, warmup):
+        """Sequential requests through the test client, each one inside a query counter"""
+        client = Client(raise_request_exception=False)
+        for _ in range(warmup):
+            request.via_client(client)
+
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(total):
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                ok = request.via_client(client)
+                latencies.append(time.perf_counter() - request_started)
+            queries.append(len(captured))
+            errors += not ok
+        stats = summarize(latencies, time.perf_counter() - started, errors)
+        queries.sort()
+        stats['queries_avg'] = round(sum(queries) / len(queries), 2)
+        stats['queries_p50'] = percentile(queries, 50)
+        stats['queries_max'] = queries[-1]
+        return stats
+
+    def run_http(self, request, address, total, warmup, concurrency):
+        """`concurrency` threads with their own connections against the live server"""
+        for _ in range(warmup):
+            request.via_http(address)
+        return run_threaded(lambda: lambda: request.via_http(address), total, concurrency)
+
+    def print_table(self, results, baseline):
+        previous = {}
+        if baseline:
+            previous = {(row['endpoint'], row['mode']): row for row in baseline.get('results', [])}
+
+        self.stdout.write(
+            f"{'endpoint':<21}{'mode':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}"
+        )
+        for row in results:
+            queries = row.get('queries_avg', '-')
+            self.stdout.write(
+                f"{row['endpoint']:<21}{row['mode']:<8}{row['throughput_rps']:>9}{row['p50_ms']:>9}"
+                f"{row['p95_ms']:>9}{row['p99_ms']:>9}{queries:>9}{row['errors']:>8}"
+            )
+            before = previous.get((row['endpoint'], row['mode']))
+            if before:
+                self.stdout.write(f"{'':<29}" + ''.join(f'{_change(row, before, key):>9}' for key in COMPARED))
+
+    def _pick(self, value, choices, label):
+        picked = [name for name in value.split(',') if name]
+        unknown = set(picked) - set(choices)
+        if unknown or not picked:
+            raise CommandError(f"Unknown {label}(s): {', '.join(sorted(unknown)) or '(none)'} - pick from {', '.join(choices)}")
+        return picked
+
+
+class _Request:
+    """One endpoint's request, rotating through the seeded users (and RVMs for deposits)"""
+    def __init__(self, path, method, data, admin):
+        self.path = path
+        self.method = method
+        keys = [data['admin_key']] if admin else data['keys']
+        self.keys = itertools.cycle(keys)
+        self.bodies = itertools.cycle([
+            json.dumps({'rvm_id': rvm_id, 'material_id': material_id, 'weight': '0.750'})
+            for rvm_id, material_id in zip(data['rvm_ids'], itertools.cycle(data['material_ids']))
+        ])
+
+    def headers(self):
+        # next() on itertools.cycle is atomic enough under the GIL for rotating test users
+        return {'Authorization': f'Token {next(self.keys)}'}
+
+    def via_client(self, client):
+        if self.method == 'post':
+            response = client.post(self.path, next(self.bodies), content_type='application/json', headers=self.headers())
+        else:
+            response = client.get(self.path, headers=self.headers())
+        return response.status_code < 400
+
+    def via_http(self, address):
+        conn = http.client.HTTPConnection(*address, timeout=30)
+        try:
+            # "testserver" is the host the test environment adds to ALLOWED_HOSTS
+            headers = {'Host': 'testserver', **self.headers()}
+            if self.method == 'post':
+                headers['Content-Type'] = 'application/json'
+                conn.request('POST', self.path, body=next(self.bodies), headers=headers)
+            else:
+                conn.request('GET', self.path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status < 400
+        except OSError:
+            return False
+        finally:
+            conn.close()
+
+
+def _change(row, before, key):
+    if key not in row or not before.get(key):
+        return '-'
+    return f'{(row[key] - before[key]) / before[key] * 100:+.1f}%'
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
@@ -0,0 +1,86 @@
+import itertools
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from core.benchmarking import run_async, run_threaded, seed_small_dataset, test_database
+
+# endpoint -> (DRF path, native async path, method)
+ENDPOINTS = {
+    'wallet': ('/api/wallet/', '/api/async/wallet/', 'get'),
+    'summary': ('/api/summary/', '/api/async/summary/', 'get'),
+    'rvms': ('/api/rvms/?status=active', '/api/async/rvms/?status=active', 'get'),
+    'deposit': ('/api/deposit/', '/api/async/deposit/', 'post'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI (threads) and ASGI (event loop) throughput of the sync and native async endpoints at a fixed concurrency'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight (default 20)')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode (default 500)')
+        parser.add_argument('--endpoints', default='wallet,summary,rvms', help=f"Comma separated, from: {', '.join(ENDPOINTS)}")
+        parser.add_argument('--users', type=int, default=20, help='Seeded users, requests rotate through them (default 20)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    
+    def handle(self, *args, **options):
+        endpoints = [name for name in options['endpoints'].split(',') if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+        
+        results = []
+        with test_database():
+            keys, rvm_ids, material_ids = seed_small_dataset(users=options['users'])
+            deposit = {'rvm_id': rvm_ids[0], 'material_id': material_ids[0], 'weight': '0.5'}
+            
+            for name in endpoints:
+                sync_path, async_path, method = ENDPOINTS[name]
+                body = deposit if method == 'post' else None
+                for mode, path in (('wsgi', sync_path), ('asgi', sync_path), ('asgi', async_path)):
+                    run = self._run_wsgi if mode == 'wsgi' else self._run_asgi
+                    stats = run(path, method, body, keys, options['requests'], options['concurrency'])
+                    results.append({'endpoint': name, 'mode': mode, 'path': path, **stats})
+        
+        if options['json']:
+            self.stdout.write(json.dumps({'concurrency': options['concurrency'], 'results': results}, indent=2))
+            return
+        
+        self.stdout.write(f"{'endpoint':<10}{'mode':<6}{'path':<36}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['endpoint']:<10}{row['mode']:<6}{row['path']:<36}{row['throughput_rps']:>9}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['errors']:>8}"
+            )
+    
+    def _run_wsgi(self, path, method, body, keys, total, concurrency):
+        rotation = itertools.cycle(keys)
+        
+        def make_worker():
+            client = Client(raise_request_exception=False)
+            
+            def do_request():
+                headers = {'Authorization': f'Token {next(rotation)}'}
+                if method == 'post':
+                    response = client.post(path, body, content_type='application/json', headers=headers)
+                else:
+                    response = client.get(path, headers=headers)
+                return response.status_code < 400
+            return do_request
+        
+        return run_threaded(make_worker, total, concurrency)
+    
+    def _run_asgi(self, path, method, body, keys, total, concurrency):
+        rotation = itertools.cycle(keys)
+        client = AsyncClient(raise_request_exception=False)
+        
+        async def do_request():
+            headers = {'Authorization': f'Token {next(rotation)}'}
+            if method == 'post':
+                response = await client.post(path, body, content_type='application/json', headers=headers)
+            else:
+                response = await client.get(path, headers=headers)
+            return response.status_code < 400
+        
+        return run_async(do_request, total, concurrency)
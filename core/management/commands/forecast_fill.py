@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.forecasting import HORIZON_DAYS, forecast_fleet
+from core.models import RVM
+
+
+class Command(BaseCommand):
+    help = (
+        'Forecast how full every RVM is and when it will be full, from the activity rollups, '
+        'soonest full first - the input for planning collection rounds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', choices=[choice for choice, label in RVM.STATUS_CHOICES], help='Only machines with this status')
+        parser.add_argument('--within-hours', type=float, help='Only machines expected to be full within this many hours')
+        parser.add_argument('--limit', type=int, default=50, help='Machines to list (default 50, 0 for all)')
+
+    def handle(self, *args, **options):
+        if options['limit'] < 0:
+            raise CommandError('--limit must be 0 or more')
+        rvms = RVM.objects.all()
+        if options['status']:
+            rvms = rvms.filter(status=options['status'])
+
+        started = time.perf_counter()
+        results = forecast_fleet(rvms)
+        elapsed = time.perf_counter() - started
+        scored = len(results)
+        if options['within_hours'] is not None:
+            results = [
+                result for result in results
+                if result['hours_to_full'] is not None and result['hours_to_full'] <= options['within_hours']
+            ]
+
+        listed = results[:options['limit']] if options['limit'] else results
+        if listed:
+            self.stdout.write(f"{'RVM':>6}  {'name':<24} {'fill kg':>10} {'fill %':>7} {'kg/day':>8} {'full in (h)':>11}")
+        for result in listed:
+            full_in = f"{result['hours_to_full']:.1f}" if result['hours_to_full'] is not None else f'>{HORIZON_DAYS * 24}'
+            self.stdout.write(
+                f"{result['id']:>6}  {(result['name'] or result['location'])[:24]:<24} {result['fill_kg']:>10.1f} "
+                f"{result['fill_percent']:>7.1f} {result['rate_kg_per_day']:>8.1f} {full_in:>11}"
+            )
+        due = f", {len(results)} full within {options['within_hours']:g}h" if options['within_hours'] is not None else ''
+        self.stdout.write(self.style.SUCCESS(f'Scored {scored} machines in {elapsed:.2f}s{due}.'))
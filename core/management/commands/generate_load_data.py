@@ -0,0 +1,72 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.caching import bump_version
+from core.loadgen import LOAD_EMAIL_DOMAIN, LOAD_PASSWORD, create_rvms, create_users, ensure_materials, generate_activities
+from core.parallel import require_fork, run_forked
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate production-shaped synthetic users, RVMs and deposits for load and capacity testing. '
+        'Everything goes through bulk_create; user stats and rollups are rebuilt once at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='New users to create (default 1000)')
+        parser.add_argument('--rvms', type=int, default=50, help='New RVMs to create (default 50)')
+        parser.add_argument('--activities', type=int, default=100000, help='Deposits to generate (default 100000)')
+        parser.add_argument('--days', type=int, default=90, help='Spread deposits over this many days back from now (default 90)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed gives the same data (default 42)')
+        parser.add_argument('--workers', type=int, default=1, help='Processes generating deposits in parallel (default 1, worth raising on PostgreSQL)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per bulk insert and transaction (default 10000)')
+        parser.add_argument('--skip-rebuild', action='store_true', help='Leave user stats, rollups and leaderboards to a later rebuild_stats / backfill_rollups / rebuild_leaderboards run')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'rvms', 'activities', 'days', 'workers', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1")
+        workers = options['workers']
+        if workers > 1:
+            require_fork()
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        materials = ensure_materials()
+        user_ids = create_users(options['users'], options['batch_size'])
+        rvm_ids = create_rvms(options['rvms'], rng)
+        # bulk_create sends no signals, tell the reference caches about the new machines/materials
+        bump_version('materials')
+        bump_version('rvm-status')
+        bump_version('rvms')
+        self.stdout.write(
+            f"Created {len(user_ids)} users (password '{LOAD_PASSWORD}', *@{LOAD_EMAIL_DOMAIN}) and {len(rvm_ids)} RVMs."
+        )
+
+        end = timezone.now().replace(microsecond=0)
+        generation_started = time.perf_counter()
+        shares = [options['activities'] // workers + (index < options['activities'] % workers) for index in range(workers)]
+        jobs = [
+            (share, user_ids, rvm_ids, materials, options['days'], end, f"{options['seed']}-{index}", options['batch_size'])
+            for index, share in enumerate(shares) if share
+        ]
+        if len(jobs) == 1:
+            written = generate_activities(*jobs[0])
+        else:
+            written = sum(run_forked(generate_activities, jobs, len(jobs)))
+        elapsed = time.perf_counter() - generation_started
+        self.stdout.write(f'Generated {written} deposits in {elapsed:.1f}s ({written / elapsed * 60:,.0f} rows/minute).')
+
+        if not options['skip_rebuild']:
+            call_command('rebuild_stats', batch_size=options['batch_size'], stdout=self.stdout)
+            first_day = end - timedelta(days=options['days'])
+            call_command('backfill_rollups', start=f'{first_day:%Y-%m-%d}', end=f'{end:%Y-%m-%d}', stdout=self.stdout)
+            call_command('rebuild_leaderboards', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(f'Load data ready in {time.perf_counter() - started:.1f}s.'))
+
@@ -0,0 +1,82 @@
+import os
+from datetime import timezone as dt_timezone
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from core.importing import import_file
+from core.models import ImportCheckpoint
+from core.parallel import run_forked
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import historical recycling activities from CSV / JSONL files. Each file is a shard '
+        'with its own resumable checkpoint; wallets and the ledger are written batch by batch, '
+        'user stats and rollups are rebuilt once at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='.csv, .jsonl or .ndjson files (columns as in the admin export)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Records per transaction (default 5000)')
+        parser.add_argument('--workers', type=int, default=1, help='Files imported in parallel, one process per file (default 1)')
+        parser.add_argument('--restart', action='store_true', help='Ignore existing checkpoints and import the files from the top')
+        parser.add_argument('--skip-rebuild', action='store_true', help='Leave user stats, rollups and leaderboards to a later rebuild_stats / backfill_rollups / rebuild_leaderboards run')
+
+    def handle(self, *args, **options):
+        files = options['files']
+        for path in files:
+            if not os.path.isfile(path):
+                raise CommandError(f'No such file: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        workers = min(options['workers'], len(files))
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+
+        job = (options['batch_size'], options['restart'])
+        if workers == 1:
+            summaries = (import_file(path, *job) for path in files)
+        else:
+            summaries = self.run_parallel(files, workers, job)
+
+        imported = skipped = 0
+        for summary in summaries:
+            imported += summary['imported']
+            skipped += summary['skipped']
+            if summary['already_completed']:
+                self.stdout.write(f"{summary['source']}: already imported, use --restart to import it again")
+                continue
+            resumed = f" (resumed after record {summary['resumed_at']})" if summary['resumed_at'] else ''
+            self.stdout.write(f"{summary['source']}: {summary['imported']} imported, {summary['skipped']} skipped{resumed}")
+            for error in summary['errors']:
+                self.stdout.write(self.style.WARNING(f'  {error}'))
+
+        if not options['skip_rebuild']:
+            self.rebuild_aggregates(files, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Import completed: {imported} activities imported, {skipped} records skipped.'))
+
+    def run_parallel(self, files, workers, job):
+        return run_forked(
+            import_file, [(path, *job) for path in files], workers,
+            message='--workers > 1 needs the fork start method, run one process per file instead',
+        )
+
+    def rebuild_aggregates(self, files, batch_size):
+        # derived tables are rebuilt from the activities themselves, so reruns are harmless
+        sources = [os.path.abspath(path) for path in files]
+        bounds = ImportCheckpoint.objects.filter(source__in=sources).aggregate(
+            first=Min('first_timestamp'), last=Max('last_timestamp'),
+        )
+        if bounds['first'] is None:
+            return
+        call_command('rebuild_stats', batch_size=batch_size, stdout=self.stdout)
+        call_command(
+            'backfill_rollups',
+            start=f"{bounds['first'].astimezone(dt_timezone.utc):%Y-%m-%d}",
+            end=f"{bounds['last'].astimezone(dt_timezone.utc):%Y-%m-%d}",
+            stdout=self.stdout,
+        )
+        call_command('rebuild_leaderboards', stdout=self.stdout)
+
@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stored Idempotency-Key answers older than IDEMPOTENCY_KEY_TTL_HOURS, in small batches '
+        'so the table is never locked for long. Run it periodically (e.g. hourly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 72), help='Keep keys this many hours (default: IDEMPOTENCY_KEY_TTL_HOURS)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement (default 5000)')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches, to go easy on a busy database')
+
+    def handle(self, *args, **options):
+        if options['hours'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--hours and --batch-size must be at least 1')
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        expired = IdempotencyKey.objects.filter(created_at__lt=cutoff)
+
+        deleted = 0
+        while True:
+            # oldest first off the created_at index, then a primary key delete - each batch commits on its own
+            ids = list(expired.order_by('created_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+            if len(ids) < options['batch_size']:
+                break
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} idempotency keys created before {cutoff.isoformat()}.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.leaderboards import KINDS, rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the leaderboards (global, per RVM, per month) from RecyclingActivity history'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--boards', default=','.join(KINDS), help=f"Comma separated board kinds to rebuild (default: {','.join(KINDS)})")
+    
+    def handle(self, *args, **options):
+        kinds = [kind for kind in options['boards'].split(',') if kind]
+        unknown = set(kinds) - set(KINDS)
+        if unknown or not kinds:
+            raise CommandError(f"--boards takes a list of: {', '.join(KINDS)}")
+        
+        total = 0
+        for kind in kinds:
+            # one transaction per kind - readers see the old boards until the new ones are complete
+            with transaction.atomic():
+                created = rebuild_leaderboards(kind)
+            total += created
+            self.stdout.write(f'{kind}: {created} entries')
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboards: {total} entries written.'))
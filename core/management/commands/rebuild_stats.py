@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.contrib.auth import get_user_model
+from core.caching import bump_version
+from core.models import RVM, RecyclingActivity, UserStats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized per-user stats and RVM activity counters from RecyclingActivity history'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Users per chunk (default 5000)')
+    
+    def handle(self, *args, **options):
+        self.rebuild_user_stats(options['batch_size'])
+        self.rebuild_rvm_counters()
+    
+    def rebuild_user_stats(self, batch_size):
+        bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No users, nothing to rebuild.')
+            return
+        
+        rebuilt = 0
+        # walk the user keyspace in id ranges so each chunk is one grouped query and one insert
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            end = start + batch_size
+            totals = (
+                RecyclingActivity.objects
+                .filter(user_id__gte=start, user_id__lt=end)
+                .values('user_id')
+                .annotate(
+                    total_weight=Sum('weight'),
+                    total_points=Sum('points_earned'),
+                    deposits_count=Count('id'),
+                    first_deposit_at=Min('timestamp'),
+                    last_deposit_at=Max('timestamp'),
+                )
+                .order_by()
+            )
+            with transaction.atomic():
+                UserStats.objects.filter(user_id__gte=start, user_id__lt=end).delete()
+                created = UserStats.objects.bulk_create([UserStats(**row) for row in totals])
+            rebuilt += len(created)
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {rebuilt} users.'))
+    
+    def rebuild_rvm_counters(self):
+        counts = (
+            RecyclingActivity.objects.filter(rvm=OuterRef('pk'))
+            .order_by().values('rvm').annotate(total=Count('id')).values('total')
+        )
+        updated = RVM.objects.update(activity_count=Coalesce(Subquery(counts), Value(0)))
+        bump_version('rvms')
+        self.stdout.write(self.style.SUCCESS(f'Recounted activities for {updated} RVMs.'))
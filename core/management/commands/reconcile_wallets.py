@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from core.models import RecyclingActivity, RewardWallet
+from core.parallel import run_forked
+from core.reconciliation import reconcile_range
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare every RewardWallet.points with its RewardTransaction ledger, and the recycling part of the '
+        'ledger with RecyclingActivity.points_earned. Wallet id ranges are checked in parallel processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 8), help='Processes checking ranges in parallel (default: CPU count, at most 8)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Wallet ids per range (default 10000)')
+        parser.add_argument('--fix', action='store_true', help='Set drifted balances to their ledger sum')
+        parser.add_argument('--adjust', action='store_true', help='Also post reconciliation_adjustment ledger rows for activity points missing from the ledger (implies --fix)')
+        parser.add_argument('--report', help='Write every discrepancy to this file as JSON')
+        parser.add_argument('--show', type=int, default=20, help='Discrepancies to print (default 20)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1')
+
+        # activities can belong to users that have no wallet row yet
+        wallets = RewardWallet.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        users = RecyclingActivity.objects.aggregate(low=Min('user_id'), high=Max('user_id'))
+        lows = [value for value in (wallets['low'], users['low']) if value is not None]
+        if not lows:
+            self.stdout.write('No wallets or activities, nothing to reconcile.')
+            return
+        low = min(lows)
+        high = max(value for value in (wallets['high'], users['high']) if value is not None)
+        ranges = [(start, start + options['batch_size']) for start in range(low, high + 1, options['batch_size'])]
+
+        fix = options['fix'] or options['adjust']
+        started = time.perf_counter()
+        checked = 0
+        discrepancies = []
+        for result in self.run(ranges, options['workers'], fix, options['adjust']):
+            checked += result['wallets']
+            discrepancies.extend(result['discrepancies'])
+        elapsed = time.perf_counter() - started
+        discrepancies.sort(key=lambda found: found['wallet'])
+
+        if options['report']:
+            with open(options['report'], 'w') as handle:
+                json.dump(discrepancies, handle, indent=2, default=str)
+
+        for found in discrepancies[:options['show']]:
+            notes = []
+            if found['fixed']:
+                notes.append('fixed')
+            if fix and found['needs_adjust']:
+                notes.append('needs --adjust')
+            suffix = f" ({', '.join(notes)})" if notes else ''
+            self.stdout.write(
+                f"wallet {found['wallet']}: {', '.join(found['issues'])} - points {found['points']}, "
+                f"ledger {found['ledger']}, recycling ledger {found['recycling_ledger']}, "
+                f"activities {found['activities']}{suffix}"
+            )
+        if len(discrepancies) > options['show']:
+            self.stdout.write(f'... and {len(discrepancies) - options["show"]} more')
+
+        by_issue = {}
+        for found in discrepancies:
+            for issue in found['issues']:
+                by_issue[issue] = by_issue.get(issue, 0) + 1
+        drift = sum(abs(found['points'] - found['ledger']) for found in discrepancies)
+        summary = ', '.join(f'{count} {issue}' for issue, count in sorted(by_issue.items())) or 'none'
+        needs_adjust = sum(found['needs_adjust'] for found in discrepancies)
+        style = self.style.SUCCESS if not discrepancies or (fix and not needs_adjust) else self.style.WARNING
+        self.stdout.write(style(
+            f'Checked {checked} wallets in {elapsed:.1f}s ({len(ranges)} ranges). '
+            f'Discrepancies: {summary}. Balance drift: {drift} pts.'
+            + (f" Fixed {sum(found['fixed'] for found in discrepancies)}." if fix else '')
+            + (f' {needs_adjust} need --adjust to settle activity points.' if fix and needs_adjust else '')
+        ))
+
+    def run(self, ranges, workers, fix, adjust):
+        if workers == 1 or len(ranges) == 1:
+            for start, end in ranges:
+                yield reconcile_range(start, end, fix, adjust)
+            return
+        yield from run_forked(reconcile_range, [(start, end, fix, adjust) for start, end in ranges], workers)
+
@@ -51,20 +51,20 @@ class Command(BaseCommand):
         
         # create some sample RVMs in Cairo locations
         rvms_data = [
-            {'name': 'Maadi Station', 'location': 'Maadi Corniche, Cairo'},
-            {'name': 'Zamalek Location', 'location': 'Zamalek, Gezira Island, Cairo'},
-            {'name': 'Heliopolis Campus', 'location': 'Heliopolis, Cairo'},
-            {'name': 'Nasr City Park', 'location': 'Nasr City, Cairo'},
-            {'name': 'Downtown Cairo', 'location': 'Tahrir Square, Downtown Cairo'},
-            {'name': 'Garden City', 'location': 'Garden City, Cairo'},
-            {'name': 'Mohandessin', 'location': 'Mohandessin, Giza'},
-            {'name': '6th of October', 'location': '6th of October City, Giza'},
+            {'name': 'Maadi Station', 'location': 'Maadi Corniche, Cairo', 'latitude': 29.9602, 'longitude': 31.2569},
+            {'name': 'Zamalek Location', 'location': 'Zamalek, Gezira Island, Cairo', 'latitude': 30.0609, 'longitude': 31.2197},
+            {'name': 'Heliopolis Campus', 'location': 'Heliopolis, Cairo', 'latitude': 30.0911, 'longitude': 31.3225},
+            {'name': 'Nasr City Park', 'location': 'Nasr City, Cairo', 'latitude': 30.0561, 'longitude': 31.3301},
+            {'name': 'Downtown Cairo', 'location': 'Tahrir Square, Downtown Cairo', 'latitude': 30.0444, 'longitude': 31.2357},
+            {'name': 'Garden City', 'location': 'Garden City, Cairo', 'latitude': 30.0366, 'longitude': 31.2303},
+            {'name': 'Mohandessin', 'location': 'Mohandessin, Giza', 'latitude': 30.0566, 'longitude': 31.2003},
+            {'name': '6th of October', 'location': '6th of October City, Giza', 'latitude': 29.9285, 'longitude': 30.9188},
         ]
         
         for rvm_data in rvms_data:
             rvm, created = RVM.objects.get_or_create(
                 name=rvm_data['name'],
-                defaults={'location': rvm_data['location']}
+                defaults={'location': rvm_data['location'], 'latitude': rvm_data['latitude'], 'longitude': rvm_data['longitude']}
             )
             if created:
                 self.stdout.write(f'Created RVM: {rvm.name} at {rvm.location}')
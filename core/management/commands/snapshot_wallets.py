@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.models import RewardTransaction, RewardWallet, WalletSnapshot
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CENT = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = (
+        'Checkpoint wallet balances: for every wallet with new ledger rows, store the balance from all '
+        'transactions before --as-of, built from its previous snapshot plus the rows since. Run it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='ISO datetime to snapshot up to (default: now minus --lag-minutes)')
+        parser.add_argument('--lag-minutes', type=int, default=5, help='Stay this far behind now so in-flight transactions are not missed (default 5)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Wallets per chunk (default 5000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        as_of = self._as_of(options)
+
+        bounds = RewardWallet.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No wallets, nothing to snapshot.')
+            return
+
+        # previous snapshot per wallet, and the ledger rows between it and as_of
+        previous = WalletSnapshot.objects.filter(wallet=OuterRef('pk'), as_of__lt=as_of).order_by('-as_of')
+        tail = (
+            RewardTransaction.objects
+            .filter(wallet=OuterRef('pk'), timestamp__lt=as_of, timestamp__gte=OuterRef('since'))
+            .order_by().values('wallet')
+        )
+        amount = DecimalField(max_digits=12, decimal_places=2)
+
+        created = 0
+        for start in range(bounds['low'], bounds['high'] + 1, options['batch_size']):
+            end = start + options['batch_size']
+            wallets = (
+                RewardWallet.objects.filter(pk__gte=start, pk__lt=end)
+                .annotate(
+                    previous_as_of=Subquery(previous.values('as_of')[:1]),
+                    previous_balance=Coalesce(Subquery(previous.values('balance')[:1]), Value(0), output_field=amount),
+                )
+                .annotate(since=Coalesce(F('previous_as_of'), Value(EPOCH)))
+                .annotate(
+                    tail_total=Subquery(tail.annotate(total=Sum('change_amount')).values('total'), output_field=amount),
+                    tail_last_id=Subquery(tail.annotate(last=Max('id')).values('last')),
+                )
+                # wallets without new rows keep their previous snapshot
+                .filter(tail_last_id__isnull=False)
+                .values_list('pk', 'previous_balance', 'tail_total', 'tail_last_id')
+            )
+            snapshots = [
+                WalletSnapshot(
+                    wallet_id=wallet_id,
+                    as_of=as_of,
+                    balance=(previous_balance + tail_total).quantize(CENT),
+                    last_transaction_id=last_id,
+                )
+                for wallet_id, previous_balance, tail_total, last_id in wallets
+            ]
+            with transaction.atomic():
+                # rerunning with the same --as-of replaces that snapshot
+                WalletSnapshot.objects.filter(wallet_id__gte=start, wallet_id__lt=end, as_of=as_of).delete()
+                WalletSnapshot.objects.bulk_create(snapshots)
+            created += len(snapshots)
+
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {created} wallets as of {as_of.isoformat()}.'))
+
+    def _as_of(self, options):
+        now = timezone.now()
+        if not options['as_of']:
+            return now - timedelta(minutes=options['lag_minutes'])
+        as_of = parse_datetime(options['as_of'])
+        if as_of is None:
+            raise CommandError(f"Invalid --as-of: {options['as_of']}")
+        if timezone.is_naive(as_of):
+            as_of = timezone.make_aware(as_of)
+        if as_of > now:
+            raise CommandError('--as-of must not be in the future')
+        return as_of
+
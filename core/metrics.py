@@ -0,0 +1,141 @@
+"""
+In-process request metrics - histograms fed by PerformanceMiddleware, served at /metrics.
+
+Every worker process keeps its own numbers (Prometheus scrapes each one, or sums them).
+Updates are a bisect and a few additions under a lock, cheap enough to leave on.
+"""
+import hmac
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """A labelled Prometheus histogram"""
+    def __init__(self, name, documentation, buckets, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labelnames = labelnames
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, counts, total in snapshot:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                bucket_labels = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {cumulative}')
+            label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+            lines.append(f'{self.name}_sum{label_text} {_number(total)}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+LABELS = ('endpoint', 'method', 'status')
+
+REQUEST_DURATION = Histogram('rvm_request_duration_seconds', 'Total time spent handling the request.', LATENCY_BUCKETS, LABELS)
+DB_DURATION = Histogram('rvm_request_db_duration_seconds', 'Time spent in database queries per request.', LATENCY_BUCKETS, LABELS)
+DB_QUERIES = Histogram('rvm_request_db_queries', 'Database queries per request.', QUERY_BUCKETS, LABELS)
+VIEW_DURATION = Histogram(
+    'rvm_request_view_duration_seconds',
+    'Python time inside the view (serializers included), database time excluded.',
+    LATENCY_BUCKETS, LABELS,
+)
+RENDER_DURATION = Histogram('rvm_request_render_duration_seconds', 'Time spent rendering template/DRF responses.', LATENCY_BUCKETS, LABELS)
+RESPONSE_SIZE = Histogram('rvm_response_size_bytes', 'Response body size.', SIZE_BUCKETS, LABELS)
+
+HISTOGRAMS = [REQUEST_DURATION, DB_DURATION, DB_QUERIES, VIEW_DURATION, RENDER_DURATION, RESPONSE_SIZE]
+
+
+class RequestMetrics:
+    """What one request spent where - lives in a context variable while the request runs"""
+    __slots__ = ('queries', 'db_time', 'view_started', 'view_db_time', 'view_time', 'render_started', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_db_time = 0.0
+        self.view_time = None
+        self.render_started = None
+        self.render_time = None
+
+
+# a context variable rather than a thread local: asgiref copies the context into the
+# threads sync_to_async runs ORM calls in, so async views are counted too
+current_request = ContextVar('rvm_request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """connection.execute_wrapper hook - adds the query's time to the current request, if any"""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += perf_counter() - started
+        metrics.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver - every new database connection reports to record_query"""
+    # at the front: connection.execute_wrapper() blocks pop from the end when they exit
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition, for 'Authorization: Bearer <METRICS_TOKEN>' (the scraper)
+    or a staff session (a quick look from the browser). Nobody else, token set or not.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    supplied = request.headers.get('Authorization', '')
+    allowed = bool(token) and hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+    if not (allowed or request.user.is_staff):
+        return HttpResponseForbidden('Forbidden\n', content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
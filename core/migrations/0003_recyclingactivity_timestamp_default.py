@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recyclingactivity',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
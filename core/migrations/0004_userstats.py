@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def populate_user_stats(apps, schema_editor):
+    """Seed UserStats from existing activities (manage.py rebuild_stats does the same in chunks)"""
+    RecyclingActivity = apps.get_model('core', 'RecyclingActivity')
+    UserStats = apps.get_model('core', 'UserStats')
+    totals = (
+        RecyclingActivity.objects
+        .values('user_id')
+        .annotate(
+            total_weight=Sum('weight'),
+            total_points=Sum('points_earned'),
+            deposits_count=Count('id'),
+            first_deposit_at=Min('timestamp'),
+            last_deposit_at=Max('timestamp'),
+        )
+        .order_by()
+    )
+    UserStats.objects.bulk_create([UserStats(**row) for row in totals], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_recyclingactivity_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_weight', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('total_points', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposits_count', models.PositiveIntegerField(default=0)),
+                ('first_deposit_at', models.DateTimeField(blank=True, null=True)),
+                ('last_deposit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+        migrations.RunPython(populate_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RVMActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('weight', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('points', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposits', models.PositiveIntegerField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.materialtype')),
+                ('rvm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.rvm')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rvm', 'period', 'bucket'], name='core_rvmact_rvm_id_7584ae_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'rvm', 'material'), name='unique_rvm_rollup_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('weight', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('points', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposits', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'period', 'bucket'], name='core_userac_user_id_709e56_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'user'), name='unique_user_rollup_bucket')],
+            },
+        ),
+    ]
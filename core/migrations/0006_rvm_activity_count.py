@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_activity_count(apps, schema_editor):
+    RVM = apps.get_model('core', 'RVM')
+    RecyclingActivity = apps.get_model('core', 'RecyclingActivity')
+    counts = (
+        RecyclingActivity.objects.filter(rvm=OuterRef('pk'))
+        .order_by().values('rvm').annotate(total=Count('id')).values('total')
+    )
+    RVM.objects.update(activity_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rvm',
+            name='activity_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_activity_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_rvm_activity_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recyclingactivity',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='core_recycl_user_id_e8d45c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclingactivity',
+            index=models.Index(fields=['rvm', '-timestamp', '-id'], name='core_recycl_rvm_id_74defe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclingactivity',
+            index=models.Index(fields=['-timestamp', '-id'], name='core_recycl_timesta_9a3fdf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rewardtransaction',
+            index=models.Index(fields=['wallet', '-timestamp', '-id'], name='core_reward_wallet__c52098_idx'),
+        ),
+    ]
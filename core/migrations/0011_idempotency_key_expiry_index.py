@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='idempotencykey',
+            index=models.Index(fields=['created_at'], name='core_idempo_created_bb3e28_idx'),
+        ),
+    ]
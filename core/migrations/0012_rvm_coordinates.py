@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-17 03:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_idempotency_key_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rvm',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='rvm',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='rvm',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='rvm',
+            index=models.Index(fields=['status', 'geohash'], name='core_rvm_status_729cdb_idx'),
+        ),
+    ]
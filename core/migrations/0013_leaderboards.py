@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-17 04:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_rvm_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=32)),
+                ('score', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposits', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard entries',
+                'indexes': [models.Index(fields=['board', '-score', 'user'], name='core_leader_board_2462c2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'user'), name='unique_leaderboard_entry')],
+            },
+        ),
+    ]
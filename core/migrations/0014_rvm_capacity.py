@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-17 04:09
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rvm',
+            name='capacity_kg',
+            field=models.DecimalField(decimal_places=2, default=500, max_digits=8, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='rvm',
+            name='last_collected_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
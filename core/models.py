@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.core.validators import MinValueValidator, RegexValidator
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+from django.utils import timezone
 from decimal import Decimal
 
+from . import geo
+
 
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication"""
@@ -65,17 +68,46 @@ class User(AbstractUser):
     
     def summary(self):
         """Get user's recycling stats - used in Task 3 requirements"""
-        total_weight = sum(activity.weight for activity in self.recyclingactivity_set.all())
-        total_points = sum(activity.points_earned for activity in self.recyclingactivity_set.all())
-        
+        # single primary-key read, the deposit path keeps UserStats up to date
+        try:
+            stats = UserStats.objects.get(pk=self.pk)
+        except UserStats.DoesNotExist:
+            stats = UserStats(user=self)  # no deposits yet
+        return self._summary_from(stats)
+    
+    async def asummary(self):
+        """Async twin of summary() for the ASGI views"""
+        try:
+            stats = await UserStats.objects.aget(pk=self.pk)
+        except UserStats.DoesNotExist:
+            stats = UserStats(user=self)
+        return self._summary_from(stats)
+    
+    def _summary_from(self, stats):
         return {
-            'total_recycled_weight': float(total_weight),
-            'total_points_earned': float(total_points),
-            'deposits_count': self.recyclingactivity_set.count(),
+            'total_recycled_weight': float(stats.total_weight),
+            'total_points_earned': float(stats.total_points),
+            'deposits_count': stats.deposits_count,
             'member_since': self.created_at.strftime('%Y-%m-%d')
         }
 
 
+class UserStats(models.Model):
+    """Running totals of a user's deposits - updated in the same transaction as every deposit"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_weight = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    total_points = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    deposits_count = models.PositiveIntegerField(default=0)
+    first_deposit_at = models.DateTimeField(null=True, blank=True)
+    last_deposit_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.deposits_count} deposits, {self.total_weight}kg"
+    
+    class Meta:
+        verbose_name_plural = "User stats"
+
+
 class MaterialType(models.Model):
     """Different types of recyclable materials and their point values"""
     name = models.CharField(max_length=100, unique=True)  # Plastic, Glass, Metal, etc.
@@ -105,15 +137,44 @@ class RVM(models.Model):
     location = models.CharField(max_length=255)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     last_usage = models.DateTimeField(null=True, blank=True)
+    # maintained by the deposit path so listings don't COUNT(*) per machine
+    activity_count = models.PositiveIntegerField(default=0, editable=False)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # grid cell of the coordinates, set by save() - the nearest-machine index (see core.geo)
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
+    # bin size and when it was last emptied - what the fill forecasts start from (see core.forecasting)
+    capacity_kg = models.DecimalField(max_digits=8, decimal_places=2, default=500, validators=[MinValueValidator(1)])
+    last_collected_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         if self.name:
             return f"{self.name} - {self.location}"
         return f"RVM {self.id} - {self.location}"
     
+    def save(self, *args, **kwargs):
+        # bulk_create() and update() skip this - set geohash with geo.encode() there
+        located = self.latitude is not None and self.longitude is not None
+        self.geohash = geo.encode(self.latitude, self.longitude) if located else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # activity_count moves by F() increments from concurrent deposits - writing back
+            # the value loaded with this instance would undo them
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'activity_count'
+            ]
+        super().save(*args, **kwargs)
+    
     class Meta:
         # order by most recently used
         ordering = ['-last_usage']
+        indexes = [
+            # nearby active machines: range scans over geohash cell prefixes
+            models.Index(fields=['status', 'geohash']),
+        ]
 
 
 class RewardWallet(models.Model):
@@ -127,15 +188,47 @@ class RewardWallet(models.Model):
     
     def add_points(self, amount, reason="deposit"):
         """Add points and create transaction record"""
+        with transaction.atomic():
+            # create transaction record
+            RewardTransaction.objects.create(
+                wallet=self,
+                change_amount=amount,
+                reason=reason
+            )
+            # increment in the database so concurrent deposits don't overwrite each other
+            RewardWallet.objects.filter(pk=self.pk).update(points=models.F('points') + amount)
         self.points += amount
-        self.save()
-        
-        # create transaction record
-        RewardTransaction.objects.create(
-            wallet=self,
-            change_amount=amount,
-            reason=reason
+    
+    def balance_at(self, when):
+        """Ledger balance from every transaction before `when` - nearest snapshot plus the rows after it"""
+        snapshot = self.snapshots.filter(as_of__lte=when).order_by('-as_of').first()
+        transactions = self.rewardtransaction_set.filter(timestamp__lt=when)
+        balance = Decimal(0)
+        if snapshot is not None:
+            transactions = transactions.filter(timestamp__gte=snapshot.as_of)
+            balance = snapshot.balance
+        tail = transactions.aggregate(total=models.Sum('change_amount'))['total'] or 0
+        return (balance + Decimal(tail)).quantize(Decimal('0.01'))
+    
+    def statement(self, start, end):
+        """Opening/closing balance, totals and the transactions of [start, end)"""
+        opening = self.balance_at(start)
+        transactions = self.rewardtransaction_set.filter(timestamp__gte=start, timestamp__lt=end)
+        totals = transactions.aggregate(
+            credits=models.Sum('change_amount', filter=models.Q(change_amount__gt=0)),
+            debits=models.Sum('change_amount', filter=models.Q(change_amount__lt=0)),
         )
+        credits = Decimal(totals['credits'] or 0).quantize(Decimal('0.01'))
+        debits = Decimal(totals['debits'] or 0).quantize(Decimal('0.01'))
+        return {
+            'start': start,
+            'end': end,
+            'opening_balance': opening,
+            'credits': credits,
+            'debits': debits,
+            'closing_balance': opening + credits + debits,
+            'transactions': transactions.order_by('timestamp', 'id'),
+        }
 
 
 class RewardTransaction(models.Model):
@@ -143,13 +236,39 @@ class RewardTransaction(models.Model):
     wallet = models.ForeignKey(RewardWallet, on_delete=models.CASCADE)
     change_amount = models.DecimalField(max_digits=10, decimal_places=2)  # can be negative
     reason = models.CharField(max_length=100)  # deposit, redemption, adjustment, etc.
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add - imported history keeps the time of the original deposit
+    timestamp = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.wallet.user.email} - {self.change_amount} ({self.reason})"
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # wallet history feeds, newest first
+            models.Index(fields=['wallet', '-timestamp', '-id']),
+        ]
+
+
+class WalletSnapshot(models.Model):
+    """
+    A wallet's balance from every ledger row before `as_of`, written by manage.py snapshot_wallets.
+    Historical balances and statements start from the nearest one instead of the first transaction.
+    """
+    wallet = models.ForeignKey(RewardWallet, on_delete=models.CASCADE, related_name='snapshots')
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_transaction_id = models.BigIntegerField(null=True, blank=True)  # newest ledger row included
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Wallet {self.wallet_id} - {self.balance} pts before {self.as_of}"
+    
+    class Meta:
+        constraints = [
+            # also the index behind "latest snapshot before X" for one wallet
+            models.UniqueConstraint(fields=['wallet', 'as_of'], name='unique_wallet_snapshot'),
+        ]
 
 
 class RecyclingActivity(models.Model):
@@ -167,26 +286,150 @@ class RecyclingActivity(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.00'))]
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add - buffered deposits uploaded by offline RVMs keep their original time
+    timestamp = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.user.email} - {self.weight}kg {self.material.name} at RVM {self.rvm.id}"
     
     def save(self, *args, **kwargs):
-        # auto-calculate points if not set
+        # auto-calculate points if not set, rounded like the column - the wallet gets the same amount
         if not self.points_earned:
             self.points_earned = self.weight * self.material.points_per_kg
+        self.points_earned = Decimal(self.points_earned).quantize(Decimal('0.01'))
         
-        # update RVM last usage
-        self.rvm.last_usage = self.timestamp
-        self.rvm.save()
+        # edits don't award points again
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
         
-        # add points to user's wallet
-        wallet, created = RewardWallet.objects.get_or_create(user=self.user)
-        wallet.add_points(self.points_earned, f"recycling_{self.material.name.lower()}")
-        
-        super().save(*args, **kwargs)
+        # new deposit: insert, touch the RVM and credit the wallet in one transaction
+        from .services import apply_deposits  # services imports the models
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            apply_deposits([self])
     
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = "Recycling activities"  # looks better in admin
+        indexes = [
+            # keyset pagination on (timestamp, id) for the per-user, per-RVM and admin feeds
+            models.Index(fields=['user', '-timestamp', '-id']),
+            models.Index(fields=['rvm', '-timestamp', '-id']),
+            models.Index(fields=['-timestamp', '-id']),
+        ]
+
+
+class ActivityRollup(models.Model):
+    """Shared fields for the pre-aggregated deposit totals - one row per time bucket and key"""
+    PERIOD_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()  # start of the hour/day in UTC
+    weight = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    points = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    deposits = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+
+
+class RVMActivityRollup(ActivityRollup):
+    """Deposit totals per RVM and material - maintained on deposit, backfilled by backfill_rollups"""
+    rvm = models.ForeignKey(RVM, on_delete=models.CASCADE)
+    material = models.ForeignKey(MaterialType, on_delete=models.CASCADE)
+    
+    def __str__(self):
+        return f"RVM {self.rvm_id} / material {self.material_id} @ {self.bucket} ({self.period})"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'rvm', 'material'], name='unique_rvm_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['rvm', 'period', 'bucket']),
+        ]
+
+
+class UserActivityRollup(ActivityRollup):
+    """Deposit totals per user - maintained on deposit, backfilled by backfill_rollups"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    
+    def __str__(self):
+        return f"User {self.user_id} @ {self.bucket} ({self.period})"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'user'], name='unique_user_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'period', 'bucket']),
+        ]
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A user's score on one leaderboard - maintained on deposit, backfilled by rebuild_leaderboards.
+    Boards: 'global', 'rvm:<id>' and 'month:<YYYY-MM>' (UTC), see core.leaderboards.
+    """
+    board = models.CharField(max_length=32)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    score = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # points earned on the board
+    deposits = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.board}: user {self.user_id} - {self.score}"
+    
+    class Meta:
+        verbose_name_plural = "Leaderboard entries"
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            # top-N is a scan of the first N entries, a rank counts the entries ahead
+            models.Index(fields=['board', '-score', 'user']),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """How far import_activities got through a source file, so a rerun picks up where it stopped"""
+    source = models.CharField(max_length=500, unique=True)  # absolute path of the file
+    position = models.PositiveBigIntegerField(default=0)  # records consumed, imported or skipped
+    imported = models.PositiveBigIntegerField(default=0)
+    skipped = models.PositiveBigIntegerField(default=0)
+    first_timestamp = models.DateTimeField(null=True, blank=True)  # range of imported deposits
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.source} @ {self.position}{' (done)' if self.completed else ''}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a request sent with an Idempotency-Key, so a retry gets the
+    same answer instead of being applied twice. One row per user, scope and key.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=50)  # which endpoint the key belongs to, e.g. "redeem"
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # hash of the request payload
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.user_id})"
+    
+    class Meta:
+        constraints = [
+            # the lookup a retry is answered from
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            # expiry sweep of purge_idempotency_keys
+            models.Index(fields=['created_at']),
+        ]
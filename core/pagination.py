@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TimestampCursorPagination(CursorPagination):
+    """
+    Keyset pagination for activity and transaction feeds, newest first.
+
+    Pages are addressed by an opaque cursor on (timestamp, id) instead of an offset,
+    so page 1000 is the same index range scan as page 1.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key for admin lists, newest rows first"""
+    ordering = ('-pk',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class StatementCursorPagination(TimestampCursorPagination):
+    """The transactions of a wallet statement, oldest first like a bank statement"""
+    ordering = ('timestamp', 'id')
+    page_size = 100
+    max_page_size = 500
@@ -0,0 +1,29 @@
+"""Fork-based process pools for the management commands that split their work across --workers"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import CommandError
+from django.db import connections
+
+
+def require_fork(message='--workers > 1 needs the fork start method'):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise CommandError(message)
+
+
+def run_forked(func, jobs, workers, message='--workers > 1 needs the fork start method'):
+    """Yield func(*job) for every job from forked worker processes, in completion order"""
+    require_fork(message)
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        futures = [pool.submit(_call_in_worker, func, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _call_in_worker(func, job):
+    try:
+        return func(*job)
+    finally:
+        connections.close_all()
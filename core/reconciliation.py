@@ -0,0 +1,105 @@
+"""
+Wallet reconciliation (see the reconcile_wallets command).
+
+For one range of wallet ids, three grouped aggregates give everything needed: the
+stored balances, the ledger per wallet (all rows and recycling rows only) and the
+points earned per user from RecyclingActivity. The ledger is the source of truth
+for balances, the activities are the source of truth for recycling credits.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import RecyclingActivity, RewardTransaction, RewardWallet
+
+CENT = Decimal('0.01')
+RECYCLING_PREFIX = 'recycling_'
+ADJUSTMENT_REASON = 'reconciliation_adjustment'
+
+
+def reconcile_range(start, end, fix=False, adjust=False):
+    """Check wallets with start <= id < end. Returns {'wallets': n, 'discrepancies': [...]}"""
+    points = dict(RewardWallet.objects.filter(pk__gte=start, pk__lt=end).values_list('pk', 'points'))
+    ledger = {
+        row['wallet_id']: row
+        for row in (
+            RewardTransaction.objects.filter(wallet_id__gte=start, wallet_id__lt=end)
+            .values('wallet_id')
+            .annotate(
+                total=Sum('change_amount'),
+                recycling=Sum('change_amount', filter=Q(reason__startswith=RECYCLING_PREFIX) | Q(reason=ADJUSTMENT_REASON)),
+            )
+            .order_by()
+        )
+    }
+    earned = dict(
+        RecyclingActivity.objects.filter(user_id__gte=start, user_id__lt=end)
+        .values('user_id').annotate(total=Sum('points_earned')).order_by()
+        .values_list('user_id', 'total')
+    )
+
+    discrepancies = []
+    for wallet_id in sorted(set(points) | set(earned)):
+        row = ledger.get(wallet_id, {})
+        found = {
+            'wallet': wallet_id,
+            'points': _cents(points.get(wallet_id)),
+            'ledger': _cents(row.get('total')),
+            'recycling_ledger': _cents(row.get('recycling')),
+            'activities': _cents(earned.get(wallet_id)),
+        }
+        issues = []
+        if wallet_id not in points:
+            issues.append('missing_wallet')
+        elif found['points'] != found['ledger']:
+            issues.append('balance')
+        if found['recycling_ledger'] != found['activities']:
+            issues.append('activities')
+        if issues:
+            found['issues'] = issues
+            found['fixed'] = fix_wallet(wallet_id, adjust) if fix or adjust else False
+            # only a ledger adjustment can settle activity points, --fix alone leaves them
+            found['needs_adjust'] = 'activities' in issues and not adjust
+            discrepancies.append(found)
+
+    return {'wallets': len(points), 'discrepancies': discrepancies}
+
+
+def fix_wallet(wallet_id, adjust=False):
+    """
+    Bring one wallet back in line, under a row lock so concurrent deposits are not lost.
+    adjust: first post a ledger row covering activity points that never made it into
+    the ledger (or were credited twice). Then the balance is set to the ledger sum.
+    Returns whether anything was written.
+    """
+    with transaction.atomic():
+        changed = False
+        if adjust:
+            # missing wallets are created empty, the adjustment below credits them
+            _, changed = RewardWallet.objects.get_or_create(pk=wallet_id)
+        wallet = RewardWallet.objects.select_for_update().filter(pk=wallet_id).first()
+        if wallet is None:
+            return False
+        transactions = RewardTransaction.objects.filter(wallet_id=wallet_id)
+
+        if adjust:
+            recycling = transactions.filter(
+                Q(reason__startswith=RECYCLING_PREFIX) | Q(reason=ADJUSTMENT_REASON)
+            ).aggregate(total=Sum('change_amount'))['total']
+            earned = RecyclingActivity.objects.filter(user_id=wallet_id).aggregate(total=Sum('points_earned'))['total']
+            difference = _cents(earned) - _cents(recycling)
+            if difference:
+                RewardTransaction.objects.create(wallet_id=wallet_id, change_amount=difference, reason=ADJUSTMENT_REASON)
+                changed = True
+
+        balance = _cents(transactions.aggregate(total=Sum('change_amount'))['total'])
+        if _cents(wallet.points) != balance:
+            RewardWallet.objects.filter(pk=wallet_id).update(points=balance)
+            changed = True
+    return changed
+
+
+def _cents(value):
+    # SQLite hands decimal sums back through floats, round to the column's precision
+    return Decimal(value or 0).quantize(CENT)
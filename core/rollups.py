@@ -0,0 +1,120 @@
+"""Hourly/daily rollups of deposits - kept current by the deposit path, queried by the analytics API"""
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+
+from .models import RVMActivityRollup, UserActivityRollup, RecyclingActivity
+from . import services
+
+PERIODS = ['hour', 'day']
+
+# what the analytics API can group by, and which stored period it reads from
+SERIES_PERIODS = {
+    'hour': ('hour', None),
+    'day': ('day', None),
+    'week': ('day', TruncWeek),
+    'month': ('day', TruncMonth),
+}
+
+
+def bucket_start(timestamp, period):
+    """Start of the UTC hour/day a timestamp falls into"""
+    timestamp = timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def update_rollups(activities):
+    """Fold freshly inserted activities into both rollup tables (caller owns the transaction)"""
+    rvm_totals = defaultdict(_empty_totals)
+    user_totals = defaultdict(_empty_totals)
+    for activity in activities:
+        for period in PERIODS:
+            bucket = bucket_start(activity.timestamp, period)
+            _add(rvm_totals[(period, bucket, activity.rvm_id, activity.material_id)], activity)
+            _add(user_totals[(period, bucket, activity.user_id)], activity)
+    
+    # sorted keys keep the row lock order stable between concurrent deposits
+    for (period, bucket, rvm_id, material_id), totals in sorted(rvm_totals.items()):
+        services.increment_or_create(
+            RVMActivityRollup,
+            {'period': period, 'bucket': bucket, 'rvm_id': rvm_id, 'material_id': material_id},
+            updates=_increments(totals),
+            defaults=totals,
+        )
+    for (period, bucket, user_id), totals in sorted(user_totals.items()):
+        services.increment_or_create(
+            UserActivityRollup,
+            {'period': period, 'bucket': bucket, 'user_id': user_id},
+            updates=_increments(totals),
+            defaults=totals,
+        )
+
+
+def rebuild_rollups(start, end):
+    """Recompute every rollup row with a bucket in [start, end) from raw activities"""
+    activities = RecyclingActivity.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    created = 0
+    for period, trunc in (('hour', TruncHour), ('day', TruncDay)):
+        RVMActivityRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end).delete()
+        UserActivityRollup.objects.filter(period=period, bucket__gte=start, bucket__lt=end).delete()
+        
+        rows = _aggregate(activities, trunc, 'rvm_id', 'material_id')
+        created += len(RVMActivityRollup.objects.bulk_create(
+            [RVMActivityRollup(period=period, **row) for row in rows], batch_size=2000
+        ))
+        rows = _aggregate(activities, trunc, 'user_id')
+        created += len(UserActivityRollup.objects.bulk_create(
+            [UserActivityRollup(period=period, **row) for row in rows], batch_size=2000
+        ))
+    return created
+
+
+def rollup_series(model, period, start, end, group_by=(), **filters):
+    """
+    Totals per bucket (and per `group_by` key) between start and end, read from rollups only.
+
+    Weekly and monthly series are folded from the daily rows in the database.
+    """
+    stored_period, trunc = SERIES_PERIODS[period]
+    queryset = model.objects.filter(period=stored_period, bucket__gte=start, bucket__lt=end, **filters)
+    if trunc is not None:
+        queryset = queryset.annotate(series_bucket=trunc('bucket', tzinfo=dt_timezone.utc))
+    else:
+        queryset = queryset.annotate(series_bucket=F('bucket'))
+    
+    rows = (
+        queryset
+        .values('series_bucket', *group_by)
+        .annotate(weight=Sum('weight'), points=Sum('points'), deposits=Sum('deposits'))
+        .order_by('series_bucket', *group_by)
+    )
+    return [{'bucket': row.pop('series_bucket'), **row} for row in rows]
+
+
+def _empty_totals():
+    return {'weight': Decimal(0), 'points': Decimal(0), 'deposits': 0}
+
+
+def _add(totals, activity):
+    totals['weight'] += activity.weight
+    totals['points'] += activity.points_earned
+    totals['deposits'] += 1
+
+
+def _increments(totals):
+    return {field: F(field) + value for field, value in totals.items()}
+
+
+def _aggregate(activities, trunc, *keys):
+    return (
+        activities
+        .annotate(bucket=trunc('timestamp', tzinfo=dt_timezone.utc))
+        .values('bucket', *keys)
+        .annotate(weight=Sum('weight'), points=Sum('points_earned'), deposits=Count('id'))
+        .order_by()
+    )
@@ -0,0 +1,166 @@
+"""
+Substring search over user and RVM text fields, for the API filters and the admin.
+
+`filter_queryset(queryset, term, fields)` takes admin-style field paths ('email',
+'user__email', 'rvm__location'). Like the admin, every word of the term has to be
+found in one of the fields. Fields listed in INDEXED_FIELDS are answered from an index:
+
+* SQLite: an FTS5 trigram table per model (<table>_search), kept in sync by triggers.
+  A field matches through `id IN (SELECT rowid ... MATCH ...)`, no table scan.
+* PostgreSQL: pg_trgm GIN indexes on UPPER(column), which serve the plain
+  icontains lookups Django generates.
+* Anything else, words under three characters (too short for trigrams) and fields
+  without an index: icontains.
+
+ensure_indexes() creates whatever is missing and runs after every migrate.
+"""
+import logging
+from functools import reduce
+from operator import and_, or_
+
+from django.apps import apps
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+logger = logging.getLogger(__name__)
+
+# model label -> text fields with a search index
+INDEXED_FIELDS = {
+    'core.user': ('email', 'first_name', 'last_name', 'phone'),
+    'core.rvm': ('name', 'location'),
+}
+MIN_INDEXED_LENGTH = 3  # trigrams
+
+_fts_tables = {}  # database alias -> FTS tables present, filled on first use
+
+
+def filter_queryset(queryset, term, fields):
+    """Rows where every word of `term` appears in one of `fields` (case-insensitive substring)"""
+    words = _words(term)
+    if not words or not fields:
+        return queryset
+    # group the fields by the relation they hang off: {'user': ['email'], '': ['name']}
+    targets = {}
+    for field_path in fields:
+        path, _, name = field_path.rpartition('__')
+        targets.setdefault(path, []).append(name)
+    return queryset.filter(reduce(and_, (
+        reduce(or_, (_word_q(queryset.model, path, names, word) for path, names in targets.items()))
+        for word in words
+    )))
+
+
+def _words(term):
+    words = []
+    for word in smart_split(term or ''):
+        if word[0] in '"\'' and word[0] == word[-1] and len(word) > 1:
+            word = unescape_string_literal(word)
+        if word:
+            words.append(word)
+    return words
+
+
+def _word_q(model, path, names, word):
+    target = model
+    for step in filter(None, path.split('__')):
+        target = target._meta.get_field(step).related_model
+    prefix = f'{path}__' if path else ''
+    indexed = [name for name in names if name in INDEXED_FIELDS.get(target._meta.label_lower, ())]
+    plain = [name for name in names if name not in indexed]
+
+    conditions = [Q(**{f'{prefix}{name}__icontains': word}) for name in plain]
+    table = f'{target._meta.db_table}_search'
+    if indexed and len(word) >= MIN_INDEXED_LENGTH and table in fts_tables(router.db_for_read(target)):
+        # {column ...} : "phrase" - a trigram phrase is a substring match
+        match = '{%s} : "%s"' % (' '.join(indexed), word.replace('"', '""'))
+        rowids = RawSQL(f'SELECT rowid FROM "{table}" WHERE "{table}" MATCH %s', [match])
+        conditions.append(Q(**{f'{prefix}pk__in': rowids}))
+    else:
+        conditions += [Q(**{f'{prefix}{name}__icontains': word}) for name in indexed]
+    return reduce(or_, conditions)
+
+
+def fts_tables(using):
+    """The FTS5 search tables of a SQLite database, empty elsewhere"""
+    if using not in _fts_tables:
+        connection = connections[using]
+        tables = set()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                tables = {name for name, in cursor.fetchall() if name.endswith('_search')}
+        _fts_tables[using] = tables
+    return _fts_tables[using]
+
+
+def ensure_indexes(using='default', rebuild=False):
+    """Create missing search tables, triggers or indexes. rebuild: refill the SQLite tables from scratch."""
+    connection = connections[using]
+    for label, fields in INDEXED_FIELDS.items():
+        model = apps.get_model(label)
+        if not router.allow_migrate_model(using, model):
+            continue
+        if connection.vendor == 'sqlite':
+            _ensure_fts(connection, model, fields, rebuild)
+        elif connection.vendor == 'postgresql':
+            _ensure_trigram(connection, model, fields)
+    _fts_tables.pop(using, None)
+
+
+def _ensure_fts(connection, model, fields, rebuild):
+    source = model._meta.db_table
+    table = f'{source}_search'
+    columns = [model._meta.get_field(name).column for name in fields]
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    new_values = ', '.join(f'new."{column}"' for column in columns)
+    old_values = ', '.join(f'old."{column}"' for column in columns)
+    triggers = {
+        f'{table}_insert': f'AFTER INSERT ON "{source}" BEGIN '
+                           f'INSERT INTO "{table}" (rowid, {column_list}) VALUES (new.id, {new_values}); END',
+        f'{table}_delete': f'AFTER DELETE ON "{source}" BEGIN '
+                           f'INSERT INTO "{table}" ("{table}", rowid, {column_list}) VALUES (\'delete\', old.id, {old_values}); END',
+        # only when a searched column is written, not on last_usage/counter updates
+        f'{table}_update': f'AFTER UPDATE OF {column_list} ON "{source}" BEGIN '
+                           f'INSERT INTO "{table}" ("{table}", rowid, {column_list}) VALUES (\'delete\', old.id, {old_values}); '
+                           f'INSERT INTO "{table}" (rowid, {column_list}) VALUES (new.id, {new_values}); END',
+    }
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name = %s OR tbl_name = %s", [table, source])
+        existing = {name for kind, name in cursor.fetchall()}
+        missing = [name for name in (table, *triggers) if name not in existing]
+        if not missing and not rebuild:
+            return
+        try:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{table}" USING fts5('
+                f"{column_list}, content='{source}', content_rowid='id', tokenize='trigram')"
+            )
+        except DatabaseError as exc:
+            # SQLite without FTS5 or older than 3.34 (no trigram tokenizer) - icontains it is
+            logger.warning('Not creating search index %s: %s', table, exc)
+            return
+        for name, body in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS "{name}" {body}')
+        # new table or triggers that went missing (SQLite migrations rebuild tables, dropping
+        # their triggers) - the index may be behind, refill it from the source table
+        cursor.execute(f'INSERT INTO "{table}" ("{table}") VALUES (\'rebuild\')')
+
+
+def _ensure_trigram(connection, model, fields):
+    source = model._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError as exc:
+            logger.warning('pg_trgm is not available, search runs without trigram indexes: %s', exc)
+            return
+        for name in fields:
+            column = model._meta.get_field(name).column
+            # the expression Django's icontains compiles to, so the planner can use the index
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{source}_{column}_trgm" ON "{source}" '
+                f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
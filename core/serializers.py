@@ -1,7 +1,12 @@
+from decimal import Decimal
 from rest_framework import serializers
+from django.utils import timezone
+from django.db.models import Prefetch
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from .models import User, UserRole, MaterialType, RVM, RewardWallet, RewardTransaction, RecyclingActivity
+from .models import User, UserRole, MaterialType, RVM, RewardWallet, RewardTransaction, RecyclingActivity, LeaderboardEntry
+from . import services
+from .caching import active_materials, rvm_statuses
 
 
 class UserRoleSerializer(serializers.ModelSerializer):
@@ -72,41 +77,67 @@ class MaterialTypeSerializer(serializers.ModelSerializer):
 
 class RVMSerializer(serializers.ModelSerializer):
     """Serializer for RVMs, used in discovery API. Includes activity count."""
-    activity_count = serializers.SerializerMethodField()
+    # counter column kept by the deposit path - no per-row COUNT query
+    activity_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = RVM
-        fields = ['id', 'name', 'location', 'status', 'last_usage', 'activity_count']
+        fields = ['id', 'name', 'location', 'latitude', 'longitude', 'status', 'last_usage', 'activity_count']
         read_only_fields = ['id', 'last_usage', 'activity_count']
     
-    def get_activity_count(self, obj):
-        return obj.recyclingactivity_set.count()
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError("Set both latitude and longitude, or neither")
+        return attrs
+
+
+class NearbyRVMSerializer(RVMSerializer):
+    """RVM plus its distance from the searched point"""
+    distance_km = serializers.FloatField(read_only=True)
+    
+    class Meta(RVMSerializer.Meta):
+        fields = RVMSerializer.Meta.fields + ['distance_km']
+
+
+class RewardTransactionSerializer(serializers.ModelSerializer):
+    """Transaction history serializer - flat, no nested wallet"""
+    
+    class Meta:
+        model = RewardTransaction
+        fields = ['id', 'change_amount', 'reason', 'timestamp']
+        read_only_fields = ['id', 'change_amount', 'reason', 'timestamp']
 
 
 class RewardWalletSerializer(serializers.ModelSerializer):
-    """User's wallet with transaction history"""
-    user = UserSerializer(read_only=True)
+    """User's wallet with its latest transactions - full history is paginated at /api/wallet/transactions/"""
+    RECENT_TRANSACTIONS = 5
+    
+    user_email = serializers.EmailField(source='user.email', read_only=True)
     recent_transactions = serializers.SerializerMethodField()
     
     class Meta:
         model = RewardWallet
-        fields = ['user', 'points', 'credit', 'recent_transactions']
+        fields = ['user', 'user_email', 'points', 'credit', 'recent_transactions']
         read_only_fields = ['user', 'points', 'credit']
     
     def get_recent_transactions(self, obj):
         """Get last 5 transactions"""
-        transactions = obj.rewardtransaction_set.all()[:5]
+        # list views prefetch these (see recent_transactions_prefetch), single wallets do one small query
+        transactions = getattr(obj, 'recent_transactions_list', None)
+        if transactions is None:
+            transactions = obj.rewardtransaction_set.order_by('-timestamp', '-id')[:self.RECENT_TRANSACTIONS]
         return RewardTransactionSerializer(transactions, many=True).data
-
-
-class RewardTransactionSerializer(serializers.ModelSerializer):
-    """Transaction history serializer"""
-    wallet = RewardWalletSerializer(read_only=True)
     
-    class Meta:
-        model = RewardTransaction
-        fields = ['id', 'wallet', 'change_amount', 'reason', 'timestamp']
-        read_only_fields = ['id', 'timestamp']
+    @classmethod
+    def recent_transactions_prefetch(cls):
+        """Prefetch for wallet querysets - one query for the latest transactions of every wallet on the page"""
+        return Prefetch(
+            'rewardtransaction_set',
+            queryset=RewardTransaction.objects.order_by('-timestamp', '-id')[:cls.RECENT_TRANSACTIONS],
+            to_attr='recent_transactions_list',
+        )
 
 
 class RecyclingActivitySerializer(serializers.ModelSerializer):
@@ -125,39 +156,75 @@ class RecyclingActivityCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating new recycling activities"""
     rvm_id = serializers.IntegerField(write_only=True)
     material_id = serializers.IntegerField(write_only=True)
+    # alternative to the Idempotency-Key header, for clients that can't set headers
+    idempotency_key = serializers.CharField(write_only=True, required=False, max_length=255)
     
     class Meta:
         model = RecyclingActivity
-        fields = ['rvm_id', 'material_id', 'weight']
+        fields = ['id', 'rvm_id', 'material_id', 'weight', 'points_earned', 'timestamp', 'idempotency_key']
+        read_only_fields = ['id', 'points_earned', 'timestamp']
     
     def validate_rvm_id(self, value):
         """Check if RVM exists and is active"""
-        try:
-            rvm = RVM.objects.get(id=value)
-            if rvm.status != 'active':
-                raise serializers.ValidationError("RVM is not active")
-            return value
-        except RVM.DoesNotExist:
+        # served from the per-process reference cache, no query on the hot path
+        rvm_status = rvm_statuses().get(value)
+        if rvm_status is None:
             raise serializers.ValidationError("RVM not found")
+        if rvm_status != 'active':
+            raise serializers.ValidationError("RVM is not active")
+        return value
     
     def validate_material_id(self, value):
         """Check if material exists and is active"""
-        try:
-            material = MaterialType.objects.get(id=value, is_active=True)
-            return value
-        except MaterialType.DoesNotExist:
+        if value not in active_materials():
             raise serializers.ValidationError("Material not found or inactive")
+        return value
     
     def create(self, validated_data):
-        # extract the IDs and set the actual objects
-        rvm_id = validated_data.pop('rvm_id')
-        material_id = validated_data.pop('material_id')
-        
-        validated_data['rvm'] = RVM.objects.get(id=rvm_id)
-        validated_data['material'] = MaterialType.objects.get(id=material_id)
-        validated_data['user'] = self.context['request'].user
-        
-        return super().create(validated_data)
+        return services.record_deposit(
+            user=self.context['request'].user,
+            rvm_id=validated_data['rvm_id'],
+            material=active_materials()[validated_data['material_id']],
+            weight=validated_data['weight'],
+        )
+
+
+class DepositBatchItemSerializer(serializers.Serializer):
+    """One deposit inside a batch upload - RVM and material checks happen in bulk in the service"""
+    rvm_id = serializers.IntegerField()
+    material_id = serializers.IntegerField()
+    weight = serializers.DecimalField(max_digits=8, decimal_places=3, min_value=Decimal('0.001'))
+    timestamp = serializers.DateTimeField(required=False)  # when the machine actually took the deposit
+    idempotency_key = serializers.CharField(required=False, max_length=255)
+    
+    def validate_timestamp(self, value):
+        if value > timezone.now():
+            raise serializers.ValidationError("Timestamp is in the future")
+        return value
+
+
+class RedemptionSerializer(serializers.Serializer):
+    """Points to convert into wallet credit"""
+    points = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    
+    def validate_points(self, value):
+        if services.credit_for(value) <= 0:
+            raise serializers.ValidationError("Too few points to convert into credit")
+        return value
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """One line of a leaderboard - first name and last initial only, no contact details"""
+    rank = serializers.IntegerField(read_only=True, allow_null=True)
+    name = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'user', 'name', 'score', 'deposits']
+        read_only_fields = fields
+    
+    def get_name(self, obj):
+        return f"{obj.user.first_name} {obj.user.last_name[:1]}".strip()
 
 
 class UserSummarySerializer(serializers.Serializer):
@@ -0,0 +1,355 @@
+"""Deposit write path - everything a deposit touches, in as few queries as possible"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import IdempotencyKey, RVM, RewardWallet, RewardTransaction, RecyclingActivity, UserStats, WalletSnapshot
+from . import idempotency, leaderboards, rollups
+from .caching import active_materials, bump_version, rvm_statuses
+
+POINTS_QUANTUM = Decimal('0.01')
+WALLET_UPDATE_CHUNK = 500
+DEPOSIT_SCOPE = 'deposit'  # idempotency keys of /api/deposit/ and batch items share one namespace
+
+
+class InsufficientPoints(Exception):
+    """The wallet holds fewer points than the redemption asks for"""
+
+
+def record_deposit(user, rvm_id, material, weight):
+    """Log a single deposit and award its points (one transaction, see RecyclingActivity.save)"""
+    activity = RecyclingActivity(user=user, rvm_id=rvm_id, material=material, weight=weight)
+    activity.save()
+    return activity
+
+
+def deposit_payload(item):
+    """What a deposit's idempotency key is checked against - not the time, a buffered retry may add one"""
+    return {'rvm_id': item['rvm_id'], 'material_id': item['material_id'], 'weight': item['weight']}
+
+
+def deposit_response(activity):
+    """A recorded deposit the way /api/deposit/ answers it, also what is stored under its idempotency key"""
+    return idempotency.serializable({
+        'id': activity.pk,
+        'weight': str(activity.weight),
+        'points_earned': str(Decimal(activity.points_earned).quantize(POINTS_QUANTUM)),
+        'timestamp': activity.timestamp,
+    })
+
+
+def record_deposit_batch(user, items, retry=True):
+    """
+    Log a batch of deposits for one user, e.g. an RVM flushing its offline buffer.
+
+    `items` are dicts with rvm_id, material_id, weight and an optional timestamp and
+    idempotency_key. RVMs and materials are checked against the reference caches,
+    keys against the stored ones in one query, the new deposits are bulk inserted in
+    one transaction, and one result per item is returned in order so the caller only
+    has to resend the ones that failed. Deposits sent before under the same key come
+    back as created, with replayed set, and are not recorded again.
+    """
+    statuses = rvm_statuses()
+    materials = active_materials()
+    now = timezone.now()
+    keys = {item['idempotency_key'] for item in items if item.get('idempotency_key')}
+    stored = idempotency.lookup_many(user, DEPOSIT_SCOPE, keys) if keys else {}
+    
+    results = []
+    activities = []
+    new_keys = []
+    seen = set()
+    for item in items:
+        key = item.get('idempotency_key')
+        if key:
+            fingerprint = idempotency.fingerprint(deposit_payload(item))
+            if key in seen:
+                results.append({'status': 'error', 'errors': {'idempotency_key': ['Used by another deposit in this batch']}})
+                continue
+            seen.add(key)
+            if key in stored:
+                if stored[key][0] != fingerprint:
+                    results.append({'status': 'error', 'errors': {'idempotency_key': ['Already used for a different deposit']}})
+                else:
+                    response = stored[key][2]
+                    results.append({
+                        'status': 'created',
+                        'id': response['id'],
+                        'points_earned': Decimal(response['points_earned']),
+                        'timestamp': response['timestamp'],
+                        'replayed': True,
+                    })
+                continue
+        
+        errors = {}
+        rvm_status = statuses.get(item['rvm_id'])
+        if rvm_status is None:
+            errors['rvm_id'] = ['RVM not found']
+        elif rvm_status != 'active':
+            errors['rvm_id'] = ['RVM is not active']
+        material = materials.get(item['material_id'])
+        if material is None:
+            errors['material_id'] = ['Material not found or inactive']
+        
+        if errors:
+            results.append({'status': 'error', 'errors': errors})
+            continue
+        
+        activity = RecyclingActivity(
+            user=user,
+            rvm_id=item['rvm_id'],
+            material=material,
+            weight=item['weight'],
+            points_earned=(item['weight'] * material.points_per_kg).quantize(POINTS_QUANTUM),
+            timestamp=item.get('timestamp') or now,
+        )
+        activities.append(activity)
+        results.append(activity)
+        if key:
+            new_keys.append((activity, key, fingerprint))
+    
+    if activities:
+        try:
+            with transaction.atomic():
+                # bulk_create skips RecyclingActivity.save(), side effects are applied set-wise instead
+                RecyclingActivity.objects.bulk_create(activities)
+                apply_deposits(activities)
+                IdempotencyKey.objects.bulk_create([
+                    IdempotencyKey(
+                        user=user, scope=DEPOSIT_SCOPE, key=key, fingerprint=fingerprint,
+                        status_code=201, response=deposit_response(activity),
+                    )
+                    for activity, key, fingerprint in new_keys
+                ])
+        except IntegrityError:
+            if not retry or not new_keys:
+                raise
+            # a concurrent retry got some of these keys in first and this batch was rolled
+            # back - run it again, those deposits are now answered from their keys
+            return record_deposit_batch(user, items, retry=False)
+    
+    return [
+        {
+            'status': 'created',
+            'id': result.pk,
+            'points_earned': result.points_earned,
+            'timestamp': result.timestamp,
+        } if isinstance(result, RecyclingActivity) else result
+        for result in results
+    ]
+
+
+def credit_for(points):
+    """Credit a number of points converts to, at POINTS_TO_CREDIT_RATE"""
+    rate = Decimal(str(getattr(settings, 'POINTS_TO_CREDIT_RATE', '0.01')))
+    return (points * rate).quantize(POINTS_QUANTUM)
+
+
+def redeem_points(user, points):
+    """
+    Convert points to credit. Raises InsufficientPoints when the wallet can't cover it.
+
+    The balance check and the debit are a single conditional UPDATE (points >= amount),
+    so concurrent redemptions on one wallet can neither overdraw it nor lose an update,
+    and the wallet row is only locked from that statement until commit.
+    """
+    credit = credit_for(points)
+    with transaction.atomic():
+        # ledger row first, the wallet lock is taken last (deferred FK, see apply_deposits)
+        entry = RewardTransaction.objects.create(wallet_id=user.pk, change_amount=-points, reason='redemption')
+        debited = RewardWallet.objects.filter(pk=user.pk, points__gte=points).update(
+            points=F('points') - points,
+            credit=F('credit') + credit,
+        )
+        if not debited:
+            raise InsufficientPoints
+        balance = RewardWallet.objects.filter(pk=user.pk).values('points', 'credit').get()
+    return {
+        'transaction_id': entry.pk,
+        'points_redeemed': points,
+        'credit_added': credit,
+        'points': balance['points'],
+        'credit': balance['credit'],
+        'timestamp': entry.timestamp,
+    }
+
+
+def apply_deposits(activities):
+    """
+    Push freshly inserted activities into the ledger, wallets, stats, rollups, leaderboards and RVMs.
+
+    Must run inside the caller's transaction. Rows that get locked (RVM, wallet)
+    are touched last so they are held for as short as possible before commit.
+    """
+    last_usage = {}
+    rvm_counts = defaultdict(int)
+    points = defaultdict(Decimal)
+    stats = {}
+    for activity in activities:
+        last_usage[activity.rvm_id] = max(last_usage.get(activity.rvm_id, activity.timestamp), activity.timestamp)
+        rvm_counts[activity.rvm_id] += 1
+        points[activity.user_id] += activity.points_earned
+        
+        totals = stats.setdefault(activity.user_id, {
+            'weight': Decimal(0), 'points': Decimal(0), 'count': 0,
+            'first': activity.timestamp, 'last': activity.timestamp,
+        })
+        totals['weight'] += activity.weight
+        totals['points'] += activity.points_earned
+        totals['count'] += 1
+        totals['first'] = min(totals['first'], activity.timestamp)
+        totals['last'] = max(totals['last'], activity.timestamp)
+
+    # wallet FKs are deferred, so the ledger rows can go in before a brand new wallet exists
+    RewardTransaction.objects.bulk_create([
+        RewardTransaction(
+            wallet_id=activity.user_id,
+            change_amount=activity.points_earned,
+            reason=f"recycling_{activity.material.name.lower()}",
+        )
+        for activity in activities
+    ])
+
+    update_user_stats(stats)
+    rollups.update_rollups(activities)
+    leaderboards.update_leaderboards(activities)
+
+    touch_rvms(last_usage, rvm_counts)
+    credit_wallets(points)
+
+
+def apply_deposits_in_bulk(activities):
+    """
+    apply_deposits for bulk loads: ledger rows, wallets and RVMs only, all set-wise.
+
+    User stats, rollups and leaderboards are left to a rebuild_stats / backfill_rollups /
+    rebuild_leaderboards pass over the whole load, which beats incrementing them batch
+    after batch. Ledger rows keep the
+    deposit time so loaded history reads like the real thing.
+    """
+    last_usage = {}
+    rvm_counts = defaultdict(int)
+    points = defaultdict(Decimal)
+    for activity in activities:
+        last_usage[activity.rvm_id] = max(last_usage.get(activity.rvm_id, activity.timestamp), activity.timestamp)
+        rvm_counts[activity.rvm_id] += 1
+        points[activity.user_id] += activity.points_earned
+    
+    RewardTransaction.objects.bulk_create([
+        RewardTransaction(
+            wallet_id=activity.user_id,
+            change_amount=activity.points_earned,
+            reason=f"recycling_{activity.material.name.lower()}",
+            timestamp=activity.timestamp,
+        )
+        for activity in activities
+    ])
+    bulk_credit_wallets(points)
+    touch_rvms(last_usage, rvm_counts)
+    
+    # backdated ledger rows land inside history that may already be snapshotted
+    if activities:
+        earliest = min(activity.timestamp for activity in activities)
+        WalletSnapshot.objects.filter(wallet_id__in=list(points), as_of__gt=earliest).delete()
+
+
+def touch_rvms(last_usage, counts):
+    """Advance RVM last_usage and activity_count for newly recorded deposits"""
+    # targeted UPDATEs - only last_usage and the counter, never a full row save. Buffered
+    # deposits can be older than what the RVM already reported, so never move it backwards.
+    for rvm_id in sorted(last_usage):
+        timestamp = last_usage[rvm_id]
+        RVM.objects.filter(pk=rvm_id).update(
+            activity_count=F('activity_count') + counts[rvm_id],
+            last_usage=Case(
+                When(Q(last_usage__isnull=True) | Q(last_usage__lt=timestamp), then=Value(timestamp)),
+                default=F('last_usage'),
+            ),
+        )
+    if last_usage:
+        bump_version('rvms')  # both fields are in the RVM listings, see core.conditional
+
+
+def credit_wallets(points_by_user):
+    """Add points to wallets with F() increments, creating missing wallets on the fly"""
+    # sorted so concurrent writers always lock wallets in the same order
+    for user_id in sorted(points_by_user):
+        amount = points_by_user[user_id]
+        increment_or_create(
+            RewardWallet, {'pk': user_id},
+            updates={'points': F('points') + amount},
+            defaults={'points': amount},
+        )
+
+
+def bulk_credit_wallets(points_by_user):
+    """
+    Set-based credit_wallets for large batches: one INSERT for missing wallets, then a
+    single UPDATE with a CASE per user instead of one UPDATE per wallet.
+    """
+    if not points_by_user:
+        return
+    user_ids = sorted(points_by_user)
+    RewardWallet.objects.bulk_create(
+        [RewardWallet(user_id=user_id) for user_id in user_ids], ignore_conflicts=True,
+    )
+    # lock in primary key order first - a single UPDATE would lock rows in scan order
+    # and could deadlock against another batch touching the same wallets
+    list(RewardWallet.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+    # chunked to stay well under the bound parameter limits of SQLite
+    for start in range(0, len(user_ids), WALLET_UPDATE_CHUNK):
+        chunk = user_ids[start:start + WALLET_UPDATE_CHUNK]
+        RewardWallet.objects.filter(pk__in=chunk).update(
+            points=F('points') + Case(
+                *(When(pk=user_id, then=Value(points_by_user[user_id])) for user_id in chunk),
+                default=Value(Decimal(0)),
+                output_field=RewardWallet._meta.get_field('points'),
+            ),
+        )
+
+
+def update_user_stats(stats_by_user):
+    """Fold per-user deposit totals into UserStats"""
+    for user_id in sorted(stats_by_user):
+        totals = stats_by_user[user_id]
+        increment_or_create(
+            UserStats, {'pk': user_id},
+            updates={
+                'total_weight': F('total_weight') + totals['weight'],
+                'total_points': F('total_points') + totals['points'],
+                'deposits_count': F('deposits_count') + totals['count'],
+                'first_deposit_at': Case(
+                    When(Q(first_deposit_at__isnull=True) | Q(first_deposit_at__gt=totals['first']), then=Value(totals['first'])),
+                    default=F('first_deposit_at'),
+                ),
+                'last_deposit_at': Case(
+                    When(Q(last_deposit_at__isnull=True) | Q(last_deposit_at__lt=totals['last']), then=Value(totals['last'])),
+                    default=F('last_deposit_at'),
+                ),
+            },
+            defaults={
+                'total_weight': totals['weight'],
+                'total_points': totals['points'],
+                'deposits_count': totals['count'],
+                'first_deposit_at': totals['first'],
+                'last_deposit_at': totals['last'],
+            },
+        )
+
+
+def increment_or_create(model, lookup, updates, defaults):
+    """
+    UPDATE the row matching `lookup` with F() expressions, or create it from `defaults`.
+
+    One query when the row exists. When it doesn't, get_or_create settles the race
+    with a concurrent creator and the loser applies its update on top.
+    """
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    obj, created = model.objects.get_or_create(**lookup, defaults=defaults)
+    if not created:
+        model.objects.filter(**lookup).update(**updates)
@@ -0,0 +1,49 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import revoke_cached_token, revoke_cached_tokens_for_user
+from .caching import bump_version
+from .metrics import install_query_recorder
+from .models import MaterialType, RVM, User
+from .search import ensure_indexes
+
+
+@receiver([post_save, post_delete], sender=MaterialType)
+def material_changed(sender, **kwargs):
+    """Admin/API edits to materials invalidate the cached material list"""
+    bump_version('materials')
+
+
+@receiver([post_save, post_delete], sender=RVM)
+def rvm_changed(sender, **kwargs):
+    """Admin/API edits to RVMs invalidate the cached RVM statuses and the RVM listings' ETags"""
+    bump_version('rvm-status')
+    bump_version('rvms')
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Logout (or the user going away) revokes the token in every worker's auth cache"""
+    revoke_cached_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    """Password changes, deactivation and profile edits must not be served from a stale cached user"""
+    if not created:
+        revoke_cached_tokens_for_user(instance.pk)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """Count queries and their time for PerformanceMiddleware on every new connection"""
+    install_query_recorder(sender, connection)
+
+
+@receiver(post_migrate)
+def migrated(sender, using='default', **kwargs):
+    """(Re)create the search indexes - SQLite table rebuilds in migrations drop their triggers"""
+    if sender.name == 'core':
+        ensure_indexes(using)
@@ -1,3 +1,857 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import metrics, search
+from .authentication import token_cache
+from .caching import materials_cache, rvm_status_cache
+from .forecasting import forecast_fleet
+from .importing import import_file
+from .models import (
+    RVM, ImportCheckpoint, LeaderboardEntry, MaterialType, RecyclingActivity, RewardTransaction, RewardWallet,
+    RVMActivityRollup, User, UserActivityRollup, UserStats,
+)
+from .reconciliation import fix_wallet, reconcile_range
+
+# the shared aliases live in files - keep the test runs away from the real CACHE_DIR
+TEST_CACHE_DIR = tempfile.mkdtemp(prefix='rvm-tests-')
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(TEST_CACHE_DIR, 'tokens')},
+    'versions': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(TEST_CACHE_DIR, 'versions')},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-responses'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RVMTestCase(TestCase):
+    """A user with a token client, one material (2 pts/kg) and one active RVM in Cairo"""
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        token_cache.clear()
+        materials_cache.clear()
+        rvm_status_cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='secret', first_name='Test', last_name='User')
+        self.material = MaterialType.objects.create(name='Plastic', points_per_kg=Decimal('2.00'))
+        self.rvm = RVM.objects.create(name='Tahrir', location='Cairo', latitude=30.0444, longitude=31.2357)
+        self.client = APIClient()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def deposit(self, weight='1.5', client=None, **extra):
+        payload = {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': weight}
+        return (client or self.client).post('/api/deposit/', payload, format='json', **extra)
+
+    def ledger_total(self, user=None):
+        user = user or self.user
+        return RewardTransaction.objects.filter(wallet_id=user.pk).aggregate(total=Sum('change_amount'))['total']
+
+
+class DepositTests(RVMTestCase):
+    """user-001: one deposit writes the activity, ledger row, wallet and RVM together"""
+
+    def test_deposit_credits_wallet_through_ledger(self):
+        response = self.deposit('1.5')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['points_earned'], '3.00')
+
+        wallet = RewardWallet.objects.get(user=self.user)
+        self.assertEqual(wallet.points, Decimal('3.00'))
+        transaction = RewardTransaction.objects.get(wallet=wallet)
+        self.assertEqual(transaction.change_amount, Decimal('3.00'))
+        self.assertEqual(transaction.reason, 'recycling_plastic')
+        self.rvm.refresh_from_db()
+        self.assertIsNotNone(self.rvm.last_usage)
+
+    def test_repeated_deposits_keep_wallet_equal_to_ledger(self):
+        for weight in ('1.5', '2', '0.25'):
+            self.assertEqual(self.deposit(weight).status_code, 201)
+        wallet = RewardWallet.objects.get(user=self.user)
+        self.assertEqual(wallet.points, Decimal('7.50'))
+        self.assertEqual(self.ledger_total(), wallet.points)
+        self.assertEqual(RecyclingActivity.objects.filter(user=self.user).count(), 3)
+
+    def test_points_are_rounded_before_they_reach_the_wallet(self):
+        glass = MaterialType.objects.create(name='Glass', points_per_kg=Decimal('1.50'))
+        payload = {'rvm_id': self.rvm.id, 'material_id': glass.id, 'weight': '0.333'}
+        for _ in range(7):
+            self.assertEqual(self.client.post('/api/deposit/', payload, format='json').status_code, 201)
+        # compared in SQL - reading the model back would round the stored value
+        self.assertTrue(RewardWallet.objects.filter(user=self.user, points__gte=Decimal('3.50')).exists())
+        self.assertTrue(UserStats.objects.filter(user=self.user, total_points__gte=Decimal('3.50')).exists())
+        self.assertEqual(self.ledger_total(), Decimal('3.50'))
+
+    def test_inactive_rvm_is_rejected_without_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rvm.status = 'maintenance'
+            self.rvm.save()
+        response = self.deposit()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rvm_id', response.data)
+        self.assertFalse(RecyclingActivity.objects.exists())
+        self.assertFalse(RewardTransaction.objects.exists())
+
+
+class BatchDepositTests(RVMTestCase):
+    """user-002: offline batches record the valid items and report the rest"""
+
+    def test_batch_records_valid_items_only(self):
+        items = [
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '1', 'timestamp': '2026-01-01T10:00:00Z'},
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '2.5'},
+            {'rvm_id': 99999, 'material_id': self.material.id, 'weight': '1'},
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': 'x'},
+        ]
+        response = self.client.post('/api/deposit/batch/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']][:2], ['created', 'created'])
+
+        wallet = RewardWallet.objects.get(user=self.user)
+        self.assertEqual(wallet.points, Decimal('7.00'))
+        self.assertEqual(self.ledger_total(), wallet.points)
+        earned = RecyclingActivity.objects.filter(user=self.user).aggregate(total=Sum('points_earned'))['total']
+        self.assertEqual(earned, wallet.points)
+
+    def test_empty_batch_is_rejected(self):
+        self.assertEqual(self.client.post('/api/deposit/batch/', [], format='json').status_code, 400)
+
+
+class UserStatsTests(RVMTestCase):
+    """user-003: the summary reads maintained stats, rebuild_stats recomputes the same numbers"""
+
+    def test_summary_follows_deposits(self):
+        self.deposit('1.5')
+        items = [{'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '2', 'timestamp': '2024-01-01T00:00:00Z'}]
+        self.client.post('/api/deposit/batch/', items, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = self.client.get('/api/summary/').data
+        self.assertEqual(summary['deposits_count'], 2)
+        self.assertEqual(summary['total_recycled_weight'], 3.5)
+        self.assertEqual(summary['total_points_earned'], 7.0)
+        self.assertEqual(summary['current_points'], 7.0)
+        self.assertFalse([query for query in queries.captured_queries if 'core_recyclingactivity' in query['sql']])
+        self.rvm.refresh_from_db()
+        self.assertEqual(self.rvm.activity_count, 2)
+
+    def test_rebuild_stats_matches_incremental_stats(self):
+        self.deposit('1.5')
+        self.deposit('0.25')
+        before = UserStats.objects.values().get(user=self.user)
+        UserStats.objects.all().delete()
+        RVM.objects.update(activity_count=0)
+        call_command('rebuild_stats', batch_size=1, stdout=StringIO())
+        self.assertEqual(UserStats.objects.values().get(user=self.user), before)
+        self.rvm.refresh_from_db()
+        self.assertEqual(self.rvm.activity_count, 2)
+
+
+
+class RollupTests(RVMTestCase):
+    """user-004: deposits feed the hourly/daily rollups behind the admin analytics"""
+
+    def setUp(self):
+        super().setUp()
+        items = [
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '1', 'timestamp': '2026-09-01T10:05:00Z'},
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '2', 'timestamp': '2026-09-01T10:55:00Z'},
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '4', 'timestamp': '2026-09-01T13:00:00Z'},
+        ]
+        self.client.post('/api/deposit/batch/', items, format='json')
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', first_name='A', last_name='D')
+        self.admin = APIClient()
+        self.admin.force_authenticate(admin)
+
+    def rollup_rows(self, model):
+        return sorted(model.objects.values_list('period', 'bucket', 'weight', 'points', 'deposits'))
+
+    def test_deposits_land_in_hour_and_day_buckets(self):
+        hours = RVMActivityRollup.objects.filter(period='hour').order_by('bucket')
+        self.assertEqual([(row.bucket.hour, row.weight, row.deposits) for row in hours], [(10, 3, 2), (13, 4, 1)])
+        day = RVMActivityRollup.objects.get(period='day')
+        self.assertEqual((day.weight, day.points, day.deposits), (7, 14, 3))
+
+    def test_analytics_endpoint(self):
+        response = self.admin.get('/api/admin/analytics/rvms/?period=day&start_date=2026-09-01&end_date=2026-09-01')
+        self.assertEqual(response.status_code, 200)
+        [row] = response.data['results']
+        self.assertEqual((row['rvm'], row['weight'], row['deposits']), (self.rvm.id, 7, 3))
+
+        response = self.admin.get('/api/admin/analytics/users/?period=hour&start_date=2026-09-01&end_date=2026-09-01')
+        self.assertEqual([row['deposits'] for row in response.data['results']], [2, 1])
+        self.assertEqual(self.admin.get('/api/admin/analytics/rvms/?period=year').status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/analytics/rvms/').status_code, 403)
+
+    def test_backfill_rebuilds_the_same_rows(self):
+        before = self.rollup_rows(RVMActivityRollup), self.rollup_rows(UserActivityRollup)
+        RVMActivityRollup.objects.all().delete()
+        UserActivityRollup.objects.all().delete()
+        call_command('backfill_rollups', chunk_days=1, stdout=StringIO())
+        self.assertEqual((self.rollup_rows(RVMActivityRollup), self.rollup_rows(UserActivityRollup)), before)
+
+
+
+class UserActivityTests(RVMTestCase):
+    """user-005: activities can be listed and created, not edited or deleted"""
+
+    def test_update_and_delete_are_not_allowed(self):
+        activity_id = self.deposit().data['id']
+        url = f'/api/activities/{activity_id}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.put(url, {'weight': '9'}, format='json').status_code, 405)
+        self.assertEqual(self.client.patch(url, {'weight': '9'}, format='json').status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertTrue(RecyclingActivity.objects.filter(pk=activity_id).exists())
+        self.assertEqual(RewardWallet.objects.get(user=self.user).points, Decimal('3.00'))
+
+    def test_admin_endpoint_is_read_only(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', first_name='A', last_name='D')
+        client = APIClient()
+        client.force_authenticate(admin)
+        activity_id = self.deposit().data['id']
+        url = f'/api/admin/activities/{activity_id}/'
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(client.patch(url, {'weight': '9'}, format='json').status_code, 405)
+        self.assertEqual(client.delete(url).status_code, 405)
+        self.rvm.refresh_from_db()
+        self.assertEqual(self.rvm.activity_count, 1)
+
+    def test_rvm_save_keeps_concurrent_activity_counts(self):
+        stale = RVM.objects.get(pk=self.rvm.pk)
+        self.deposit()
+        self.deposit()
+        stale.status = 'maintenance'
+        stale.save()
+        self.rvm.refresh_from_db()
+        self.assertEqual((self.rvm.status, self.rvm.activity_count), ('maintenance', 2))
+
+
+class TokenRevocationTests(RVMTestCase):
+    """user-009: cached tokens stop working everywhere once revoked"""
+
+    def login(self):
+        client = APIClient()
+        response = client.post('/api/auth/login/', {'username': 'user@example.com', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        return client
+
+    def test_cached_token_skips_the_database(self):
+        client = self.login()
+        self.assertEqual(client.get('/api/profile/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/profile/').status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if 'authtoken_token' in query['sql']])
+
+    def test_logout_revokes_cached_token(self):
+        client = self.login()
+        self.assertEqual(client.get('/api/profile/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/api/auth/logout/').status_code, 204)
+        self.assertEqual(client.get('/api/profile/').status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        client = self.login()
+        self.assertEqual(client.get('/api/profile/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(client.get('/api/profile/').status_code, 401)
+
+    def test_unknown_token_leaves_no_cache_entry(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + 'f' * 40)
+        self.assertEqual(client.get('/api/profile/').status_code, 401)
+        self.assertEqual(os.listdir(os.path.join(TEST_CACHE_DIR, 'tokens')), [])
+
+
+class AsyncViewTests(RVMTestCase):
+    """user-010: the async views authenticate like the DRF ones and never block the loop"""
+
+    def test_session_client(self):
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.get('/api/async/wallet/').status_code, 401)
+        client.force_login(self.user)
+        self.assertEqual(client.get('/api/async/wallet/').status_code, 200)
+        payload = {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '1'}
+        response = client.post('/api/async/deposit/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(RecyclingActivity.objects.exists())
+
+    async def test_text_filter_on_a_fresh_worker(self):
+        # nothing synchronous has looked up the search tables yet
+        search._fts_tables.clear()
+        await RVM.objects.acreate(name='Maadi', location='Cairo')
+        headers = {'Authorization': f'Token {self.token.key}'}
+        response = await self.async_client.get('/api/async/rvms/?name=Tahrir', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([rvm['name'] for rvm in response.json()], ['Tahrir'])
+        response = await self.async_client.get('/api/async/rvms/?location=cair', headers=headers)
+        self.assertEqual(len(response.json()), 2)
+
+
+class ExportTests(RVMTestCase):
+    """user-011: admins stream matching activities as CSV or NDJSON"""
+
+    def setUp(self):
+        super().setUp()
+        items = [
+            {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': weight, 'timestamp': timestamp}
+            for weight, timestamp in [('1', '2026-09-01T10:00:00Z'), ('2', '2026-09-02T10:00:00Z'), ('3', '2026-09-03T10:00:00Z')]
+        ]
+        self.client.post('/api/deposit/batch/', items, format='json')
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', first_name='A', last_name='D')
+        self.admin = APIClient()
+        self.admin.force_authenticate(admin)
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_with_filters(self):
+        response = self.admin.get('/api/admin/activities/export/?start_date=2026-09-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment;', response['Content-Disposition'])
+        lines = self.body(response).splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'timestamp', 'user_id'])
+        self.assertEqual([line.split(',')[-2] for line in lines[1:]], ['3.000', '2.000'])
+
+    def test_accept_header_picks_the_format(self):
+        response = self.admin.get('/api/admin/activities/export/', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.body(response).splitlines()), 4)
+
+        response = self.admin.get('/api/admin/activities/export/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual([row['weight'] for row in rows], ['3.000', '2.000', '1.000'])
+
+    def test_bad_format_and_access(self):
+        self.assertEqual(self.admin.get('/api/admin/activities/export/?export_format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/activities/export/').status_code, 403)
+
+
+
+class ImportTests(RVMTestCase):
+    """user-012: bad records are skipped, the checkpoint still moves past them"""
+
+    def test_bad_records_are_skipped(self):
+        good = json.dumps({
+            'user_id': self.user.pk, 'rvm_id': self.rvm.pk, 'material_id': self.material.pk,
+            'weight': '1.5', 'timestamp': '2025-01-01T10:00:00Z',
+        })
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write('\n'.join([good, '{broken', '[1, 2]', good.replace('2025-01-01', '2024-02-30'), good]) + '\n')
+        self.addCleanup(os.remove, handle.name)
+
+        summary = import_file(handle.name, batch_size=2)
+        self.assertEqual(summary['imported'], 2)
+        self.assertEqual(summary['skipped'], 3)
+        self.assertEqual(len(summary['errors']), 3)
+        self.assertIn('record 4: invalid timestamp', summary['errors'][2])
+        checkpoint = ImportCheckpoint.objects.get(source=os.path.abspath(handle.name))
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.position, 5)
+        self.assertEqual(RewardWallet.objects.get(user=self.user).points, Decimal('6.00'))
+
+
+class MetricsTests(RVMTestCase):
+    """user-015: /metrics is for the scraper's token and staff only"""
+
+    def test_metrics_access(self):
+        client = Client()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape'):
+            self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+        client.force_login(self.user)
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_requests_are_recorded(self):
+        metrics.REQUEST_DURATION.clear()
+        metrics.DB_QUERIES.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.deposit(client=client)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        text = metrics.render_metrics()
+        self.assertIn('rvm_request_duration_seconds_count{endpoint="core:deposit",method="POST",status="201"} 1', text)
+        self.assertIn('rvm_request_db_queries_count{endpoint="core:deposit",method="POST",status="201"} 1', text)
+
+
+class WalletStatementTests(RVMTestCase):
+    """user-016: balances start from snapshots, statement transactions come a page at a time"""
+
+    def test_transactions_are_cursor_paginated(self):
+        for weight in ('1', '2', '3', '4', '5'):
+            self.deposit(weight)
+        response = self.client.get('/api/wallet/statement/?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['credits'], Decimal('30.00'))
+        self.assertEqual(response.data['closing_balance'], Decimal('30.00'))
+
+        amounts = []
+        while True:
+            amounts += [Decimal(row['change_amount']) for row in response.data['transactions']]
+            self.assertLessEqual(len(response.data['transactions']), 2)
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(amounts, [Decimal(value) for value in ('2', '4', '6', '8', '10')])
+
+    def test_period_is_capped(self):
+        response = self.client.get('/api/wallet/statement/?start_date=2024-01-01&end_date=2025-06-01')
+        self.assertEqual(response.status_code, 400)
+
+    def test_snapshots_agree_with_the_full_ledger(self):
+        for weight in ('1', '2', '3', '4'):
+            self.deposit(weight)
+        start = timezone.now() - timedelta(days=4)
+        for day, pk in enumerate(RewardTransaction.objects.order_by('id').values_list('pk', flat=True)):
+            RewardTransaction.objects.filter(pk=pk).update(timestamp=start + timedelta(days=day))
+        wallet = RewardWallet.objects.get(pk=self.user.pk)
+
+        def full_ledger(when):
+            transactions = RewardTransaction.objects.filter(wallet=wallet, timestamp__lt=when)
+            return transactions.aggregate(total=Sum('change_amount'))['total'] or Decimal('0.00')
+
+        call_command('snapshot_wallets', as_of=(start + timedelta(days=1, hours=12)).isoformat(), stdout=StringIO())
+        call_command('snapshot_wallets', as_of=(start + timedelta(days=2, hours=12)).isoformat(), stdout=StringIO())
+        self.assertEqual(list(wallet.snapshots.order_by('as_of').values_list('balance', flat=True)), [Decimal('6.00'), Decimal('12.00')])
+        for hours in (0, 1, 36, 48, 60, 84, 120):
+            when = start + timedelta(hours=hours)
+            self.assertEqual(wallet.balance_at(when), full_ledger(when))
+
+
+class ReconciliationTests(RVMTestCase):
+    """user-017: drift is found and fix_wallet only claims what it changed"""
+
+    def test_balance_drift_is_fixed(self):
+        self.deposit('1.5')
+        RewardWallet.objects.filter(pk=self.user.pk).update(points=Decimal('100'))
+        result = reconcile_range(self.user.pk, self.user.pk + 1, fix=True)
+        self.assertEqual(result['discrepancies'][0]['issues'], ['balance'])
+        self.assertTrue(result['discrepancies'][0]['fixed'])
+        self.assertEqual(RewardWallet.objects.get(pk=self.user.pk).points, Decimal('3.00'))
+        self.assertEqual(reconcile_range(self.user.pk, self.user.pk + 1)['discrepancies'], [])
+
+    def test_activity_mismatch_needs_adjust(self):
+        self.deposit('1.5')
+        RewardTransaction.objects.filter(wallet_id=self.user.pk).delete()
+        RewardWallet.objects.filter(pk=self.user.pk).update(points=0)
+
+        result = reconcile_range(self.user.pk, self.user.pk + 1, fix=True)
+        found = result['discrepancies'][0]
+        self.assertEqual(found['issues'], ['activities'])
+        self.assertFalse(found['fixed'])
+        self.assertTrue(found['needs_adjust'])
+
+        self.assertTrue(fix_wallet(self.user.pk, adjust=True))
+        self.assertEqual(RewardWallet.objects.get(pk=self.user.pk).points, Decimal('3.00'))
+        self.assertFalse(fix_wallet(self.user.pk, adjust=True))
+
+    def test_command_reports_and_fixes_every_range(self):
+        other = User.objects.create_user(email='other@example.com', password='secret', first_name='Other', last_name='User')
+        RewardWallet.objects.create(user=other, points=Decimal('7'))
+        self.deposit('1.5')
+        RewardWallet.objects.filter(pk=self.user.pk).update(points=Decimal('7'))
+        report = os.path.join(TEST_CACHE_DIR, 'reconciliation.json')
+
+        out = StringIO()
+        call_command('reconcile_wallets', workers=1, batch_size=1, fix=True, report=report, stdout=out)
+        with open(report) as handle:
+            found = json.load(handle)
+        self.assertEqual([row['wallet'] for row in found], [self.user.pk, other.pk])
+        self.assertIn('Discrepancies: 2 balance.', out.getvalue())
+        self.assertEqual(RewardWallet.objects.get(pk=self.user.pk).points, Decimal('3.00'))
+        self.assertEqual(RewardWallet.objects.get(pk=other.pk).points, Decimal('0.00'))
+
+
+class RedeemTests(RVMTestCase):
+    """user-018: redemptions debit through one conditional update and never overdraw"""
+
+    def redeem(self, points, **extra):
+        return self.client.post('/api/wallet/redeem/', {'points': points}, format='json', **extra)
+
+    def redemptions(self):
+        return RewardTransaction.objects.filter(wallet_id=self.user.pk, reason='redemption')
+
+    def test_redeem_converts_points_to_credit(self):
+        self.deposit('10')
+        response = self.redeem('5')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['points']), Decimal('15.00'))
+        self.assertEqual(Decimal(response.data['credit']), Decimal('0.05'))
+        wallet = RewardWallet.objects.get(pk=self.user.pk)
+        self.assertEqual(wallet.points, self.ledger_total())
+        self.assertEqual(wallet.credit, Decimal('0.05'))
+
+    def test_overdraw_is_refused_without_a_ledger_row(self):
+        self.deposit('1')
+        response = self.redeem('5')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['points'], ['Not enough points in the wallet.'])
+        self.assertFalse(self.redemptions().exists())
+        self.assertEqual(RewardWallet.objects.get(pk=self.user.pk).points, Decimal('2.00'))
+
+    def test_missing_wallet_is_refused(self):
+        response = self.redeem('5')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RewardWallet.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(RewardTransaction.objects.exists())
+
+    def test_replay_debits_once(self):
+        self.deposit('10')
+        first = self.redeem('5', HTTP_IDEMPOTENCY_KEY='redeem-1')
+        replay = self.redeem('5', HTTP_IDEMPOTENCY_KEY='redeem-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(replay.data['transaction_id'], first.data['transaction_id'])
+        self.assertEqual(self.redemptions().count(), 1)
+        self.assertEqual(RewardWallet.objects.get(pk=self.user.pk).points, Decimal('15.00'))
+
+    def test_reused_key_with_other_amount_is_refused(self):
+        self.deposit('10')
+        self.redeem('5', HTTP_IDEMPOTENCY_KEY='redeem-1')
+        response = self.redeem('6', HTTP_IDEMPOTENCY_KEY='redeem-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.redemptions().count(), 1)
+        self.assertEqual(RewardWallet.objects.get(pk=self.user.pk).points, Decimal('15.00'))
+
+
+class IdempotencyTests(RVMTestCase):
+    """user-019: retried deposits with the same key are replayed, not recorded again"""
+
+    def test_header_key_replays_deposit(self):
+        first = self.deposit(HTTP_IDEMPOTENCY_KEY='deposit-1')
+        replay = self.deposit(HTTP_IDEMPOTENCY_KEY='deposit-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(RecyclingActivity.objects.count(), 1)
+        self.assertEqual(RewardWallet.objects.get(user=self.user).points, Decimal('3.00'))
+
+    def test_reused_key_with_other_payload_is_refused(self):
+        self.deposit('1.5', HTTP_IDEMPOTENCY_KEY='deposit-1')
+        response = self.deposit('2', HTTP_IDEMPOTENCY_KEY='deposit-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(RecyclingActivity.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        other = User.objects.create_user(email='other@example.com', password='secret', first_name='O', last_name='U')
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        self.deposit(HTTP_IDEMPOTENCY_KEY='deposit-1')
+        response = self.deposit(client=other_client, HTTP_IDEMPOTENCY_KEY='deposit-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(RecyclingActivity.objects.count(), 2)
+
+    def test_activities_endpoint_honours_body_key(self):
+        payload = {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '1.5', 'idempotency_key': 'act-1'}
+        first = self.client.post('/api/activities/', payload, format='json')
+        replay = self.client.post('/api/activities/', payload, format='json')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(RecyclingActivity.objects.count(), 1)
+
+    def test_batch_skips_duplicate_keys(self):
+        item = {'rvm_id': self.rvm.id, 'material_id': self.material.id, 'weight': '1', 'idempotency_key': 'batch-1'}
+        self.client.post('/api/deposit/batch/', [item, item], format='json')
+        self.client.post('/api/deposit/batch/', [item], format='json')
+        self.assertEqual(RecyclingActivity.objects.count(), 1)
+        self.assertEqual(RewardWallet.objects.get(user=self.user).points, Decimal('2.00'))
+
+
+class NearbyRVMTests(RVMTestCase):
+    """user-020: ?near= finds the closest active machines within the radius"""
+
+    def setUp(self):
+        super().setUp()
+        self.close = RVM.objects.create(name='Garden City', location='Cairo', latitude=30.0380, longitude=31.2320)
+        RVM.objects.create(name='Closed', location='Cairo', latitude=30.0440, longitude=31.2350, status='maintenance')
+        RVM.objects.create(name='Alexandria', location='Alexandria', latitude=31.2001, longitude=29.9187)
+        RVM.objects.create(name='Unplaced', location='Cairo')
+
+    def test_nearest_first_within_radius(self):
+        response = self.client.get('/api/rvms/?near=30.0444,31.2357&radius=5', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([rvm['name'] for rvm in response.data], ['Tahrir', 'Garden City'])
+        self.assertLess(response.data[0]['distance_km'], 0.01)
+        self.assertAlmostEqual(response.data[1]['distance_km'], 0.78, delta=0.05)
+
+    def test_limit_and_large_radius(self):
+        response = self.client.get('/api/rvms/?near=30.0444,31.2357&radius=100&limit=1', HTTP_ACCEPT='application/json')
+        self.assertEqual([rvm['name'] for rvm in response.data], ['Tahrir'])
+        response = self.client.get('/api/rvms/?near=31.2,29.9&radius=100', HTTP_ACCEPT='application/json')
+        self.assertEqual([rvm['name'] for rvm in response.data], ['Alexandria'])
+
+    def test_invalid_parameters(self):
+        for query in ('near=abc', 'near=95,31', 'near=30,31&radius=0', 'near=30,31&limit=500'):
+            self.assertEqual(self.client.get(f'/api/rvms/?{query}').status_code, 400, query)
+
+    def test_moved_machine_is_found_at_its_new_place(self):
+        self.close.latitude, self.close.longitude = 31.2050, 29.9200
+        self.close.save(update_fields=['latitude', 'longitude'])
+        response = self.client.get('/api/rvms/?near=31.2,29.9&radius=5', HTTP_ACCEPT='application/json')
+        self.assertEqual([rvm['name'] for rvm in response.data], ['Alexandria', 'Garden City'])
+        response = self.client.get('/api/rvms/?near=30.0444,31.2357&radius=5', HTTP_ACCEPT='application/json')
+        self.assertEqual([rvm['name'] for rvm in response.data], ['Tahrir'])
+
+
+class SearchTests(RVMTestCase):
+    """user-021: RVM and user text search is served by the FTS index, still as case-insensitive substrings"""
+
+    def setUp(self):
+        super().setUp()
+        RVM.objects.create(name='Maadi Mall', location='Cairo')
+        RVM.objects.create(name='Corniche', location='Alexandria')
+
+    def names(self, query):
+        response = self.client.get(f'/api/rvms/?{query}', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return sorted(rvm['name'] for rvm in response.data)
+
+    def test_api_filters_match_substrings(self):
+        self.assertIn('core_rvm_search', search.fts_tables('default'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names('name=ahri'), ['Tahrir'])
+        self.assertTrue(any('MATCH' in query['sql'] for query in queries))
+        self.assertEqual(self.names('location=AIR'), ['Maadi Mall', 'Tahrir'])
+        self.assertEqual(self.names('name=mall&location=cairo'), ['Maadi Mall'])
+        self.assertEqual(self.names('name=ma'), ['Maadi Mall'])  # too short for trigrams, icontains
+        self.assertEqual(self.names('name=nowhere'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        rvms = RVM.objects.all()
+        self.rvm.name = 'Downtown'
+        self.rvm.save()
+        self.assertEqual(list(search.filter_queryset(rvms, 'town', ['name'])), [self.rvm])
+        self.assertFalse(search.filter_queryset(rvms, 'tahrir', ['name']).exists())
+        RVM.objects.filter(name='Corniche').delete()
+        self.assertFalse(search.filter_queryset(rvms, 'corn', ['name']).exists())
+
+    def test_admin_search_uses_the_index(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret')
+        client = Client()
+        client.force_login(admin)
+        response = client.get('/admin/core/rvm/', {'q': 'tahr'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.rvm])
+        # every word has to match one of the search fields
+        response = client.get('/admin/core/user/', {'q': 'test EXAMPLE.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.user])
+
+
+class ConditionalGetTests(RVMTestCase):
+    """user-022: unchanged reference data answers 304 before any query"""
+
+    def get(self, url, **headers):
+        return self.client.get(url, HTTP_ACCEPT='application/json', **headers)
+
+    def test_not_modified_without_queries(self):
+        for url in ('/api/materials/', '/api/rvms/', f'/api/rvms/{self.rvm.id}/', '/api/rvms/?near=30.0444,31.2357'):
+            response = self.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            with CaptureQueriesContext(connection) as queries:
+                again = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, 304, url)
+            self.assertEqual(len(queries), 0, url)
+            self.assertEqual(self.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304, url)
+
+    def test_writes_change_the_etag(self):
+        materials = self.get('/api/materials/')['ETag']
+        rvms = self.get('/api/rvms/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.material.points_per_kg = Decimal('3.00')
+            self.material.save()
+        response = self.get('/api/materials/', HTTP_IF_NONE_MATCH=materials)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['points_per_kg'], '3.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deposit()
+        self.assertEqual(self.get('/api/rvms/', HTTP_IF_NONE_MATCH=rvms).status_code, 200)
+
+    def test_etag_depends_on_query(self):
+        self.assertNotEqual(self.get('/api/rvms/?status=active')['ETag'], self.get('/api/rvms/?status=inactive')['ETag'])
+
+
+class ResponseCacheTests(RVMTestCase):
+    """user-023: list bodies are rendered once per data version and query string, whoever asks"""
+
+    def setUp(self):
+        super().setUp()
+        other = User.objects.create_user(email='other@example.com', password='secret', first_name='Other', last_name='User')
+        self.other = APIClient()
+        self.other.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+
+    def get(self, url, client=None):
+        return (client or self.client).get(url, HTTP_ACCEPT='application/json')
+
+    def rvm_queries(self, url, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(url, client)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries if '"core_rvm"' in query['sql']]
+
+    def test_other_users_get_the_cached_body(self):
+        first, queries = self.rvm_queries('/api/rvms/?status=active', self.client)
+        self.assertTrue(queries)
+        second, queries = self.rvm_queries('/api/rvms/?status=active', self.other)
+        self.assertEqual(queries, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        # another query string is another body
+        response, queries = self.rvm_queries('/api/rvms/?status=maintenance', self.other)
+        self.assertTrue(queries)
+        self.assertEqual(response.json(), [])
+
+    def test_writes_replace_the_cached_body(self):
+        self.get('/api/rvms/')
+        with self.captureOnCommitCallbacks(execute=True):
+            RVM.objects.create(name='Maadi', location='Cairo')
+        response, queries = self.rvm_queries('/api/rvms/', self.other)
+        self.assertTrue(queries)
+        self.assertEqual(sorted(rvm['name'] for rvm in response.json()), ['Maadi', 'Tahrir'])
+
+    def test_default_cache_churn_keeps_the_etag(self):
+        etag = self.get('/api/materials/')['ETag']
+        for number in range(2000):
+            caches['default'].set(f'churn-{number}', number)
+        self.assertEqual(self.client.get('/api/materials/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class LeaderboardTests(RVMTestCase):
+    """user-024: boards rank by points, ties share a rank, rebuild_leaderboards agrees with the deposit path"""
+
+    def setUp(self):
+        super().setUp()
+        self.second = RVM.objects.create(name='Maadi', location='Cairo')
+        self.clients = {}
+        for name in ('Bea', 'Cy'):
+            user = User.objects.create_user(email=f'{name.lower()}@example.com', password='secret', first_name=name, last_name='Smith')
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+            self.clients[name] = client
+        self.deposit('3')
+        self.deposit('3', client=self.clients['Bea'])
+        self.deposit('1', client=self.clients['Cy'])
+        self.clients['Cy'].post('/api/deposit/', {'rvm_id': self.second.id, 'material_id': self.material.id, 'weight': '5'}, format='json')
+
+    def board(self, query=''):
+        response = self.client.get(f'/api/leaderboard/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(row['rank'], row['name'], Decimal(row['score'])) for row in response.data['results']]
+
+    def test_top_with_shared_ranks(self):
+        expected = [(1, 'Cy S', Decimal('12')), (2, 'Test U', Decimal('6')), (2, 'Bea S', Decimal('6'))]
+        self.assertEqual(self.board(), expected)
+        self.assertEqual(self.board('board=month'), expected)
+        self.assertEqual(self.board('limit=1'), expected[:1])
+        self.assertEqual(self.board(f'board=rvm&rvm={self.rvm.id}'), [
+            (1, 'Test U', Decimal('6')), (1, 'Bea S', Decimal('6')), (3, 'Cy S', Decimal('2')),
+        ])
+        self.assertEqual(self.board('board=month&month=2020-01'), [])
+
+    def test_my_rank(self):
+        response = self.client.get('/api/leaderboard/me/')
+        self.assertEqual((response.data['rank'], Decimal(response.data['score']), response.data['deposits']), (2, Decimal('6'), 1))
+        self.assertEqual(self.clients['Cy'].get('/api/leaderboard/me/').data['rank'], 1)
+        response = self.client.get(f'/api/leaderboard/me/?board=rvm&rvm={self.second.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['rank'])
+
+    def test_rebuild_matches_the_deposit_path(self):
+        def entries():
+            return sorted(LeaderboardEntry.objects.values_list('board', 'user_id', 'score', 'deposits'))
+        before = entries()
+        LeaderboardEntry.objects.all().delete()
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        self.assertEqual(entries(), before)
+
+    def test_bad_parameters(self):
+        for query in ('board=weekly', 'board=rvm', 'board=rvm&rvm=x', 'board=month&month=2024-13', 'limit=0', 'limit=101'):
+            self.assertEqual(self.client.get(f'/api/leaderboard/?{query}').status_code, 400, query)
+
+
+class ForecastTests(RVMTestCase):
+    """user-025: fill since the last collection and time to full, from the rollups alone"""
+
+    NOW = datetime(2024, 6, 12, 10, 30, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        # the forecast window starts 4 weeks before today's midnight, hour 682 is the current one
+        window_start = datetime(2024, 5, 15, tzinfo=dt_timezone.utc)
+        self.steady = self.rvm
+        self.steady.capacity_kg = Decimal('100')
+        self.steady.last_collected_at = self.NOW - timedelta(hours=10)
+        self.steady.save()
+        self.idle = RVM.objects.create(name='Idle', location='Cairo', capacity_kg=Decimal('50'))
+        self.busy = RVM.objects.create(name='Busy', location='Cairo', capacity_kg=Decimal('10'))
+        rollups = [
+            RVMActivityRollup(period='hour', bucket=window_start + timedelta(hours=hour), rvm=rvm, material=self.material, weight=1, deposits=1)
+            for hour in range(683) for rvm in (self.steady, self.busy)
+        ]
+        rollups.append(RVMActivityRollup(period='day', bucket=window_start - timedelta(days=3), rvm=self.busy, material=self.material, weight=5, deposits=1))
+        RVMActivityRollup.objects.bulk_create(rollups)
+
+    def test_fleet_forecast(self):
+        forecast = forecast_fleet(now=self.NOW)
+        self.assertEqual([result['id'] for result in forecast], [self.busy.pk, self.steady.pk, self.idle.pk])
+        results = {result['id']: result for result in forecast}
+
+        steady = results[self.steady.pk]
+        # the collection hour counts whole: 11 hourly buckets of 1 kg
+        self.assertEqual(steady['fill_kg'], 11.0)
+        self.assertEqual(steady['rate_kg_per_day'], 24.0)
+        # 89 kg free at 1 kg/h, after the half hour left of the current one
+        self.assertEqual(steady['hours_to_full'], 89.5)
+        self.assertEqual(steady['full_at'], self.NOW + timedelta(hours=89.5))
+
+        busy = results[self.busy.pk]
+        self.assertEqual(busy['fill_kg'], 683 + 5)  # never collected, days before the window included
+        self.assertEqual(busy['hours_to_full'], 0)
+
+        idle = results[self.idle.pk]
+        self.assertEqual((idle['fill_kg'], idle['rate_kg_per_day'], idle['hours_to_full'], idle['full_at']), (0, 0, None, None))
+
+    def test_forecast_endpoint(self):
+        self.assertEqual(self.client.get('/api/admin/rvms/forecast/').status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        response = self.client.get('/api/admin/rvms/forecast/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({result['id'] for result in response.data['results']}, {self.steady.pk, self.idle.pk, self.busy.pk})
+        # the rollups are from 2024, nothing is filling up now
+        self.assertEqual(self.client.get('/api/admin/rvms/forecast/?within_hours=1000').data['results'], [])
+        for query in ('status=broken', 'within_hours=-1', 'within_hours=soon'):
+            self.assertEqual(self.client.get(f'/api/admin/rvms/forecast/?{query}').status_code, 400, query)
@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
-from . import views
+from . import async_views, views
 
 # create router for viewsets
 router = DefaultRouter()
@@ -19,23 +20,47 @@ admin_router.register(r'wallets', views.AdminRewardWalletViewSet, basename='admi
 
 app_name = 'core'
 
+# native async variants of the hot endpoints - always under async/, and in place
+# of the DRF views when ASYNC_API_VIEWS is on (ASGI deployments)
+async_urlpatterns = [
+    path('async/deposit/', async_views.deposit, name='async-deposit'),
+    path('async/wallet/', async_views.wallet, name='async-wallet'),
+    path('async/summary/', async_views.summary, name='async-summary'),
+    path('async/rvms/', async_views.rvm_list, name='async-rvm-list'),
+]
+use_async = getattr(settings, 'ASYNC_API_VIEWS', False)
+
 urlpatterns = [
     path('', views.CustomAPIRoot.as_view(), name='api-root'), # Custom API root
     # authentication
     path('auth/register/', views.UserRegistrationView.as_view(), name='register'),
     path('auth/login/', views.CustomAuthToken.as_view(), name='login'),
+    path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     
     # user endpoints
     path('profile/', views.UserProfileView.as_view(), name='profile'),
-    path('summary/', views.user_summary, name='summary'),
-    path('wallet/', views.RewardWalletView.as_view(), name='wallet'),
+    path('summary/', async_views.summary if use_async else views.user_summary, name='summary'),
+    path('wallet/', async_views.wallet if use_async else views.RewardWalletView.as_view(), name='wallet'),
+    path('wallet/transactions/', views.RewardTransactionListView.as_view(), name='wallet-transactions'),
+    path('wallet/statement/', views.WalletStatementView.as_view(), name='wallet-statement'),
+    path('wallet/redeem/', views.RedeemPointsView.as_view(), name='wallet-redeem'),
     
     # main functionality
-    path('deposit/', views.DepositRecyclablesView.as_view(), name='deposit'),
+    path('deposit/', async_views.deposit if use_async else views.DepositRecyclablesView.as_view(), name='deposit'),
+    path('deposit/batch/', views.BatchDepositView.as_view(), name='deposit-batch'),
+    path('leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', views.MyLeaderboardRankView.as_view(), name='leaderboard-me'),
     
     # viewset endpoints included under this root
+    *([path('rvms/', async_views.rvm_list)] if use_async else []),
     path('', include(router.urls)),
     
+    # admin analytics, served from the rollup tables
+    path('admin/analytics/rvms/', views.AdminRVMAnalyticsView.as_view(), name='admin-rvm-analytics'),
+    path('admin/analytics/users/', views.AdminUserAnalyticsView.as_view(), name='admin-user-analytics'),
+    
     # admin endpoints included under this root
     path('admin/', include(admin_router.urls)),
+    
+    *async_urlpatterns,
 ] 
\ No newline at end of file
@@ -1,12 +1,15 @@
-from rest_framework import viewsets, status, generics
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import viewsets, status, generics, mixins
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from django.conf import settings
 from django.db.models import Q
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.core.validators import MinValueValidator
 from django_filters.rest_framework import DjangoFilterBackend
 import django_filters
@@ -14,13 +17,23 @@ import django_filters
 from rest_framework.response import Response # Import Response
 from rest_framework.reverse import reverse # Import reverse
 from rest_framework.views import APIView # Import APIView
+from rest_framework.settings import api_settings
 
-from .models import User, UserRole, MaterialType, RVM, RewardWallet, RewardTransaction, RecyclingActivity
+from .models import (
+    User, UserRole, MaterialType, RVM, RewardWallet, RewardTransaction, RecyclingActivity,
+    RVMActivityRollup, UserActivityRollup, LeaderboardEntry
+)
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, UserLoginSerializer,
     MaterialTypeSerializer, RVMSerializer, RewardWalletSerializer,
-    RewardTransactionSerializer, RecyclingActivityCreateSerializer, UserSummarySerializer, RecyclingActivitySerializer
+    RewardTransactionSerializer, RecyclingActivityCreateSerializer, UserSummarySerializer, RecyclingActivitySerializer,
+    DepositBatchItemSerializer, RedemptionSerializer, NearbyRVMSerializer, LeaderboardEntrySerializer
 )
+from . import forecasting, geo, idempotency, leaderboards, search, services
+from .conditional import ConditionalGetMixin
+from .rollups import SERIES_PERIODS, rollup_series
+from .pagination import IdCursorPagination, StatementCursorPagination, TimestampCursorPagination
+from .exports import EXPORT_FORMATS, EXPORT_RENDERERS, stream_activities
 
 
 class CustomAPIRoot(APIView):
@@ -31,20 +44,31 @@ class CustomAPIRoot(APIView):
         return Response({
             'auth_register': reverse('core:register', request=request, format=format),
             'auth_login': reverse('core:login', request=request, format=format),
+            'auth_logout': reverse('core:logout', request=request, format=format),
             'user_profile': reverse('core:profile', request=request, format=format),
             'user_summary': reverse('core:summary', request=request, format=format),
             'user_wallet': reverse('core:wallet', request=request, format=format),
+            'wallet_transactions': reverse('core:wallet-transactions', request=request, format=format),
+            'wallet_statement': reverse('core:wallet-statement', request=request, format=format),
+            'wallet_redeem': reverse('core:wallet-redeem', request=request, format=format),
             'deposit_recyclables': reverse('core:deposit', request=request, format=format),
+            'deposit_batch': reverse('core:deposit-batch', request=request, format=format),
 
             'materials': reverse('core:material-list', request=request, format=format),
             'rvms': reverse('core:rvm-list', request=request, format=format),
             'recycling_activities': reverse('core:activity-list', request=request, format=format),
+            'leaderboard': reverse('core:leaderboard', request=request, format=format),
+            'leaderboard_me': reverse('core:leaderboard-me', request=request, format=format),
             
             'admin_users': reverse('core:admin-user-list', request=request, format=format),
             'admin_rvms': reverse('core:admin-rvm-list', request=request, format=format),
+            'admin_rvm_forecast': reverse('core:admin-rvm-forecast', request=request, format=format),
             'admin_activities': reverse('core:admin-activity-list', request=request, format=format),
+            'admin_activities_export': reverse('core:admin-activity-export', request=request, format=format),
             'admin_materials': reverse('core:admin-material-list', request=request, format=format),
             'admin_wallets': reverse('core:admin-wallet-list', request=request, format=format),
+            'admin_rvm_analytics': reverse('core:admin-rvm-analytics', request=request, format=format),
+            'admin_user_analytics': reverse('core:admin-user-analytics', request=request, format=format),
         })
 
 
@@ -83,6 +107,16 @@ class CustomAuthToken(ObtainAuthToken):
         })
 
 
+class LogoutView(APIView):
+    """Revoke the caller's API token - every worker stops accepting it"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, format=None):
+        if isinstance(request.auth, Token):
+            request.auth.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """Get and update user profile"""
     serializer_class = UserSerializer
@@ -98,19 +132,12 @@ class UserSummaryView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        user = self.request.user
-        summary = user.summary()
-        
-        # add current wallet info
-        wallet, created = RewardWallet.objects.get_or_create(user=user)
-        summary['current_points'] = float(wallet.points)
-        summary['current_credit'] = float(wallet.credit)
-        
-        return Response(summary)
+        return summary_for(self.request.user)
 
 
-class MaterialTypeViewSet(viewsets.ReadOnlyModelViewSet):
-    """List and retrieve material types"""
+class MaterialTypeViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """List and retrieve material types (with ETag/Last-Modified, see core.conditional)"""
+    version_namespaces = ('materials',)
     queryset = MaterialType.objects.filter(is_active=True)
     serializer_class = MaterialTypeSerializer
     permission_classes = [IsAuthenticated]
@@ -118,21 +145,75 @@ class MaterialTypeViewSet(viewsets.ReadOnlyModelViewSet):
 
 class RVMFilter(django_filters.FilterSet):
     id = django_filters.NumberFilter(field_name='id', lookup_expr='exact', validators=[MinValueValidator(0)]) # Filter by exact ID, must be 0 or greater
-    name = django_filters.CharFilter(lookup_expr='icontains') # Filter by partial, case-insensitive name
+    # partial, case-insensitive matches - answered from the search index (core.search)
+    name = django_filters.CharFilter(method='filter_text')
+    location = django_filters.CharFilter(method='filter_text')
     status = django_filters.ChoiceFilter(choices=RVM.STATUS_CHOICES, lookup_expr='exact') # Status as dropdown
+    
+    def filter_text(self, queryset, name, value):
+        return search.filter_queryset(queryset, value, [name])
 
     class Meta:
         model = RVM
         fields = ['id', 'name', 'status', 'location'] # Remove last_usage from fields
 
 
-class RVMViewSet(viewsets.ReadOnlyModelViewSet):
-    """List and retrieve RVMs with advanced filtering"""
+class RVMViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    List and retrieve RVMs with advanced filtering.
+    
+    ?near=lat,lon lists the closest active machines instead, nearest first with their
+    distance_km: within ?radius= km (default 5) and at most ?limit= of them (default 10).
+    Both answer conditional GETs (ETag/Last-Modified, see core.conditional).
+    """
+    version_namespaces = ('rvms',)
     serializer_class = RVMSerializer
     permission_classes = [IsAuthenticated]
     queryset = RVM.objects.all().order_by('-last_usage') # Set initial queryset and ordering here
     filter_backends = [DjangoFilterBackend]
     filterset_class = RVMFilter
+    
+    def list(self, request, *args, **kwargs):
+        near = parse_near(request.query_params)
+        if near is None:
+            return super().list(request, *args, **kwargs)
+        return self.conditional(request, self.list_nearby, near)
+    
+    def list_nearby(self, request, near):
+        latitude, longitude, radius, limit = near
+        rvms = geo.nearest(self.filter_queryset(self.get_queryset()), latitude, longitude, radius, limit, status='active')
+        return Response(NearbyRVMSerializer(rvms, many=True).data)
+
+
+NEAR_DEFAULT_RADIUS_KM = 5
+NEAR_MAX_RADIUS_KM = 100
+NEAR_DEFAULT_LIMIT = 10
+NEAR_MAX_LIMIT = 100
+
+
+def parse_near(params):
+    """(latitude, longitude, radius_km, limit) from ?near=lat,lon&radius=&limit=, None without near"""
+    if 'near' not in params:
+        return None
+    try:
+        latitude, longitude = (float(part) for part in params['near'].split(','))
+    except ValueError:
+        raise ValidationError({'near': 'Expected "latitude,longitude", e.g. near=30.0444,31.2357.'})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': 'Latitude must be within -90..90 and longitude within -180..180.'})
+    try:
+        radius = float(params.get('radius', NEAR_DEFAULT_RADIUS_KM))
+        if not 0 < radius <= NEAR_MAX_RADIUS_KM:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({'radius': f'Must be a number of km above 0 and up to {NEAR_MAX_RADIUS_KM}.'})
+    try:
+        limit = int(params.get('limit', NEAR_DEFAULT_LIMIT))
+        if not 1 <= limit <= NEAR_MAX_LIMIT:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({'limit': f'Must be a whole number from 1 to {NEAR_MAX_LIMIT}.'})
+    return latitude, longitude, radius, limit
 
 
 class RewardWalletView(generics.RetrieveAPIView):
@@ -142,12 +223,177 @@ class RewardWalletView(generics.RetrieveAPIView):
     
     def get_object(self):
         wallet, created = RewardWallet.objects.get_or_create(user=self.request.user)
+        wallet.user = self.request.user  # already loaded, saves a query for user_email
         return wallet
 
 
-class RecyclingActivityViewSet(viewsets.ModelViewSet):
-    """CRUD operations for recycling activities"""
+class RewardTransactionListView(generics.ListAPIView):
+    """Full, paginated transaction history of the user's wallet"""
+    serializer_class = RewardTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TimestampCursorPagination
+    
+    def get_queryset(self):
+        queryset = RewardTransaction.objects.filter(wallet_id=self.request.user.pk)
+        
+        # optional date range, ranges on the (wallet, timestamp) index
+        start_date = _parse_day(self.request.query_params, 'start_date')
+        end_date = _parse_day(self.request.query_params, 'end_date')
+        if start_date:
+            queryset = queryset.filter(timestamp__gte=_start_of_day(start_date))
+        if end_date:
+            queryset = queryset.filter(timestamp__lt=_start_of_day(end_date + timedelta(days=1)))
+        
+        return queryset.order_by('-timestamp', '-id')
+
+
+class WalletStatementView(APIView):
+    """
+    Statement of the user's wallet between start_date and end_date (YYYY-MM-DD, end inclusive,
+    default the last 30 days): opening and closing balance, credits, debits and the transactions,
+    oldest first and cursor paginated (next / previous links, ?page_size= up to 500).
+    The opening balance comes from the nearest wallet snapshot, not from a scan of all history.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = StatementCursorPagination
+    max_days = 366
+    
+    def get(self, request, format=None):
+        params = request.query_params
+        end_day = _parse_day(params, 'end_date') or timezone.localdate()
+        start_day = _parse_day(params, 'start_date') or end_day - timedelta(days=29)
+        if start_day > end_day:
+            raise ValidationError({'start_date': 'Must not be after end_date.'})
+        if (end_day - start_day).days >= self.max_days:
+            raise ValidationError({'end_date': f'A statement can cover at most {self.max_days} days.'})
+        
+        wallet, created = RewardWallet.objects.get_or_create(user=request.user)
+        statement = wallet.statement(_start_of_day(start_day), _start_of_day(end_day + timedelta(days=1)))
+        # a year of deposits can be thousands of rows - one page of them per request
+        paginator = self.pagination_class()
+        transactions = paginator.paginate_queryset(statement['transactions'], request, view=self)
+        return Response({
+            'start_date': start_day,
+            'end_date': end_day,
+            'opening_balance': statement['opening_balance'],
+            'credits': statement['credits'],
+            'debits': statement['debits'],
+            'closing_balance': statement['closing_balance'],
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'transactions': RewardTransactionSerializer(transactions, many=True).data,
+        })
+
+
+class RedeemPointsView(APIView):
+    """
+    Convert wallet points into credit at POINTS_TO_CREDIT_RATE.
+    
+    Send an Idempotency-Key header to make retries safe: a repeat of the same request
+    gets the original response (with Idempotent-Replayed: true) and is not debited again.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, format=None):
+        serializer = RedemptionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        points = serializer.validated_data['points']
+        key = idempotency.key_from_request(request)
+        
+        def redeem():
+            try:
+                return status.HTTP_201_CREATED, services.redeem_points(request.user, points)
+            except services.InsufficientPoints:
+                raise ValidationError({'points': ['Not enough points in the wallet.']})
+        
+        return idempotent_response(request, 'redeem', key, serializer.validated_data, redeem)
+
+
+def idempotent_response(request, scope, key, payload, operation):
+    """Run operation() at most once per Idempotency-Key (see core.idempotency) and build the Response"""
+    try:
+        status_code, data, replayed = idempotency.run_once(request.user, scope, key, payload, operation)
+    except idempotency.KeyReused:
+        return Response(
+            {'detail': 'This Idempotency-Key was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(data, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class LeaderboardView(APIView):
+    """
+    Top recyclers by points earned, highest first (ties share a rank).
+    
+    ?board=global (default), rvm with ?rvm=<id>, or month with ?month=YYYY-MM (default
+    this month, UTC). ?limit= entries, default 10, at most 100.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, format=None):
+        board = parse_board(request.query_params)
+        try:
+            limit = int(request.query_params.get('limit', LEADERBOARD_DEFAULT_LIMIT))
+            if not 1 <= limit <= LEADERBOARD_MAX_LIMIT:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({'limit': f'Must be a whole number from 1 to {LEADERBOARD_MAX_LIMIT}.'})
+        entries = leaderboards.top(board, limit)
+        return Response({'board': board, 'results': LeaderboardEntrySerializer(entries, many=True).data})
+
+
+class MyLeaderboardRankView(APIView):
+    """Your rank, score and deposits on a board (same ?board= params as /api/leaderboard/)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, format=None):
+        board = parse_board(request.query_params)
+        entry = leaderboards.rank_of(board, request.user)
+        if entry is None:
+            # no deposits counted on this board yet
+            entry = LeaderboardEntry(board=board, user=request.user)
+            entry.rank = None
+        return Response({'board': board, **LeaderboardEntrySerializer(entry).data})
+
+
+LEADERBOARD_DEFAULT_LIMIT = 10
+LEADERBOARD_MAX_LIMIT = 100
+
+
+def parse_board(params):
+    """Board key (see core.leaderboards) from ?board=global|rvm|month plus ?rvm= / ?month="""
+    kind = params.get('board', leaderboards.GLOBAL)
+    if kind == leaderboards.GLOBAL:
+        return leaderboards.GLOBAL
+    if kind == 'rvm':
+        rvm_id = params.get('rvm', '')
+        if not rvm_id.isdigit():
+            raise ValidationError({'rvm': 'The rvm board needs an RVM id, e.g. rvm=3.'})
+        return leaderboards.rvm_board(int(rvm_id))
+    if kind == 'month':
+        month = params.get('month')
+        if month is None:
+            return leaderboards.month_board(timezone.now())
+        try:
+            return leaderboards.month_board(datetime.strptime(month, '%Y-%m'))
+        except ValueError:
+            raise ValidationError({'month': 'Expected a month in YYYY-MM format.'})
+    raise ValidationError({'board': f"Must be one of: {', '.join(leaderboards.KINDS)}"})
+
+
+class RecyclingActivityViewSet(
+    mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet,
+):
+    """
+    Your recycling activities: list, retrieve and create (a deposit).
+    No update or delete - a deposit is already counted in the wallet, stats, rollups,
+    leaderboards and RVM counters, so it stays as recorded.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = TimestampCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -155,8 +401,22 @@ class RecyclingActivityViewSet(viewsets.ModelViewSet):
         return RecyclingActivitySerializer
     
     def get_queryset(self):
-        # users can only see their own activities
-        return RecyclingActivity.objects.filter(user=self.request.user)
+        # users can only see their own activities - served by the (user, -timestamp) index
+        return RecyclingActivity.objects.filter(user=self.request.user).select_related('user__role', 'rvm', 'material')
+    
+    def create(self, request, *args, **kwargs):
+        # same deposit as /api/deposit/, so the same Idempotency-Key handling
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key = idempotency.key_from_request(request, serializer.validated_data.get('idempotency_key'))
+        
+        def record():
+            self.perform_create(serializer)
+            return status.HTTP_201_CREATED, serializer.data
+        
+        return idempotent_response(
+            request, services.DEPOSIT_SCOPE, key, services.deposit_payload(serializer.validated_data), record,
+        )
     
     def perform_create(self, serializer):
         """Create activity and automatically handle points"""
@@ -165,21 +425,86 @@ class RecyclingActivityViewSet(viewsets.ModelViewSet):
 
 
 class DepositRecyclablesView(generics.CreateAPIView):
-    """Main deposit endpoint - logs recycling and awards points"""
+    """
+    Main deposit endpoint - logs recycling and awards points.
+    
+    With an Idempotency-Key header (or idempotency_key field) a retried deposit is
+    answered from the stored result and not recorded again, so RVMs can retry freely.
+    """
     serializer_class = RecyclingActivityCreateSerializer
     permission_classes = [IsAuthenticated]
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key = idempotency.key_from_request(request, serializer.validated_data.get('idempotency_key'))
+        
+        def record():
+            self.perform_create(serializer)
+            return status.HTTP_201_CREATED, serializer.data
+        
+        return idempotent_response(
+            request, services.DEPOSIT_SCOPE, key, services.deposit_payload(serializer.validated_data), record,
+        )
 
     def perform_create(self, serializer):
-        # The serializer's create method already handles setting user, rvm, and material.
-        # The save method of the RecyclingActivity model handles RVM last_usage update and points.
+        # The serializer's create method hands off to services.record_deposit, which inserts the
+        # activity, bumps RVM last_usage and credits the wallet in a single transaction.
         activity = serializer.save()
 
 
+class BatchDepositView(APIView):
+    """Batch deposit endpoint - RVMs flushing deposits they buffered while offline"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, format=None):
+        # accept a bare list or {"deposits": [...]}
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('deposits')
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non-empty list of deposits.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_size = getattr(settings, 'DEPOSIT_BATCH_MAX_SIZE', 500)
+        if len(items) > max_size:
+            return Response({'detail': f'A batch can hold at most {max_size} deposits.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # shape checks per item, everything that needs the database happens in one go in the service
+        results = [None] * len(items)
+        valid_indexes = []
+        valid_items = []
+        for index, item in enumerate(items):
+            serializer = DepositBatchItemSerializer(data=item)
+            if serializer.is_valid():
+                valid_indexes.append(index)
+                valid_items.append(serializer.validated_data)
+            else:
+                results[index] = {'status': 'error', 'errors': serializer.errors}
+        
+        if valid_items:
+            for index, result in zip(valid_indexes, services.record_deposit_batch(request.user, valid_items)):
+                results[index] = result
+        
+        for index, result in enumerate(results):
+            result['index'] = index
+        created = sum(1 for result in results if result['status'] == 'created')
+        
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if created == len(results) else status.HTTP_207_MULTI_STATUS)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_summary(request):
     """Get user's recycling summary - total weight and points"""
-    user = request.user
+    return Response(summary_for(request.user))
+
+
+def summary_for(user):
+    """Summary stats plus wallet balance - two primary-key reads"""
     summary = user.summary()
     
     # add wallet info
@@ -187,15 +512,16 @@ def user_summary(request):
     summary['current_points'] = float(wallet.points)
     summary['current_credit'] = float(wallet.credit)
     
-    return Response(summary)
+    return summary
 
 
 # Admin-only views
 class AdminUserViewSet(viewsets.ModelViewSet):
     """Admin CRUD for users"""
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('role')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = IdCursorPagination
 
 
 class AdminRVMViewSet(viewsets.ModelViewSet):
@@ -203,17 +529,59 @@ class AdminRVMViewSet(viewsets.ModelViewSet):
     queryset = RVM.objects.all()
     serializer_class = RVMSerializer
     permission_classes = [IsAdminUser]
+    
+    @action(detail=True, methods=['post'])
+    def collected(self, request, pk=None):
+        """Record that the machine's bin was emptied just now - its fill forecast starts over"""
+        rvm = self.get_object()
+        rvm.last_collected_at = timezone.now()
+        rvm.save(update_fields=['last_collected_at'])
+        return Response({'id': rvm.pk, 'last_collected_at': rvm.last_collected_at})
+    
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """
+        Predicted fill level and time to full of every machine, soonest full first (see
+        core.forecasting). ?status= narrows the fleet, ?within_hours= keeps the machines
+        expected to be full within that many hours.
+        """
+        rvms = RVM.objects.all()
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            if status_filter not in dict(RVM.STATUS_CHOICES):
+                raise ValidationError({'status': f"Must be one of: {', '.join(dict(RVM.STATUS_CHOICES))}"})
+            rvms = rvms.filter(status=status_filter)
+        within = request.query_params.get('within_hours')
+        if within is not None:
+            try:
+                within = float(within)
+                if within < 0:
+                    raise ValueError
+            except ValueError:
+                raise ValidationError({'within_hours': 'Must be a number of hours, 0 or more.'})
+        
+        results = forecasting.forecast_fleet(rvms)
+        if within is not None:
+            results = [result for result in results if result['hours_to_full'] is not None and result['hours_to_full'] <= within]
+        return Response({'generated_at': timezone.now(), 'results': results})
 
 
-class AdminRecyclingActivityViewSet(viewsets.ModelViewSet):
-    """Admin CRUD for all recycling activities"""
+class AdminRecyclingActivityViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Admin view of all recycling activities, read-only like the user feed: a deposit is
+    already counted in wallets, stats, rollups, leaderboards and RVM counters.
+    """
     queryset = RecyclingActivity.objects.all()
     serializer_class = RecyclingActivitySerializer
     permission_classes = [IsAdminUser]
+    pagination_class = TimestampCursorPagination
     
     def get_queryset(self):
-        queryset = RecyclingActivity.objects.all()
-        
+        return self.filter_activities(
+            RecyclingActivity.objects.select_related('user__role', 'rvm', 'material')
+        )
+    
+    def filter_activities(self, queryset):
         # filter by user
         user_id = self.request.query_params.get('user', None)
         if user_id:
@@ -224,16 +592,32 @@ class AdminRecyclingActivityViewSet(viewsets.ModelViewSet):
         if rvm_id:
             queryset = queryset.filter(rvm_id=rvm_id)
         
-        # filter by date range
-        start_date = self.request.query_params.get('start_date', None)
-        end_date = self.request.query_params.get('end_date', None)
+        # filter by date range - plain timestamp ranges so the indexes can be used,
+        # timestamp__date would wrap the column in a function call
+        start_date = _parse_day(self.request.query_params, 'start_date')
+        end_date = _parse_day(self.request.query_params, 'end_date')
         
         if start_date:
-            queryset = queryset.filter(timestamp__date__gte=start_date)
+            queryset = queryset.filter(timestamp__gte=_start_of_day(start_date))
         if end_date:
-            queryset = queryset.filter(timestamp__date__lte=end_date)
+            queryset = queryset.filter(timestamp__lt=_start_of_day(end_date + timedelta(days=1)))
+        
+        return queryset.order_by('-timestamp', '-id')
+    
+    @action(detail=False, methods=['get'], renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, *EXPORT_RENDERERS])
+    def export(self, request):
+        """
+        Stream every matching activity as CSV (default) or NDJSON (?export_format=ndjson,
+        or Accept: application/x-ndjson). Takes the same user / rvm / start_date / end_date
+        filters as the list, without paging.
+        """
+        accepted = request.accepted_renderer.format
+        export_format = request.query_params.get('export_format', accepted if accepted in EXPORT_FORMATS else 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': f"Must be one of: {', '.join(EXPORT_FORMATS)}"})
         
-        return queryset.order_by('-timestamp')
+        # plain rows instead of the nested serializer - no per-row user/rvm/material objects
+        return stream_activities(self.filter_activities(RecyclingActivity.objects.all()), export_format)
 
 
 class AdminMaterialTypeViewSet(viewsets.ModelViewSet):
@@ -245,6 +629,89 @@ class AdminMaterialTypeViewSet(viewsets.ModelViewSet):
 
 class AdminRewardWalletViewSet(viewsets.ModelViewSet):
     """Admin CRUD for reward wallets"""
-    queryset = RewardWallet.objects.all()
     serializer_class = RewardWalletSerializer
-    permission_classes = [IsAdminUser]
\ No newline at end of file
+    permission_classes = [IsAdminUser]
+    pagination_class = IdCursorPagination
+    
+    def get_queryset(self):
+        # constant query count per page: users joined, recent transactions prefetched in one go
+        return RewardWallet.objects.select_related('user').prefetch_related(
+            RewardWalletSerializer.recent_transactions_prefetch()
+        )
+
+
+class RollupAnalyticsView(APIView):
+    """
+    Deposit totals over a date range, answered from the rollup tables instead of raw activities.
+    
+    Query params: start_date / end_date (YYYY-MM-DD, end inclusive, default last 30 days),
+    period (hour, day, week, month), group_by (comma separated dimensions) and one
+    filter per dimension, e.g. ?rvm=3.
+    """
+    permission_classes = [IsAdminUser]
+    model = None
+    dimensions = []
+    
+    def get(self, request, format=None):
+        params = request.query_params
+        
+        period = params.get('period', 'day')
+        if period not in SERIES_PERIODS:
+            raise ValidationError({'period': f"Must be one of: {', '.join(SERIES_PERIODS)}"})
+        
+        group_by = params.get('group_by')
+        group_by = [field for field in group_by.split(',') if field] if group_by else list(self.dimensions)
+        unknown = set(group_by) - set(self.dimensions)
+        if unknown:
+            raise ValidationError({'group_by': f"Unknown dimension(s): {', '.join(sorted(unknown))}"})
+        
+        filters = {}
+        for dimension in self.dimensions:
+            value = params.get(dimension)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({dimension: 'Must be an id.'})
+                filters[f'{dimension}_id'] = int(value)
+        
+        end_day = _parse_day(params, 'end_date') or timezone.now().date()
+        start_day = _parse_day(params, 'start_date') or end_day - timedelta(days=29)
+        start = datetime.combine(start_day, time.min, tzinfo=dt_timezone.utc)
+        end = datetime.combine(end_day + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+        
+        return Response({
+            'period': period,
+            'start_date': start_day,
+            'end_date': end_day,
+            'results': rollup_series(self.model, period, start, end, group_by, **filters),
+        })
+
+
+class AdminRVMAnalyticsView(RollupAnalyticsView):
+    """Weight, points and deposits per RVM and material over time"""
+    model = RVMActivityRollup
+    dimensions = ['rvm', 'material']
+
+
+class AdminUserAnalyticsView(RollupAnalyticsView):
+    """Weight, points and deposits per user over time"""
+    model = UserActivityRollup
+    dimensions = ['user']
+
+
+def _parse_day(params, name):
+    """Read a YYYY-MM-DD query param, 400 on garbage"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: 'Expected a date in YYYY-MM-DD format.'})
+    return day
+
+
+def _start_of_day(day):
+    """Midnight of a date in the active time zone, as an aware datetime"""
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
@@ -38,11 +38,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken', # API tokens issued at register/login
     'django_filters', # Add django-filter
     'core',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',  # first, so its timings cover everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +79,7 @@ WSGI_APPLICATION = 'rvm_ecosystem.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 import os
+import tempfile
 
 # Check if we're running in Docker (with PostgreSQL)
 if os.getenv('DATABASE_URL'):
@@ -137,3 +140,78 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
+
+# API authentication - tokens for machines and apps, sessions for the browsable API.
+# No BasicAuthentication: it would run the password hasher on every request.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'core.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+}
+
+# Per-process token -> user cache used by CachedTokenAuthentication
+AUTH_TOKEN_CACHE_SIZE = 10000  # entries
+AUTH_TOKEN_CACHE_TTL = 300  # seconds
+
+# Per-process cache of materials and RVM statuses used to validate deposits (seconds).
+# Invalidations travel through the 'versions' cache below, shared by the workers.
+REFERENCE_CACHE_TTL = 60
+
+# Django's caches. With CACHE_BACKEND/CACHE_LOCATION set (e.g.
+# django.core.cache.backends.redis.RedisCache + redis://host:6379) every alias lives there,
+# shared by all workers on all hosts. Without, what the workers must share (token
+# revocations, data versions) goes through files in CACHE_DIR - shared by the workers of
+# one host - and the rest stays in each worker's memory. MAX_ENTRIES is per alias, so one
+# kind of entry can't evict another.
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'rvm-ecosystem-cache'))
+
+
+def _cache(name, shared, max_entries):
+    if os.getenv('CACHE_BACKEND'):
+        return {'BACKEND': os.getenv('CACHE_BACKEND'), 'LOCATION': os.getenv('CACHE_LOCATION', ''), 'KEY_PREFIX': name}
+    if shared:
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_DIR, name),
+            'OPTIONS': {'MAX_ENTRIES': max_entries},
+        }
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name, 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+
+
+CACHES = {
+    'default': _cache('default', shared=False, max_entries=1000),
+    # token revocation stamps (core.authentication), each kept 2 x AUTH_TOKEN_CACHE_TTL
+    'tokens': _cache('tokens', shared=True, max_entries=50000),
+    # versions of the reference data (core.caching) - a handful of keys that must never be evicted
+    'versions': _cache('versions', shared=True, max_entries=1000),
+    # rendered /api/rvms/ and /api/materials/ bodies (core.conditional), one per version and query string
+    'responses': _cache('responses', shared=False, max_entries=1000),
+}
+
+# How long rendered /api/rvms/ and /api/materials/ responses stay in the cache (seconds).
+# Writes invalidate them right away, see core/conditional.py.
+RESPONSE_CACHE_TTL = 300
+
+# Serve /api/deposit/, /api/wallet/, /api/summary/ and /api/rvms/ (list) from the native
+# async views in core/async_views.py. Only worth it when running under ASGI
+# (rvm_ecosystem.asgi); the async variants are always reachable under /api/async/.
+ASYNC_API_VIEWS = os.getenv('ASYNC_API_VIEWS', 'False') == 'True'
+
+# Wallet credit one point converts into at /api/wallet/redeem/ (100 points = 1.00 credit)
+POINTS_TO_CREDIT_RATE = '0.01'
+
+# Hours an Idempotency-Key answer is kept before manage.py purge_idempotency_keys removes it.
+# Must be longer than any client keeps retrying a request.
+IDEMPOTENCY_KEY_TTL_HOURS = 72
+
+# Rows fetched per round trip by the streaming activity export (/api/admin/activities/export/)
+EXPORT_CHUNK_SIZE = 2000
+
+# Per-request timing (total / db / view / render) recorded by core.middleware.PerformanceMiddleware
+# into in-process histograms served at /metrics, plus a Server-Timing response header -
+# the header tells every client how long the database took, so by default only with DEBUG.
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', 'True') == 'True'
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+# /metrics answers "Authorization: Bearer <METRICS_TOKEN>" and staff sessions, nobody else
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
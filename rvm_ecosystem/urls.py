@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.documentation import include_docs_urls
 from core.web_views import home, user_signup, signup_success_view # Import from new web_views
+from core.metrics import metrics_view
 
 urlpatterns = [
     path('', home, name='home'),
@@ -26,4 +27,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
     path('docs/', include_docs_urls(title='RVM Ecosystem API')),
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape endpoint
 ]